@@ -1,9 +1,13 @@
-from sqlalchemy import create_engine, text
-from dotenv import load_dotenv
-
 import streamlit as st
 st.set_page_config(layout="wide", page_title='Analiza Rynku Pracy IT w Polsce')
-import liczba_ofert, zarobki, popularne_technologie, rozklad_pareto, mapa_polski
+import profiler
+import rozgrzewanie
+from harmonogram import latency_report
+from strony import HIDDEN_PAGES, PAGES, load_page, import_report
+from ustawienia import get_setting
+
+# Odświeżanie cache odwiedzonych stron w tle po każdym ładowaniu danych (bez importu pozostałych stron)
+rozgrzewanie.start()
 
 
 
@@ -24,17 +28,33 @@ st.markdown(
 
 # Sidebar navigation
 st.sidebar.title("Dashboard Menu")
-selected_page = st.sidebar.radio("Wybierz stronę:", ["Liczba Ofert", "Zarobki", "Technologie", "Mapa Polski", 'Rozkład Pareto'])
-st.sidebar.markdown("---") 
-
-# Display the selected page
-if selected_page == "Liczba Ofert":
-    liczba_ofert.main()
-elif selected_page == "Zarobki":
-    zarobki.main()
-elif selected_page == "Technologie":
-    popularne_technologie.main()
-elif selected_page == "Mapa Polski":
-    mapa_polski.main()
-elif selected_page == "Rozkład Pareto":
-    rozklad_pareto.main()
\ No newline at end of file
+pages = list(PAGES)
+# Ukryta strona diagnostyczna (SQL i parametry zapytań) - tylko po ustawieniu [diagnostics] SHOW_PAGE w secrets
+if get_setting("diagnostics", "SHOW_PAGE", False):
+    pages += list(HIDDEN_PAGES)
+selected_page = st.sidebar.radio("Wybierz stronę:", pages)
+st.sidebar.markdown("---")
+
+# Display the selected page - moduł strony importowany dopiero przy pierwszym wyborze
+# Tryb profilowania ([profiler] ENABLED w secrets): czas sekcji strony w każdym przebiegu
+if profiler.ENABLED:
+    with profiler.run(selected_page) as profile:
+        load_page(selected_page).main()
+    with st.sidebar.expander("Profil przebiegu"):
+        st.code(profile["summary"], language=None)
+else:
+    load_page(selected_page).main()
+
+# Raport kosztu importu stron (włączany przez [diagnostics] SHOW_IMPORT_REPORT w secrets)
+if get_setting("diagnostics", "SHOW_IMPORT_REPORT", False):
+    with st.sidebar.expander("Czas importu stron"):
+        for name, entry in import_report().items():
+            st.write(f"{name}: {entry['seconds']:.3f} s ({entry['new_modules']} modułów)")
+
+# Czasy równoległych zapytań stron (włączane przez [diagnostics] SHOW_QUERY_LATENCY w secrets)
+if get_setting("diagnostics", "SHOW_QUERY_LATENCY", False):
+    with st.sidebar.expander("Czas zapytań stron"):
+        for name, entry in latency_report().items():
+            st.write(f"**{name}**: {entry['seconds']:.3f} s")
+            for query, timing in entry["queries"].items():
+                st.write(f"- {query}: {timing['seconds']:.3f} s" + (" (błąd)" if timing["error"] else ""))
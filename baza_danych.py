@@ -0,0 +1,124 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+import instrumentacja
+from ustawienia import get_setting
+
+# Jeden silnik na proces - wszystkie strony dzielą tę samą, ograniczoną pulę połączeń
+_engine = None
+_engine_lock = threading.Lock()
+
+# Metryki puli połączeń (pobrania, zwroty, czas oczekiwania na połączenie)
+_stats_lock = threading.Lock()
+_stats = {
+    "checkouts": 0,
+    "checkins": 0,
+    "connects": 0,
+    "invalidated": 0,
+    "timeouts": 0,
+    "wait_total": 0.0,
+    "wait_max": 0.0,
+    "in_use": 0,
+    "in_use_max": 0,
+}
+
+
+def _connection_url():
+    # Pozwala podmienić bazę (np. syntetyczny magazyn do testów wydajności) bez zmiany secrets.toml
+    url = get_setting("database", "DB_URL")
+    if url:
+        return url
+    server = get_setting("database", "DB_SERVER")
+    database = get_setting("database", "DB_DATABASE")
+    username = get_setting("database", "DB_USERNAME")
+    password = get_setting("database", "DB_PASSWORD")
+    return f"mssql+pyodbc://{username}:{password}@{server}/{database}?driver=ODBC+Driver+17+for+SQL+Server&TrustServerCertificate=yes&charset=utf8"
+
+
+def _register_pool_events(engine):
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        with _stats_lock:
+            _stats["connects"] += 1
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        with _stats_lock:
+            _stats["checkouts"] += 1
+            _stats["in_use"] += 1
+            _stats["in_use_max"] = max(_stats["in_use_max"], _stats["in_use"])
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        with _stats_lock:
+            _stats["checkins"] += 1
+            _stats["in_use"] = max(_stats["in_use"] - 1, 0)
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        with _stats_lock:
+            _stats["invalidated"] += 1
+
+
+def get_engine():
+    """ Zwraca współdzielony silnik SQLAlchemy (tworzony leniwie, raz na proces) """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                url = _connection_url()
+                options = {}
+                if url.startswith("mssql"):
+                    options["use_setinputsizes"] = False  # https://github.com/sqlalchemy/sqlalchemy/issues/8681
+                # Pamięciowa baza SQLite ma własną pulę jednego połączenia; plikowa (np. syntetyczny magazyn) - QueuePool
+                if not url.startswith("sqlite") or not (url.rstrip("/") == "sqlite:" or ":memory:" in url):
+                    options.update(
+                        pool_size=get_setting("pool", "POOL_SIZE", 10),
+                        max_overflow=get_setting("pool", "MAX_OVERFLOW", 5),
+                        pool_timeout=get_setting("pool", "POOL_TIMEOUT", 30),
+                        pool_recycle=get_setting("pool", "POOL_RECYCLE", 1800),
+                    )
+                engine = create_engine(url, pool_pre_ping=True, **options)
+                _register_pool_events(engine)
+                instrumentacja.register(engine)
+                _engine = engine
+    return _engine
+
+
+@contextmanager
+def connect():
+    """ Pobiera połączenie z puli i mierzy czas oczekiwania na nie """
+    engine = get_engine()
+    start = time.perf_counter()
+    try:
+        connection = engine.connect()
+    except PoolTimeoutError:
+        with _stats_lock:
+            _stats["timeouts"] += 1
+        raise
+    waited = time.perf_counter() - start
+    with _stats_lock:
+        _stats["wait_total"] += waited
+        _stats["wait_max"] = max(_stats["wait_max"], waited)
+    with connection:
+        yield connection
+
+
+def pool_stats():
+    """ Zwraca migawkę metryk puli połączeń """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["wait_avg"] = stats["wait_total"] / stats["checkouts"] if stats["checkouts"] else 0.0
+    if _engine is not None:
+        pool = _engine.pool
+        stats["status"] = pool.status()
+        if isinstance(pool, QueuePool):
+            stats["pool_size"] = pool.size()
+            stats["pool_checkedout"] = pool.checkedout()
+            stats["pool_overflow"] = pool.overflow()
+    return stats
@@ -0,0 +1,108 @@
+"""
+Porównanie pd.read_sql z pobieraniem kolumnowym (pobieranie.fetch_frame) na syntetycznej
+hurtowni: czas i szczytowe zużycie pamięci dla zapytania o technologie
+(popularne_technologie) - zagregowanego i surowego złączenia Job_Offers x Skills x Dates.
+
+Uruchomienie (z katalogu głównego repozytorium):
+    python -m benchmark.pobieranie --oferty 200000
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from benchmark.syntetyczny_magazyn import generate, register_sqlite_functions
+from pobieranie import fetch_frame
+from popularne_technologie import SKILL_COUNTS
+from przyrostowe import MAX_DATE_ID, MIN_DATE_ID
+
+RAW_SKILLS_QUERY = text('''
+    SELECT jo.job_offer_id, d.date_full, d.day_name, s.skill_name, jos.level_id
+    FROM Job_Offers as jo JOIN Job_Offers_Skills as jos on jos.job_offer_id=jo.job_offer_id
+        JOIN Skills as s on s.skill_id=jos.skill_id
+        JOIN Dates as d on d.date_id=jo.date_id
+''')
+
+# Kolumny, których typ wychodzi dopiero w dalszych partiach: liczby całkowite z ułamkiem na końcu,
+# NULL na początku (poza pierwszą partią), NULL na końcu kolumny całkowitej, tekst w kolumnie liczbowej
+MIXED_COLUMNS = {
+    "ints_then_fraction": [1, 2, 3, 4, 2.5, 6],
+    "null_leading_int": [None, None, None, None, 5, 7],
+    "null_leading_fraction": [None, None, None, None, 1.5, 2],
+    "int_then_null": [1, 2, 3, 4, 5, None],
+    "all_null": [None] * 6,
+    "int_then_text": [1, 2, 3, 4, "x", 5],
+    "null_then_text": [None, None, None, None, "a", "b"],
+}
+
+
+def check_types():
+    """ Porównuje typy i wartości fetch_frame z pd.read_sql na kolumnach mieszanych, dla różnych rozmiarów partii """
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.exec_driver_sql(f"CREATE TABLE Mixed_Columns ({', '.join(MIXED_COLUMNS)})")
+        connection.exec_driver_sql(f"INSERT INTO Mixed_Columns VALUES ({', '.join('?' * len(MIXED_COLUMNS))})",
+                                   list(zip(*MIXED_COLUMNS.values())))
+    query = text("SELECT * FROM Mixed_Columns")
+    with engine.connect() as connection:
+        expected = pd.read_sql(query, connection)
+        for batch_size in (1, 2, 4, len(expected)):
+            columnar = fetch_frame(connection, query, batch_size=batch_size)
+            for name in MIXED_COLUMNS:
+                assert expected[name].dtype == columnar[name].dtype and expected[name].equals(columnar[name]), \
+                    f"{name} (partia {batch_size}): {list(expected[name])} != {list(columnar[name])}"
+
+
+def measure(function, repeats):
+    """ Najlepszy czas z `repeats` prób i szczyt pamięci (tracemalloc) jednej próby """
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        df = function()
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    df = function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return df, best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pobierania wyników zapytań")
+    parser.add_argument("--baza", help="istniejąca baza SQLite (domyślnie generowana w katalogu tymczasowym)")
+    parser.add_argument("--oferty", type=int, default=200_000)
+    parser.add_argument("--powtorzenia", type=int, default=3)
+    args = parser.parse_args()
+
+    path = args.baza or os.path.join(tempfile.mkdtemp(), "magazyn.db")
+    if not args.baza:
+        print(f"Generowanie hurtowni: {args.oferty} ofert -> {path}")
+        generate(path, args.oferty)
+    engine = create_engine(f"sqlite:///{path}")
+    register_sqlite_functions(engine)
+    check_types()
+
+    bounds = {"date_from": MIN_DATE_ID, "date_to": MAX_DATE_ID}
+    queries = {"technologie (GROUP BY)": (SKILL_COUNTS.query, bounds), "technologie (surowe wiersze)": (RAW_SKILLS_QUERY, {})}
+    rows = []
+    with engine.connect() as connection:
+        for label, (query, params) in queries.items():
+            baseline, baseline_time, baseline_peak = measure(lambda: pd.read_sql(query, connection, params=params), args.powtorzenia)
+            columnar, columnar_time, columnar_peak = measure(lambda: fetch_frame(connection, query, params), args.powtorzenia)
+            assert len(baseline) == len(columnar)
+            rows.append({
+                "zapytanie": label, "wiersze": len(baseline),
+                "read_sql [s]": round(baseline_time, 3), "fetch_frame [s]": round(columnar_time, 3),
+                "read_sql szczyt [MB]": round(baseline_peak / 2 ** 20, 1), "fetch_frame szczyt [MB]": round(columnar_peak / 2 ** 20, 1),
+                "read_sql ramka [MB]": round(baseline.memory_usage(deep=True).sum() / 2 ** 20, 1),
+                "fetch_frame ramka [MB]": round(columnar.memory_usage(deep=True).sum() / 2 ** 20, 1),
+            })
+    print(pd.DataFrame(rows).set_index("zapytanie").T.to_string())
+
+
+if __name__ == "__main__":
+    main()
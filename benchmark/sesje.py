@@ -0,0 +1,261 @@
+"""
+Test obciążenia: wiele równoległych sesji dashboardu (streamlit.testing - AppTest) w jednym
+procesie, na syntetycznej hurtowni. Każda sesja wykonuje losowy (powtarzalny - seed) scenariusz:
+przełączanie stron w menu, przełączanie poziomów doświadczenia, suwaki na stronie Pareto
+i wybór miasta na mapie. Każda akcja to jeden przebieg (rerun) app.py.
+
+Raport dla każdej liczby sesji: p50/p95/p99 czasu przebiegu (razem i według akcji),
+przepustowość, pamięć na sesję (przyrost RSS procesu bez wspólnego cache zapytań) oraz
+nasycenie puli połączeń (próbkowane baza_danych.pool_stats).
+
+Uruchomienie (z katalogu głównego repozytorium):
+    python -m benchmark.sesje --baza magazyn.db --sesje 1,5,10,20 --akcje 20
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmark.strony import configure
+
+PAGE_SWITCH = "strona"
+PERCENTILES = (50, 95, 99)
+# Wersje Streamlit (major.minor), na których sprawdzono współdzielenie Runtime przez sesje AppTest
+STREAMLIT_TESTED = ("1.66",)
+
+
+def _rss():
+    """ Bieżąca pamięć procesu (RSS, bajty); poza Linuksem - szczytowa z getrusage """
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _share_runtime():
+    """
+    AppTest ustawia na czas przebiegu globalny Runtime._instance (atrapę) i zeruje go na końcu,
+    więc przy równoległych sesjach koniec jednego przebiegu przerywa pozostałe ("Runtime hasn't
+    been created"). Po wyzerowaniu Runtime.instance() zwraca ostatnią ustawioną atrapę.
+    To podmiana prywatnego API Streamlit - na niesprawdzonej wersji test kończy się błędem.
+    """
+    import streamlit
+    from streamlit.runtime import Runtime
+    version = ".".join(streamlit.__version__.split(".")[:2])
+    if version not in STREAMLIT_TESTED or not all(hasattr(Runtime, name) for name in ("_instance", "instance", "exists")):
+        raise SystemExit(f"Test obciążenia współdzieli prywatny Runtime Streamlit, sprawdzony tylko dla wersji "
+                         f"{', '.join(STREAMLIT_TESTED)}; zainstalowana: {streamlit.__version__}. Po sprawdzeniu, że równoległe "
+                         f"sesje AppTest działają, dopisz wersję do STREAMLIT_TESTED w benchmark/sesje.py.")
+    last = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            last["runtime"] = cls._instance
+            return cls._instance
+        if "runtime" not in last:
+            raise RuntimeError("Runtime hasn't been created!")
+        return last["runtime"]
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or "runtime" in last)
+
+
+class Session:
+    """ Jedna symulowana sesja: AppTest, generator losowy i zmierzone przebiegi """
+
+    def __init__(self, index, seed):
+        from streamlit.testing.v1 import AppTest
+        self.app = AppTest.from_file(os.path.abspath("app.py"), default_timeout=3600)
+        self.random = random.Random(seed * 1000 + index)
+        self.timings = []  # (akcja, sekundy)
+        self.errors = 0
+
+    def rerun(self, action):
+        started = time.perf_counter()
+        self.app.run()
+        self.timings.append((action, time.perf_counter() - started))
+        self.errors += len(self.app.exception)
+
+    def show(self, page):
+        radio = self.app.sidebar.radio[0]
+        if radio.value != page:
+            radio.set_value(page)
+            self.rerun(PAGE_SWITCH)
+
+    def switch_page(self):
+        from strony import PAGES
+        radio = self.app.sidebar.radio[0]
+        radio.set_value(self.random.choice([page for page in PAGES if page != radio.value]))
+        self.rerun(PAGE_SWITCH)
+
+    def toggle_level(self):
+        self.show("Liczba Ofert")
+        toggles = list(self.app.sidebar.toggle)
+        toggle = self.random.choice(toggles)
+        # Zawsze zostaje co najmniej jeden wybrany poziom
+        if toggle.value and sum(other.value for other in toggles) == 1:
+            return
+        toggle.set_value(not toggle.value)
+        self.rerun("poziomy")
+
+    def move_pareto_slider(self):
+        self.show("Rozkład Pareto")
+        slider = self.random.choice(list(self.app.slider))
+        steps = int(round((slider.max - slider.min) / slider.step))
+        value = slider.min + self.random.randint(0, steps) * slider.step
+        slider.set_value(type(slider.value)(round(value, 2)))
+        self.rerun("suwak Pareto")
+
+    def select_city(self):
+        self.show("Mapa Polski")
+        selectbox = self.app.selectbox(key="selected_city")
+        # Popularne miasta częściej - jak u analityków
+        options = selectbox.options[:50]
+        selectbox.set_value(options[min(int(self.random.expovariate(0.2)), len(options) - 1)])
+        self.rerun("miasto")
+
+    def prime(self):
+        """ Odwiedza każdą stronę - importy modułów stron nie wliczają się do pamięci sesji """
+        from strony import PAGES
+        self.rerun("start")
+        for page in PAGES:
+            self.show(page)
+        return self
+
+    def play(self, actions):
+        self.rerun("start")
+        scenario = [self.switch_page, self.toggle_level, self.move_pareto_slider, self.select_city]
+        for _ in range(actions):
+            self.random.choice(scenario)()
+        return self
+
+
+class PoolMonitor:
+    """ Próbkuje zajętość puli połączeń w tle """
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="monitor-puli", daemon=True)
+
+    def _loop(self):
+        from baza_danych import pool_stats
+        while not self._stop.is_set():
+            self.samples.append(pool_stats())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def percentiles(values):
+    values = np.asarray(values) * 1000
+    return {f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES} if len(values) else {}
+
+
+def run_level(sessions, actions, seed):
+    """ `sessions` równoległych sesji po `actions` akcji; zwraca raport poziomu obciążenia """
+    import cache_zapytan
+    from baza_danych import pool_stats
+
+    rss_before = _rss()
+    cache_before = cache_zapytan.cache_stats()["bytes"]
+    stats_before = pool_stats()
+    started = time.perf_counter()
+    with PoolMonitor() as monitor, ThreadPoolExecutor(max_workers=sessions) as executor:
+        played = list(executor.map(lambda index: Session(index, seed).play(actions), range(sessions)))
+    elapsed = time.perf_counter() - started
+    # Sesje wciąż istnieją (stan AppTest) - przyrost RSS bez wspólnego cache zapytań to pamięć sesji
+    rss_growth = _rss() - rss_before - (cache_zapytan.cache_stats()["bytes"] - cache_before)
+    stats_after = pool_stats()
+
+    by_action = defaultdict(list)
+    for session in played:
+        for action, seconds in session.timings:
+            by_action[action].append(seconds)
+    reruns = [seconds for timings in by_action.values() for seconds in timings]
+    # Pula nasycona: wszystkie stałe połączenia zajęte - kolejne to nadmiarowe (overflow) albo oczekiwanie
+    size = stats_after.get("pool_size")
+    in_use = [sample["in_use"] for sample in monitor.samples] or [0]
+    checkouts = stats_after["checkouts"] - stats_before["checkouts"]
+    report = {
+        "sessions": sessions,
+        "reruns": len(reruns),
+        "errors": sum(session.errors for session in played),
+        "throughput": len(reruns) / elapsed,
+        "latency_ms": percentiles(reruns),
+        "actions_ms": {action: {"count": len(timings), **percentiles(timings)} for action, timings in sorted(by_action.items())},
+        "memory_per_session_mb": max(rss_growth, 0) / sessions / 2 ** 20,
+        "pool": {
+            "size": size,
+            "in_use_max": max(in_use),
+            "saturated_share": sum(1 for value in in_use if size and value >= size) / len(in_use),
+            "checkouts": checkouts,
+            "wait_avg_ms": (stats_after["wait_total"] - stats_before["wait_total"]) / checkouts * 1000 if checkouts else 0.0,
+            "wait_max_ms": stats_after["wait_max"] * 1000,
+            "timeouts": stats_after["timeouts"] - stats_before["timeouts"],
+        },
+    }
+    return report
+
+
+def print_report(report):
+    latency = report["latency_ms"]
+    pool = report["pool"]
+    print(f"\n== {report['sessions']} sesji: {report['reruns']} przebiegów, {report['throughput']:.1f}/s, błędy: {report['errors']}")
+    print(f"   przebieg  p50 {latency['p50']:8.1f} ms  p95 {latency['p95']:8.1f} ms  p99 {latency['p99']:8.1f} ms")
+    for action, entry in report["actions_ms"].items():
+        print(f"   {action:<13} n={entry['count']:<5} p50 {entry['p50']:8.1f} ms  p95 {entry['p95']:8.1f} ms  p99 {entry['p99']:8.1f} ms")
+    print(f"   pamięć na sesję: {report['memory_per_session_mb']:.1f} MB")
+    print(f"   pula: maks. zajętych {pool['in_use_max']} (rozmiar {pool['size']}), nasycona przez {pool['saturated_share']:.0%} próbek, "
+          f"oczekiwanie śr. {pool['wait_avg_ms']:.2f} ms / maks. {pool['wait_max_ms']:.1f} ms, przekroczenia czasu: {pool['timeouts']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test obciążenia dashboardu równoległymi sesjami")
+    parser.add_argument("--baza", help="istniejąca baza SQLite (domyślnie generowana w katalogu tymczasowym)")
+    parser.add_argument("--oferty", type=int, default=100_000, help="skala generowanej bazy")
+    parser.add_argument("--sesje", default="1,5,10", help="liczby równoległych sesji, np. 1,5,10,20")
+    parser.add_argument("--akcje", type=int, default=20, help="liczba akcji w scenariuszu sesji")
+    parser.add_argument("--zimny", action="store_true", help="czyści cache zapytań przed każdym poziomem obciążenia")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    database = args.baza
+    if database is None:
+        from benchmark.syntetyczny_magazyn import generate
+        database = os.path.join(tempfile.mkdtemp(prefix="obciazenie-"), "magazyn.db")
+        generate(database, args.oferty)
+    configure(database, profile=False)
+
+    import baza_danych
+    import cache_zapytan
+    import przyrostowe
+    from benchmark.syntetyczny_magazyn import register_sqlite_functions
+    register_sqlite_functions(baza_danych.get_engine())
+    _share_runtime()
+    Session(0, args.seed).prime()
+
+    for sessions in [int(value) for value in args.sesje.split(",")]:
+        if args.zimny:
+            cache_zapytan.clear()
+            przyrostowe.reset()
+        print_report(run_level(sessions, args.akcje, args.seed))
+
+
+if __name__ == "__main__":
+    main()
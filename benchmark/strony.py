@@ -0,0 +1,169 @@
+"""
+Benchmark ścieżki danych wszystkich stron na syntetycznej hurtowni, bez przeglądarki.
+
+Każda strona jest renderowana przez streamlit.testing (AppTest) z włączonym profilerem
+(profiler.py): raz na zimno (pusty cache zapytań i agregatów, bez migawek) i kilka razy
+na ciepło. Z profilu przebiegu brany jest czas całości oraz czas pobierania danych (data),
+agregacji (transform), budowy wykresów (chart) i serializacji (serialize).
+
+Wyniki trafiają do benchmark/wyniki/<commit>.json; porównanie z wynikami innego commita
+zgłasza regresje (kod wyjścia 1), np. w CI lub przed scaleniem zmian.
+
+Uruchomienie (z katalogu głównego repozytorium):
+    python -m benchmark.strony --oferty 100000
+    python -m benchmark.strony --baza magazyn.db --powtorzenia 10 --porownaj 9111662
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RESULTS_DIR = os.path.join("benchmark", "wyniki")
+METRICS = ("total", "data", "transform", "chart", "serialize")
+
+
+def configure(database, profile=True):
+    """ Ustawienia aplikacji (czytane przy imporcie modułów) - przed importem stron """
+    os.environ["DASHBOARD_DATABASE_DB_URL"] = f"sqlite:///{os.path.abspath(database)}"
+    os.environ["DASHBOARD_SNAPSHOT_ENABLED"] = "0"
+    os.environ["DASHBOARD_WARMUP_ENABLED"] = "0"
+    if profile:
+        os.environ["DASHBOARD_PROFILER_ENABLED"] = "1"
+        os.environ["DASHBOARD_PROFILER_HISTORY"] = "1"
+
+
+def _run(app, page):
+    """ Jeden przebieg strony - czas całości i czas według rodzaju sekcji (ms) """
+    import profiler
+    app.sidebar.radio[0].set_value(page)
+    app.run()
+    if app.exception:
+        raise RuntimeError(f"Strona '{page}': {app.exception[0].value}")
+    profile = profiler.last_runs()[0]
+    return {"total": profile["root"]["seconds"] * 1000,
+            **{kind: seconds * 1000 for kind, seconds in profile["kinds"].items() if kind in METRICS}}
+
+
+def _median(runs):
+    return {metric: statistics.median(run[metric] for run in runs) for metric in METRICS}
+
+
+def bench_pages(repeats):
+    """ Pomiar na zimno i na ciepło (mediana z `repeats` przebiegów) dla każdej strony """
+    from streamlit.testing.v1 import AppTest
+
+    import cache_zapytan
+    import przyrostowe
+    from strony import PAGES
+
+    results = {}
+    for page in PAGES:
+        app = AppTest.from_file(os.path.abspath("app.py"), default_timeout=3600)
+        app.run()
+        # Zimny start: pierwszy przebieg strony po restarcie procesu bez migawek na dysku
+        cache_zapytan.clear()
+        przyrostowe.reset()
+        cold = _run(app, page)
+        warm = _median([_run(app, page) for _ in range(repeats)])
+        results[page] = {"cold": cold, "warm": warm}
+        print(f"{page:<16} zimny {cold['total']:9.1f} ms   ciepły {warm['total']:9.1f} ms", flush=True)
+    return results
+
+
+def commit_id():
+    """ Skrócony identyfikator bieżącego commita (z dopiskiem -dirty przy niezatwierdzonych zmianach) """
+    commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, check=True).stdout
+    return f"{commit}-dirty" if dirty.strip() else commit
+
+
+def results_path(commit):
+    return os.path.join(RESULTS_DIR, f"{commit}.json")
+
+
+def compare(current, baseline, threshold, min_ms):
+    """
+    Regresje względem wyników bazowych: metryki wolniejsze o więcej niż `threshold`
+    (względnie) i `min_ms` (bezwzględnie - pomija szum krótkich sekcji).
+    """
+    regressions = []
+    for page, phases in current["pages"].items():
+        for phase, metrics in phases.items():
+            base = baseline["pages"].get(page, {}).get(phase)
+            if base is None:
+                continue
+            for metric in METRICS:
+                before, after = base.get(metric, 0.0), metrics.get(metric, 0.0)
+                if after - before > min_ms and after > before * (1 + threshold):
+                    regressions.append((page, phase, metric, before, after))
+    return regressions
+
+
+def print_comparison(current, baseline):
+    print(f"\n{'strona':<16} {'przebieg':<6} " + " ".join(f"{metric:>18}" for metric in METRICS))
+    for page, phases in current["pages"].items():
+        for phase, metrics in phases.items():
+            base = baseline["pages"].get(page, {}).get(phase, {})
+            cells = []
+            for metric in METRICS:
+                before, after = base.get(metric), metrics[metric]
+                change = f"{(after - before) / before:+.0%}" if before else "-"
+                cells.append(f"{after:9.1f} ms {change:>5}")
+            print(f"{page:<16} {phase:<6} " + " ".join(f"{cell:>18}" for cell in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark stron dashboardu na syntetycznej hurtowni")
+    parser.add_argument("--baza", help="istniejąca baza SQLite (domyślnie generowana w katalogu tymczasowym)")
+    parser.add_argument("--oferty", type=int, default=100_000, help="skala generowanej bazy")
+    parser.add_argument("--podsumowania", action="store_true", help="generowana baza z tabelami podsumowań")
+    parser.add_argument("--powtorzenia", type=int, default=5, help="liczba przebiegów na ciepło")
+    parser.add_argument("--porownaj", help="commit (albo plik JSON) z wynikami bazowymi")
+    parser.add_argument("--prog", type=float, default=0.10, help="względny próg regresji")
+    parser.add_argument("--min-ms", type=float, default=5.0, help="bezwzględny próg regresji (ms)")
+    args = parser.parse_args()
+
+    # Wyniki bazowe wczytane przed pomiarem - plik bieżącego commita zostanie nadpisany
+    baseline = None
+    if args.porownaj:
+        path = args.porownaj if args.porownaj.endswith(".json") else results_path(args.porownaj)
+        with open(path, encoding="utf-8") as file:
+            baseline = json.load(file)
+
+    database = args.baza
+    if database is None:
+        from benchmark.syntetyczny_magazyn import generate
+        database = os.path.join(tempfile.mkdtemp(prefix="benchmark-"), "magazyn.db")
+        started = time.perf_counter()
+        generate(database, args.oferty, summaries=args.podsumowania)
+        print(f"Wygenerowano {args.oferty:,} ofert w {time.perf_counter() - started:.1f} s ({database})")
+    configure(database)
+
+    import baza_danych
+    from benchmark.syntetyczny_magazyn import register_sqlite_functions
+    register_sqlite_functions(baza_danych.get_engine())
+
+    current = {"commit": commit_id(), "time": time.time(), "database": os.path.abspath(database),
+               "offers": args.oferty if args.baza is None else None, "repeats": args.powtorzenia,
+               "python": sys.version.split()[0], "pages": bench_pages(args.powtorzenia)}
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(results_path(current["commit"]), "w", encoding="utf-8") as file:
+        json.dump(current, file, indent=2, ensure_ascii=False)
+    print(f"Wyniki: {results_path(current['commit'])}")
+
+    if baseline is not None:
+        print_comparison(current, baseline)
+        regressions = compare(current, baseline, args.prog, args.min_ms)
+        for page, phase, metric, before, after in regressions:
+            print(f"REGRESJA {page} ({phase}) {metric}: {before:.1f} ms -> {after:.1f} ms")
+        if regressions:
+            sys.exit(1)
+        print(f"\nBrak regresji względem {baseline['commit']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Syntetyczna hurtownia ofert pracy (SQLite) o schemacie gwiazdy takim jak produkcyjna:
+13 tabel - Job_Offers, wymiary (Dates, Cities, Skills, ...) i tabele łączące.
+Skala to liczba ofert (od 100 tys. do 50 mln - oferty są zapisywane partiami); rozkład ofert
+po miastach jest potęgowy, jak w danych z justjoin.it.
+
+Uruchomienie (z katalogu głównego repozytorium):
+    python -m benchmark.syntetyczny_magazyn magazyn.db --oferty 100000
+    python -m benchmark.syntetyczny_magazyn magazyn.db --oferty 50000000 --podsumowania
+"""
+import argparse
+import datetime
+import logging
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+PROVINCES = ['Dolnośląskie', 'Kujawsko-Pomorskie', 'Łódzkie', 'Lubelskie', 'Lubuskie', 'Małopolskie', 'Mazowieckie', 'Opolskie',
+             'Podkarpackie', 'Podlaskie', 'Pomorskie', 'Śląskie', 'Świętokrzyskie', 'Warmińsko-Mazurskie', 'Wielkopolskie', 'Zachodniopomorskie']
+EXPERIENCE = ['Junior', 'Mid', 'Senior', 'C-level']
+LEVELS = ['Nice To Have', 'Junior', 'Regular', 'Advanced', 'Master']
+FIELDS = ['Python', 'Java', 'JavaScript', 'Analytics', 'DevOps', 'Testing', 'Data', 'Games', 'Mobile', 'Security']
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December']
+SKILLS = 300
+DISTRICTS = 380
+COMPANIES = 2000
+# Liczba ofert generowanych i zapisywanych na raz
+CHUNK = 1_000_000
+
+
+def register_sqlite_functions(engine):
+    """ YEAR/MONTH jak w SQL Server - używane w zapytaniach stron """
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        if isinstance(dbapi_connection, sqlite3.Connection):
+            dbapi_connection.create_function("YEAR", 1, lambda value: int(value[:4]) if value else None, deterministic=True)
+            dbapi_connection.create_function("MONTH", 1, lambda value: int(value[5:7]) if value else None, deterministic=True)
+
+
+def _dimensions(rng, days, cities):
+    """ Tabele wymiarów (małe - tworzone w całości) """
+    today = datetime.date.today()
+    dates = [today - datetime.timedelta(days=i) for i in range(days)][::-1]
+    frames = {
+        "Dates": pd.DataFrame({"date_id": np.arange(1, days + 1), "date_full": [d.isoformat() for d in dates],
+                               "day_name": [DAYS[d.weekday()] for d in dates], "month_name": [MONTHS[d.month - 1] for d in dates]}),
+        "Experience_Levels": pd.DataFrame({"experience_level_id": np.arange(1, 5), "experience_level_name": EXPERIENCE}),
+        "Levels": pd.DataFrame({"level_id": np.arange(1, 6), "level_name": LEVELS}),
+        "Fields": pd.DataFrame({"field_id": np.arange(1, len(FIELDS) + 1), "field_name": FIELDS}),
+        "Skills": pd.DataFrame({"skill_id": np.arange(1, SKILLS + 1), "skill_name": [f"Skill {i}" for i in range(1, SKILLS + 1)]}),
+        "Provinces": pd.DataFrame({"province_id": np.arange(1, 17), "province_name": PROVINCES}),
+    }
+    frames["Districts"] = pd.DataFrame({"district_id": np.arange(1, DISTRICTS + 1),
+                                        "district_id_gus": [f"{(i % 16) * 2 + 2}_{i // 16 + 1}" for i in range(DISTRICTS)],
+                                        "province_id": [(i % 16) + 1 for i in range(DISTRICTS)]})
+    frames["Cities"] = pd.DataFrame({"city_id": np.arange(1, len(cities) + 1), "city_name": cities["city_name"],
+                                     "is_polish": 1, "district_id": rng.integers(1, DISTRICTS + 1, len(cities))})
+    frames["Companies"] = pd.DataFrame({"company_id": np.arange(1, COMPANIES + 1), "company_name": [f"Firma {i}" for i in range(1, COMPANIES + 1)]})
+    return frames
+
+
+def _offers(rng, first_id, count, days, cities, city_weights):
+    """ Partia ofert o identyfikatorach od `first_id` wraz z technologiami i wynagrodzeniami """
+    city_ids = rng.choice(np.arange(1, len(cities) + 1), count, p=city_weights)
+    lat = cities["latitude"].to_numpy()[city_ids - 1] + rng.normal(0, 0.03, count)
+    lon = cities["longitude"].to_numpy()[city_ids - 1] + rng.normal(0, 0.05, count)
+    ids = np.arange(first_id, first_id + count)
+    suffix = pd.Series(ids).astype(str)
+    frames = {"Job_Offers": pd.DataFrame({
+        "job_offer_id": ids, "job_title": "Developer " + (pd.Series(ids) % 50).astype(str), "job_offer_name": "oferta-" + suffix,
+        "date_id": rng.integers(1, days + 1, count), "experience_level_id": rng.choice([1, 2, 3, 4], count, p=[0.25, 0.4, 0.3, 0.05]),
+        "field_id": rng.integers(1, len(FIELDS) + 1, count), "city_id": city_ids, "company_id": rng.integers(1, COMPANIES + 1, count),
+        "latitude": lat, "longitude": lon})}
+    per_offer = rng.integers(1, 6, count)
+    frames["Job_Offers_Skills"] = pd.DataFrame({"job_offer_id": np.repeat(ids, per_offer),
+                                                "skill_id": rng.zipf(1.5, per_offer.sum()) % SKILLS + 1,
+                                                "level_id": rng.integers(1, 6, per_offer.sum())}).drop_duplicates(["job_offer_id", "skill_id"])
+    salary_from = rng.integers(4, 30, count) * 1000
+    frames["Salaries"] = pd.DataFrame({"salary_id": ids, "salary_from": salary_from, "salary_to": salary_from + rng.integers(0, 15, count) * 1000})
+    frames["Job_Offers_Salaries"] = pd.DataFrame({"job_offer_id": ids, "salary_id": ids})
+    return frames
+
+
+def generate(path, offers=100_000, days=800, seed=0, chunk=CHUNK, summaries=False):
+    """
+    Tworzy (nadpisuje) bazę SQLite z `offers` ofertami z ostatnich `days` dni. Oferty są
+    generowane i zapisywane partiami po `chunk`, więc pamięć nie rośnie ze skalą
+    (od 100 tys. do dziesiątek milionów ofert). Z `summaries=True` buduje też tabele
+    podsumowań (podsumowania.SUMMARIES).
+    """
+    rng = np.random.default_rng(seed)
+    con = sqlite3.connect(path)
+    # Baza tylko do pomiarów - bez dziennika i synchronizacji, ładowanie jest wielokrotnie szybsze
+    con.execute("PRAGMA journal_mode=OFF")
+    con.execute("PRAGMA synchronous=OFF")
+    cities = pd.read_csv("cities/cities_z_koordynatami.csv")
+    weights = 1.0 / np.arange(1, len(cities) + 1) ** 1.2
+    for name, frame in _dimensions(rng, days, cities).items():
+        frame.to_sql(name, con, if_exists="replace", index=False)
+    started = time.perf_counter()
+    for first in range(0, offers, chunk):
+        count = min(chunk, offers - first)
+        for name, frame in _offers(rng, first + 1, count, days, cities, weights / weights.sum()).items():
+            frame.to_sql(name, con, if_exists="replace" if first == 0 else "append", index=False, chunksize=100_000)
+        con.commit()
+        logger.info("Zapisano %d z %d ofert (%.0f s)", first + count, offers, time.perf_counter() - started)
+    con.execute("CREATE INDEX ix_jo_date ON Job_Offers(date_id)")
+    con.execute("CREATE INDEX ix_jos_offer ON Job_Offers_Skills(job_offer_id)")
+    con.commit()
+    if summaries:
+        from podsumowania import MIN_DATE_ID, SUMMARIES
+        for name, (ddl, insert) in SUMMARIES.items():
+            con.execute(f"DROP TABLE IF EXISTS {name}")
+            con.execute(ddl)
+            con.execute(insert, {"date_from": MIN_DATE_ID})
+        con.commit()
+    con.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generuje syntetyczną hurtownię ofert pracy (SQLite)")
+    parser.add_argument("path", help="plik bazy SQLite")
+    parser.add_argument("--oferty", type=int, default=100_000, help="liczba ofert (skala)")
+    parser.add_argument("--dni", type=int, default=800, help="liczba dni historii")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--partia", type=int, default=CHUNK, help="liczba ofert generowanych na raz")
+    parser.add_argument("--podsumowania", action="store_true", help="buduje też tabele podsumowań")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    generate(args.path, args.oferty, args.dni, args.seed, args.partia, args.podsumowania)
@@ -0,0 +1,267 @@
+import functools
+import hashlib
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+import instrumentacja
+import migawki
+import profiler
+from baza_danych import connect
+from ustawienia import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Tania sonda wersji hurtowni - wyniki są unieważniane dopiero po załadowaniu nowych ofert
+VERSION_QUERY = get_setting("cache", "VERSION_QUERY", "SELECT MAX(date_id) FROM Job_Offers")
+VERSION_PROBE_INTERVAL = get_setting("cache", "VERSION_PROBE_INTERVAL", 60)
+DEFAULT_TTL = get_setting("cache", "TTL", 24 * 3600)
+MAX_ENTRIES = get_setting("cache", "MAX_ENTRIES", 256)
+MAX_BYTES = get_setting("cache", "MAX_MB", 1024) * 1024 * 1024
+# Jak długo serwowana jest nieaktualna migawka, zanim odświeżenie zostanie ponowione
+STALE_TTL = get_setting("snapshot", "STALE_TTL", 300)
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # klucz -> (wartość, czas utworzenia, ttl, rozmiar w bajtach)
+_inflight = {}  # klucz -> blokada, żeby równoległe sesje nie wykonywały tego samego zapytania
+_refreshing = set()  # klucze odświeżane w tle po podaniu migawki
+_total_bytes = 0
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "snapshot_hits": 0, "snapshot_stale": 0}
+
+_version = None
+_version_checked = 0.0
+_version_probing = False  # sondę wykonuje jedna sesja naraz
+_version_ready = threading.Event()  # ustawiane po pierwszej sondzie
+_version_lock = threading.Lock()
+
+
+def warehouse_version():
+    """
+    Zwraca wersję danych w hurtowni (sprawdzaną co VERSION_PROBE_INTERVAL sekund).
+    Sondę wykonuje jeden wątek poza blokadą; pozostałe sesje w tym czasie dostają
+    ostatnią znaną wersję (przed pierwszą sondą - czekają na jej wynik).
+    """
+    global _version, _version_checked, _version_probing
+    with _version_lock:
+        probe = not _version_probing and time.monotonic() - _version_checked >= VERSION_PROBE_INTERVAL
+        if probe:
+            _version_probing = True
+    if not probe:
+        _version_ready.wait()
+        return _version
+    try:
+        with connect() as connection:
+            version = connection.execute(text(VERSION_QUERY)).scalar()
+        if version != _version and _version is not None:
+            # Nowe oferty w hurtowni - wpisy ze starą wersją nie będą już trafiane
+            logger.info("Zmiana wersji hurtowni: %s -> %s", _version, version)
+            clear()
+        _version = version
+    except Exception:
+        # Sonda nie może zablokować strony - zostajemy przy ostatniej znanej wersji
+        logger.warning("Nie udało się sprawdzić wersji hurtowni", exc_info=True)
+    finally:
+        with _version_lock:
+            _version_checked = time.monotonic()
+            _version_probing = False
+        _version_ready.set()
+    return _version
+
+
+def _size_of(value, seen=None):
+    # Rozmiar w bajtach łącznie z zagnieżdżonymi tablicami NumPy i obiektami pandas (kostki,
+    # krotki tablic, słowniki kategorii); obiekt współdzielony liczony raz
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, pd.Categorical):
+        return int(value.nbytes)
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_size_of(key, seen) + _size_of(item, seen) for key, item in value.items())
+    if isinstance(value, (tuple, list, set, frozenset)):
+        return sys.getsizeof(value) + sum(_size_of(item, seen) for item in value)
+    return sys.getsizeof(value)
+
+
+def _code_hash(func):
+    # Tekst zapytania jest stałą w kodzie funkcji - zmiana zapytania zmienia klucz
+    code = func.__code__
+    return hashlib.sha1(repr((code.co_code, code.co_consts)).encode("utf-8")).hexdigest()
+
+
+def _evict_locked():
+    global _total_bytes
+    now = time.monotonic()
+    for key in [key for key, (_, created, ttl, _) in _entries.items() if now - created > ttl]:
+        _total_bytes -= _entries.pop(key)[3]
+        _stats["expired"] += 1
+    while _entries and (len(_entries) > MAX_ENTRIES or _total_bytes > MAX_BYTES):
+        _, (_, _, _, size) = _entries.popitem(last=False)
+        _total_bytes -= size
+        _stats["evictions"] += 1
+
+
+def _lookup(key):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            value, created, ttl, _ = entry
+            if time.monotonic() - created <= ttl:
+                _entries.move_to_end(key)
+                _stats["hits"] += 1
+                return True, value
+    return False, None
+
+
+def _store(key, value, ttl):
+    global _total_bytes
+    size = _size_of(value)
+    with _lock:
+        if key in _entries:
+            _total_bytes -= _entries.pop(key)[3]
+        _entries[key] = (value, time.monotonic(), ttl, size)
+        _total_bytes += size
+        _evict_locked()
+
+
+def _loader_name(func):
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+def _call(func, args, kwargs):
+    """ Wykonuje loader przy chybieniu cache, mierząc jego czas i zapytania SQL (instrumentacja.py) """
+    with instrumentacja.loader_call(_loader_name(func)) as call:
+        call["value"] = func(*args, **kwargs)
+    return call["value"]
+
+
+def _refresh(func, key, path, args, kwargs, ttl):
+    try:
+        value = _call(func, args, kwargs)
+    except Exception:
+        logger.warning("Odświeżenie %s w tle nie powiodło się - zostaje migawka", path, exc_info=True)
+    else:
+        _store(key, value, ttl)
+        migawki.write(path, value, version=key[-1])
+    finally:
+        with _lock:
+            _refreshing.discard(key)
+
+
+def _load_snapshot(func, key, path, args, kwargs, ttl):
+    """
+    Ramka z migawki na dysku, jeśli istnieje. Migawka z bieżącej wersji hurtowni jest
+    podawana wprost; starsza (albo gdy wersji nie da się sprawdzić, bo baza nie odpowiada)
+    jest podawana od razu, a wynik jest odświeżany w tle.
+    """
+    value, meta = migawki.read(path)
+    if value is None:
+        return None
+    version = key[-1]
+    if version is not None and str(meta.get("version")) == str(version):
+        _store(key, value, ttl)
+        with _lock:
+            _stats["snapshot_hits"] += 1
+        instrumentacja.record_hit(_loader_name(func), snapshot=True)
+        return value
+    _store(key, value, STALE_TTL)
+    instrumentacja.record_hit(_loader_name(func), snapshot=True)
+    with _lock:
+        _stats["snapshot_stale"] += 1
+        start = key not in _refreshing
+        _refreshing.add(key)
+    if start:
+        threading.Thread(target=_refresh, args=(func, key, path, args, kwargs, ttl),
+                         name=f"migawka-{func.__qualname__}", daemon=True).start()
+    return value
+
+
+def query_cache(func=None, *, ttl=None, snapshot=False):
+    """
+    Dekorator funkcji pobierających dane z hurtowni.
+
+    Klucz: moduł i nazwa funkcji, hash jej kodu (w tym tekstu zapytania), argumenty
+    oraz wersja hurtowni. Zwracanych ramek nie należy modyfikować w miejscu -
+    są współdzielone między sesjami. Z `snapshot=True` wynik (DataFrame) jest też
+    zapisywany w migawce na dysku (migawki.py), z której strona startuje po restarcie
+    i którą serwuje, gdy baza jest niedostępna.
+    """
+    if func is None:
+        return functools.partial(query_cache, ttl=ttl, snapshot=snapshot)
+
+    entry_ttl = DEFAULT_TTL if ttl is None else ttl
+    code_hash = _code_hash(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (func.__module__, func.__qualname__, code_hash, args, tuple(sorted(kwargs.items())), warehouse_version())
+        found, value = _lookup(key)
+        if found:
+            instrumentacja.record_hit(_loader_name(func))
+            return value
+        with _lock:
+            key_lock = _inflight.get(key)
+            # Tylko sesja, która utworzyła blokadę, usuwa ją z _inflight
+            creator = key_lock is None
+            if creator:
+                key_lock = _inflight[key] = threading.Lock()
+        try:
+            with key_lock:
+                # Inna sesja mogła w międzyczasie wykonać to samo zapytanie
+                found, value = _lookup(key)
+                if found:
+                    instrumentacja.record_hit(_loader_name(func))
+                    return value
+                with _lock:
+                    _stats["misses"] += 1
+                value = None
+                if snapshot:
+                    path = migawki.snapshot_path(_loader_name(func), code_hash, args, tuple(sorted(kwargs.items())))
+                    value = _load_snapshot(func, key, path, args, kwargs, entry_ttl)
+                if value is None:
+                    value = _call(func, args, kwargs)
+                    _store(key, value, entry_ttl)
+                    if snapshot:
+                        migawki.write(path, value, version=key[-1])
+        finally:
+            # Także po wyjątku loadera - czekające sesje ponowią zapytanie, a wpis nie zostaje w _inflight.
+            # Sprawdzenie tożsamości: wpis mógł już zostać zastąpiony blokadą nowszego wywołania
+            if creator:
+                with _lock:
+                    if _inflight.get(key) is key_lock:
+                        del _inflight[key]
+        return value
+
+    # W profilowanym przebiegu strony (profiler.py) wywołanie loadera jest sekcją danych
+    return profiler.profiled(_loader_name(func), "data")(wrapper)
+
+
+def clear():
+    """ Czyści cały cache zapytań """
+    global _total_bytes
+    with _lock:
+        _entries.clear()
+        _total_bytes = 0
+
+
+def cache_stats():
+    """ Zwraca statystyki cache (trafienia, chybienia, wyrzucenia, zajęta pamięć) """
+    with _lock:
+        stats = dict(_stats)
+        stats["entries"] = len(_entries)
+        stats["bytes"] = _total_bytes
+    stats["version"] = _version
+    return stats
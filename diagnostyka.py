@@ -0,0 +1,113 @@
+"""
+Ukryta strona diagnostyczna: czas loaderów i zapytań SQL, log wolnych zapytań oraz stan
+cache, puli połączeń, migawek i agregatów. Widoczna w menu tylko po ustawieniu [diagnostics]
+SHOW_PAGE w secrets (strona pokazuje tekst zapytań SQL i ich parametry).
+"""
+import pandas as pd
+import streamlit as st
+
+import instrumentacja
+import profiler
+from baza_danych import pool_stats
+from cache_zapytan import cache_stats
+from harmonogram import latency_report
+from migawki import snapshot_stats
+from oferty_miast import store_stats
+from przyrostowe import watermarks
+from rozgrzewanie import warm_report
+from schemat import memory_report
+from strony import PAGES, import_report
+from ustawienia import get_setting
+
+ENABLED = get_setting("diagnostics", "SHOW_PAGE", False)
+
+# Moduł strony -> nazwa w menu (loadery spoza stron, np. podsumowania, trafiają do "inne")
+_PAGE_BY_MODULE = {module: name for name, module in PAGES.items()}
+
+
+def _page(loader):
+    if not loader:
+        return "inne"
+    return _PAGE_BY_MODULE.get(loader.split(".", 1)[0], "inne")
+
+
+def loader_frame():
+    """ Liczniki loaderów jako ramka, z przypisaniem do strony """
+    df = pd.DataFrame.from_dict(instrumentacja.loader_stats(), orient="index")
+    if df.empty:
+        return df
+    df.index.name = "loader"
+    df = df.reset_index()
+    df.insert(0, "strona", df["loader"].map(_page))
+    return df.sort_values("seconds", ascending=False, ignore_index=True)
+
+
+def statement_frame():
+    """ Liczniki zapytań SQL jako ramka, z przypisaniem do loadera i strony """
+    df = pd.DataFrame.from_dict(instrumentacja.statement_stats(), orient="index")
+    if df.empty:
+        return df
+    df.index.name = "statement"
+    df = df.reset_index()
+    df.insert(0, "strona", df["loader"].map(_page))
+    df["avg_seconds"] = df["seconds"] / df["calls"]
+    return df.sort_values("seconds", ascending=False, ignore_index=True)
+
+
+def main():
+    st.title("Diagnostyka")
+    if not ENABLED:
+        st.error("Strona diagnostyczna jest wyłączona ([diagnostics] SHOW_PAGE).")
+        return
+
+    statements = statement_frame()
+    st.subheader("Czas bazy danych według stron")
+    if statements.empty:
+        st.write("Brak wykonanych zapytań od startu procesu (lub od wyzerowania liczników).")
+    else:
+        per_page = statements.groupby("strona", as_index=False).agg(
+            zapytania=("calls", "sum"), seconds=("seconds", "sum"), fetch_seconds=("fetch_seconds", "sum"), rows=("rows", "sum"))
+        st.dataframe(per_page.sort_values("seconds", ascending=False), hide_index=True)
+
+    st.subheader("Loadery")
+    st.dataframe(loader_frame(), hide_index=True)
+
+    st.subheader("Zapytania SQL")
+    st.dataframe(statements, hide_index=True)
+
+    st.subheader(f"Wolne (> {instrumentacja.SLOW_QUERY_MS} ms) i zakończone błędem zapytania")
+    slow = pd.DataFrame(instrumentacja.slow_queries())
+    if not slow.empty:
+        slow["time"] = pd.to_datetime(slow["time"], unit="s")
+    st.dataframe(slow, hide_index=True)
+
+    if st.button("Wyzeruj liczniki zapytań"):
+        instrumentacja.reset()
+        st.rerun()
+
+    left, right = st.columns(2)
+    with left:
+        st.subheader("Cache zapytań")
+        st.json(cache_stats())
+        st.subheader("Pula połączeń")
+        st.json(pool_stats())
+        st.subheader("Migawki")
+        st.json(snapshot_stats())
+        st.subheader("Magazyn ofert miast")
+        st.json(store_stats())
+    with right:
+        st.subheader("Agregaty przyrostowe")
+        st.json(watermarks())
+        st.subheader("Zapytania równoległe stron")
+        st.json(latency_report())
+        st.subheader("Rozgrzewanie")
+        st.json(warm_report())
+        st.subheader("Import stron")
+        st.json(import_report())
+    st.subheader("Pamięć ramek")
+    st.json(memory_report())
+
+    st.subheader("Profile ostatnich przebiegów stron")
+    for profile in profiler.last_runs():
+        with st.expander(f"{profile['page']} - {profile['root']['seconds'] * 1000:.0f} ms"):
+            st.code(profile["summary"], language=None)
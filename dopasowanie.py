@@ -0,0 +1,188 @@
+"""
+Dopasowanie rozkładu Pareto metodą największej wiarygodności (Clauset, Shalizi, Newman 2009).
+
+Dla każdego kandydata x_m (kolejne wartości danych) parametr kształtu alfa to estymator
+Hilla na ogonie x >= x_m, a wybierany jest x_m o najmniejszej odległości Kołmogorowa-Smirnowa
+między ogonem a dopasowanym rozkładem. Wszystkie kandydaty są liczone naraz (macierzowo).
+Przedziały ufności - bootstrap, z losowaniami rozdzielonymi na wątki. fit_groups dopasowuje
+wiele grup (np. miesięcy) w jednym przebiegu macierzowym.
+"""
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from ustawienia import get_setting
+
+# Najmniejszy ogon (liczba miast), dla którego dopasowanie ma sens
+MIN_TAIL = get_setting("pareto_fit", "MIN_TAIL", 10)
+# Limit kandydatów x_m - przy bardzo wielu różnych wartościach brane są równo rozłożone kwantyle
+MAX_CANDIDATES = get_setting("pareto_fit", "MAX_CANDIDATES", 400)
+BOOTSTRAP = get_setting("pareto_fit", "BOOTSTRAP", 200)
+WORKERS = get_setting("pareto_fit", "WORKERS", min(os.cpu_count() or 1, 8))
+# Wielkość bloku kandydatów liczonych razem (ogranicza pamięć macierzy kandydaci x dane)
+_BLOCK = 64
+# Najmniejsza średnia log(x / x_m) w ogonie - poniżej ogon jest praktycznie stały (alfa -> nieskończoność)
+_MIN_LOG_RATIO = 1e-9
+# Limit par (kandydat, element ogona) liczonych naraz przy dopasowaniu wielu grup
+_PAIRS = 2_000_000
+
+ParetoFit = namedtuple("ParetoFit", ["xm", "alpha", "ks", "tail", "n", "alpha_ci", "xm_ci", "bootstrap"])
+
+
+def _candidates(x):
+    """ Indeksy pierwszego wystąpienia każdej wartości, z ogonem co najmniej MIN_TAIL """
+    starts = np.flatnonzero(np.r_[True, x[1:] != x[:-1]])
+    starts = starts[len(x) - starts >= min(MIN_TAIL, len(x))]
+    if len(starts) > MAX_CANDIDATES:
+        starts = starts[np.unique(np.linspace(0, len(starts) - 1, MAX_CANDIDATES).astype(int))]
+    return starts
+
+
+def _fit_sorted(x):
+    """ (x_m, alfa, KS, wielkość ogona) dla posortowanych rosnąco dodatnich danych """
+    n = len(x)
+    log_x = np.log(x)
+    # Sumy logarytmów ogonów: suffix[i] = sum(log x[i:])
+    suffix = np.concatenate((np.cumsum(log_x[::-1])[::-1], [0.0]))
+    starts = _candidates(x)
+    tails = n - starts
+    log_xm = log_x[starts]
+    denominator = suffix[starts] - tails * log_xm
+    valid = denominator > _MIN_LOG_RATIO * tails
+    starts, tails, log_xm = starts[valid], tails[valid], log_xm[valid]
+    if len(starts) == 0:
+        return float(x[0]), float("nan"), float("nan"), n
+    alphas = tails / denominator[valid]
+
+    positions = np.arange(n)
+    ks = np.empty(len(starts))
+    for block in range(0, len(starts), _BLOCK):
+        rows = slice(block, block + _BLOCK)
+        start, tail, alpha = starts[rows, None], tails[rows, None], alphas[rows, None]
+        in_tail = positions >= start
+        model = 1 - np.exp(alpha * (log_xm[rows, None] - log_x))
+        upper = (positions - start + 1) / tail
+        distance = np.maximum(np.abs(upper - model), np.abs(upper - 1 / tail - model))
+        ks[rows] = np.where(in_tail, distance, 0).max(axis=1)
+    best = int(np.argmin(ks))
+    return float(x[starts[best]]), float(alphas[best]), float(ks[best]), int(tails[best])
+
+
+def _bootstrap_chunk(x, count, seed):
+    rng = np.random.default_rng(seed)
+    results = np.empty((count, 2))
+    for i in range(count):
+        xm, alpha, _, _ = _fit_sorted(np.sort(rng.choice(x, len(x))))
+        results[i] = (xm, alpha)
+    return results
+
+
+def fit(values, bootstrap=None, seed=0, confidence=0.95):
+    """
+    Dopasowuje rozkład Pareto do dodatnich wartości `values`. Zwraca ParetoFit z x_m, alfa
+    (estymator Hilla), odległością KS, wielkością ogona i przedziałami ufności z `bootstrap`
+    prób (percentylowe, na poziomie `confidence`).
+    """
+    x = np.sort(np.asarray(values, dtype=np.float64))
+    x = x[x > 0]
+    if len(x) < 2:
+        return ParetoFit(xm=float(x[0]) if len(x) else float("nan"), alpha=float("nan"), ks=float("nan"), tail=len(x), n=len(x),
+                         alpha_ci=(float("nan"), float("nan")), xm_ci=(float("nan"), float("nan")), bootstrap=np.empty((0, 2)))
+    xm, alpha, ks, tail = _fit_sorted(x)
+
+    bootstrap = BOOTSTRAP if bootstrap is None else bootstrap
+    samples = np.empty((0, 2))
+    if bootstrap > 0:
+        workers = max(min(WORKERS, bootstrap), 1)
+        counts = [len(part) for part in np.array_split(np.arange(bootstrap), workers)]
+        seeds = np.random.SeedSequence(seed).spawn(workers)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bootstrap-pareto") as executor:
+            samples = np.vstack(list(executor.map(_bootstrap_chunk, [x] * workers, counts, seeds)))
+    tails = 100 * (1 - confidence) / 2, 100 * (1 + confidence) / 2
+    finite = samples[np.isfinite(samples[:, 1])]
+    if len(finite):
+        xm_ci = tuple(float(value) for value in np.percentile(finite[:, 0], tails))
+        alpha_ci = tuple(float(value) for value in np.percentile(finite[:, 1], tails))
+    else:
+        xm_ci = alpha_ci = (float("nan"), float("nan"))
+    return ParetoFit(xm=xm, alpha=alpha, ks=ks, tail=tail, n=len(x), alpha_ci=alpha_ci, xm_ci=xm_ci, bootstrap=samples)
+
+
+def fit_groups(groups, values):
+    """
+    Dopasowanie (x_m, alfa, KS, ogon) dla wielu grup naraz (np. miesięcy), bez bootstrapu.
+    Wszystkie grupy są sortowane razem, a kandydaci x_m wszystkich grup liczeni wspólnie -
+    wynik dla każdej grupy jest taki sam jak z fit(..., bootstrap=0).
+    """
+    groups = np.asarray(groups)
+    x = np.asarray(values, dtype=np.float64)
+    positive = x > 0
+    groups, x = groups[positive], x[positive]
+    order = np.lexsort((x, groups))
+    groups, x = groups[order], x[order]
+    columns = ["grupa", "xm", "alpha", "ks", "tail", "n"]
+    if len(x) == 0:
+        return pd.DataFrame(columns=columns)
+
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    sizes = np.diff(np.r_[starts, len(x)])
+    ends = starts + sizes
+    group_of = np.repeat(np.arange(len(starts)), sizes)
+    # Logarytmy względem minimum grupy - sumy prefiksowe bez utraty dokładności między grupami
+    log_x = np.log(x) - np.repeat(np.log(x[starts]), sizes)
+    cumulative = np.r_[0.0, np.cumsum(log_x)]
+
+    # Kandydaci: pierwsze wystąpienie wartości w grupie, z ogonem co najmniej min(MIN_TAIL, n)
+    first = np.r_[True, (x[1:] != x[:-1]) | (groups[1:] != groups[:-1])]
+    candidates = np.flatnonzero(first & (ends[group_of] - np.arange(len(x)) >= np.minimum(MIN_TAIL, sizes)[group_of]))
+    owner = group_of[candidates]
+    per_group = np.bincount(owner, minlength=len(starts))
+    # Grupy z nadmiarem kandydatów - równo rozłożone kwantyle, jak w _candidates
+    rank = np.arange(len(candidates)) - np.repeat(np.r_[0, np.cumsum(per_group)[:-1]], per_group)
+    crowded = per_group[owner] > MAX_CANDIDATES
+    if crowded.any():
+        step = (per_group[owner[crowded]] - 1) / (MAX_CANDIDATES - 1)
+        # Ranga r jest trafiona, gdy floor(k * step) == r dla jakiegoś k (step >= 1 - co najwyżej jedno k)
+        k = np.ceil(rank[crowded] / step)
+        keep = ~crowded
+        keep[crowded] = (np.floor(k * step) == rank[crowded]) | (rank[crowded] == per_group[owner[crowded]] - 1)
+        candidates, owner = candidates[keep], owner[keep]
+
+    tails = ends[owner] - candidates
+    log_xm = log_x[candidates]
+    # Suma log(x / x_m) w ogonie kandydata (ogon kończy się z końcem grupy)
+    denominator = cumulative[ends[owner]] - cumulative[candidates] - tails * log_xm
+    valid = denominator > _MIN_LOG_RATIO * tails
+    candidates, owner, tails, log_xm = candidates[valid], owner[valid], tails[valid], log_xm[valid]
+    alphas = tails / denominator[valid]
+
+    # KS dla każdego kandydata - maksimum po jego ogonie; pary (kandydat, element) w porcjach
+    ks = np.empty(len(candidates))
+    bounds = np.r_[0, np.cumsum(tails)]
+    first_candidate = 0
+    while first_candidate < len(candidates):
+        last = max(int(np.searchsorted(bounds, bounds[first_candidate] + _PAIRS, side="right")) - 1, first_candidate + 1)
+        block = slice(first_candidate, last)
+        tail = tails[block]
+        index = np.repeat(np.arange(last - first_candidate), tail)
+        offset = np.arange(len(index)) - np.repeat(bounds[block] - bounds[first_candidate], tail)
+        model = 1 - np.exp(alphas[block][index] * (log_xm[block][index] - log_x[candidates[block][index] + offset]))
+        upper = (offset + 1) / tail[index]
+        distance = np.maximum(np.abs(upper - model), np.abs(upper - 1 / tail[index] - model))
+        ks[block] = np.maximum.reduceat(distance, np.r_[0, np.cumsum(tail)[:-1]])
+        first_candidate = last
+
+    # Najlepszy kandydat w grupie: najmniejsze KS, przy remisie najmniejsze x_m (jak np.argmin)
+    result = pd.DataFrame({"grupa": groups[starts], "xm": x[starts], "alpha": np.nan, "ks": np.nan, "tail": sizes, "n": sizes})
+    if len(candidates):
+        best = np.lexsort((candidates, ks, owner))
+        best = best[np.r_[True, owner[best][1:] != owner[best][:-1]]]
+        chosen = owner[best]
+        result.loc[chosen, "xm"] = x[candidates[best]]
+        result.loc[chosen, "alpha"] = alphas[best]
+        result.loc[chosen, "ks"] = ks[best]
+        result.loc[chosen, "tail"] = tails[best]
+    return result
@@ -0,0 +1,67 @@
+import json
+import os
+
+import geopandas as gpd
+import shapely
+import streamlit as st
+
+# Plik źródłowy -> (atrybuty zachowywane w wersjach uproszczonych, tolerancje w stopniach od najdokładniejszej)
+SIMPLIFIED_LEVELS = {
+    "wojewodztwa/woj.json": (["NAME_1"], [0.001, 0.005, 0.02]),
+    "powiaty/pow.json": (["NAME_2", "CC_2"], [0.0005, 0.002, 0.01]),
+}
+COORD_DECIMALS = 4  # ~11 m - niewidoczne w skali mapy kraju
+
+# Progi przybliżenia mapy (zoom) dla kolejnych, coraz dokładniejszych tolerancji
+ZOOM_THRESHOLDS = [8, 6]
+
+
+def simplified_path(path, tolerance):
+    """ Ścieżka pliku z geometrią uproszczoną z podaną tolerancją """
+    stem, extension = os.path.splitext(path)
+    return f"{stem}_{tolerance:g}{extension}"
+
+
+def simplify(gdf, tolerance):
+    """ Upraszcza geometrie, zachowując wspólne granice sąsiednich obszarów, i kwantuje współrzędne """
+    geometry = gdf.geometry
+    if hasattr(geometry, "simplify_coverage"):
+        geometry = geometry.simplify_coverage(tolerance)
+    else:
+        geometry = geometry.simplify(tolerance, preserve_topology=True)
+    geometry = shapely.set_precision(geometry.values, 10 ** -COORD_DECIMALS, mode="pointwise")
+    return gdf.set_geometry(gpd.GeoSeries(geometry, index=gdf.index))
+
+
+def tolerance_for_zoom(path, zoom):
+    """ Dobiera tolerancję do przybliżenia mapy - im większy zoom, tym dokładniejsza geometria """
+    tolerances = SIMPLIFIED_LEVELS[path][1]
+    for index, threshold in enumerate(ZOOM_THRESHOLDS):
+        if zoom >= threshold:
+            return tolerances[index]
+    return tolerances[-1]
+
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def _read_geometry(path, mtime, tolerance):
+    if tolerance is not None:
+        prepared = simplified_path(path, tolerance)
+        if os.path.exists(prepared) and os.path.getmtime(prepared) >= mtime:
+            path = prepared
+            tolerance = None
+    with open(path, "r", encoding="utf-8") as f:
+        geojson_data = json.load(f)
+    gdf = gpd.GeoDataFrame.from_features(geojson_data["features"])
+    if tolerance is not None:
+        # Brak przygotowanego pliku (uproszczenie_geometrii.py) - upraszczamy raz, w pamięci
+        gdf = simplify(gdf, tolerance)
+    return gdf
+
+
+def load_geometry(path, tolerance=None):
+    """
+    Zwraca GeoDataFrame z pliku GeoJSON, opcjonalnie w wersji uproszczonej z daną tolerancją.
+    Sparsowana geometria jest trzymana w cache procesu i wczytywana ponownie tylko
+    po zmianie pliku (mtime). Zwracanej ramki nie należy modyfikować w miejscu.
+    """
+    return _read_geometry(path, os.path.getmtime(path), tolerance)
@@ -0,0 +1,53 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ustawienia import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Wspólna dla wszystkich sesji pula wątków - mniejsza niż pula połączeń silnika ([pool] POOL_SIZE)
+MAX_WORKERS = get_setting("scheduler", "MAX_WORKERS", 4)
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="zapytania")
+_report = {}  # strona -> ostatni pomiar (czas całości i poszczególnych zapytań)
+_lock = threading.Lock()
+
+
+def _timed(name, func, submitted):
+    started = time.perf_counter()
+    try:
+        func()
+        error = None
+    except Exception as exc:
+        # Błąd ujawni się przy właściwym wywołaniu loadera na stronie
+        logger.warning("Zapytanie %s nie powiodło się w tle", name, exc_info=True)
+        error = repr(exc)
+    finished = time.perf_counter()
+    return {"wait": started - submitted, "seconds": finished - started, "error": error}
+
+
+def run_parallel(page, loaders):
+    """
+    Uruchamia niezależne loadery strony (nazwa -> funkcja bez argumentów) równolegle
+    na wspólnej puli wątków i czeka na wszystkie. Wyniki trafiają do cache zapytań,
+    więc strona wywołuje potem te same loadery bez czekania - zimna strona trwa tyle,
+    co najwolniejsze zapytanie, a nie suma wszystkich. Zwraca pomiary czasu.
+    """
+    started = time.perf_counter()
+    futures = {name: _executor.submit(_timed, name, func, started) for name, func in loaders.items()}
+    queries = {name: future.result() for name, future in futures.items()}
+    entry = {"seconds": time.perf_counter() - started, "queries": queries}
+    with _lock:
+        _report[page] = entry
+    logger.info("%s: %d zapytań równolegle w %.3f s (%s)", page, len(queries), entry["seconds"],
+                ", ".join(f"{name} {query['seconds']:.3f} s" for name, query in queries.items()))
+    return entry
+
+
+def latency_report():
+    """ Ostatni pomiar czasu zapytań dla każdej strony """
+    with _lock:
+        return {page: {"seconds": entry["seconds"], "queries": {name: dict(query) for name, query in entry["queries"].items()}}
+                for page, entry in _report.items()}
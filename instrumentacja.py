@@ -0,0 +1,171 @@
+import logging
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from ustawienia import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Zapytania wolniejsze niż próg trafiają do logu (WARNING) i do listy ostatnich wolnych zapytań
+SLOW_QUERY_MS = get_setting("diagnostics", "SLOW_QUERY_MS", 1000)
+SLOW_LOG_SIZE = get_setting("diagnostics", "SLOW_LOG_SIZE", 100)
+
+_lock = threading.Lock()
+_loaders = {}  # "moduł.funkcja" -> liczniki wywołań loadera (cache_zapytan.query_cache)
+_statements = {}  # skrócony tekst SQL -> liczniki wykonania zapytania
+_slow = deque(maxlen=SLOW_LOG_SIZE)
+_current = threading.local()  # loader wykonywany w bieżącym wątku - do przypisania mu zapytań SQL
+
+
+def _statement_key(statement):
+    return re.sub(r"\s+", " ", statement).strip()[:200]
+
+
+def _rows(value):
+    # Liczba wierszy wyniku loadera: ramka lub krotka ramek (np. ViewResult)
+    if hasattr(value, "shape") and hasattr(value, "columns"):
+        return len(value)
+    if isinstance(value, tuple):
+        counts = [_rows(item) for item in value]
+        counts = [count for count in counts if count is not None]
+        return sum(counts) if counts else None
+    return None
+
+
+def current_loader():
+    """ Nazwa loadera wykonywanego w bieżącym wątku (albo None) """
+    stack = getattr(_current, "stack", None)
+    return stack[-1] if stack else None
+
+
+@contextmanager
+def loader_call(name):
+    """
+    Kontekst wykonania loadera przy chybieniu cache: mierzy czas, zapisuje liczbę wierszy
+    wyniku (call["value"]) i przypisuje loaderowi zapytania SQL wykonane w tym czasie.
+    """
+    if not hasattr(_current, "stack"):
+        _current.stack = []
+    _current.stack.append(name)
+    call = {"value": None}
+    started = time.perf_counter()
+    failed = False
+    try:
+        yield call
+    except Exception:
+        failed = True
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        _current.stack.pop()
+        with _lock:
+            entry = _loader_entry(name)
+            entry["misses"] += 1
+            entry["seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+            if failed:
+                entry["errors"] += 1
+            else:
+                entry["rows"] = _rows(call["value"])
+
+
+def _loader_entry(name):
+    return _loaders.setdefault(name, {"hits": 0, "misses": 0, "snapshots": 0, "errors": 0,
+                                      "seconds": 0.0, "max_seconds": 0.0, "rows": None})
+
+
+def _statement_entry(key, loader):
+    entry = _statements.setdefault(key, {"loader": loader, "calls": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0,
+                                         "rows": 0, "fetch_seconds": 0.0})
+    entry["loader"] = entry["loader"] or loader
+    return entry
+
+
+def record_hit(name, snapshot=False):
+    """ Trafienie w cache zapytań (w pamięci lub w migawce na dysku) """
+    with _lock:
+        entry = _loader_entry(name)
+        entry["snapshots" if snapshot else "hits"] += 1
+
+
+def record_fetch(statement, rows, seconds):
+    """ Liczba wierszy i czas pobrania wyniku zapytania (pobieranie.fetch_frame) """
+    with _lock:
+        entry = _statements.get(_statement_key(statement))
+        if entry is not None:
+            entry["rows"] += rows
+            entry["fetch_seconds"] += seconds
+
+
+def register(engine):
+    """ Mierzy czas wykonania każdego zapytania silnika i loguje wolne zapytania """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault("query_started", []).append((statement, time.perf_counter()))
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - connection.info["query_started"].pop()[1]
+        key = _statement_key(statement)
+        loader = current_loader()
+        with _lock:
+            entry = _statement_entry(key, loader)
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+            if seconds * 1000 >= SLOW_QUERY_MS:
+                _slow.append({"time": time.time(), "loader": loader, "seconds": seconds, "statement": key,
+                              "parameters": repr(parameters)[:200]})
+        if seconds * 1000 >= SLOW_QUERY_MS:
+            logger.warning("Wolne zapytanie (%.0f ms, loader %s): %s", seconds * 1000, loader, key)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        # Zapytanie zakończone błędem nie dochodzi do after_cursor_execute - zdejmujemy jego czas
+        # startu (o ile before_cursor_execute zdążył go zapisać) i zapisujemy je w logu wolnych zapytań
+        connection, statement = exception_context.connection, exception_context.statement
+        started = connection.info.get("query_started") if connection is not None else None
+        if not started or started[-1][0] != statement:
+            return
+        seconds = time.perf_counter() - started.pop()[1]
+        key = _statement_key(statement)
+        loader = current_loader()
+        error = repr(exception_context.original_exception)[:200]
+        with _lock:
+            entry = _statement_entry(key, loader)
+            entry["errors"] += 1
+            _slow.append({"time": time.time(), "loader": loader, "seconds": seconds, "statement": key,
+                          "parameters": repr(exception_context.parameters)[:200], "error": error})
+        logger.warning("Zapytanie zakończone błędem (%.0f ms, loader %s): %s - %s", seconds * 1000, loader, key, error)
+
+
+def loader_stats():
+    """ Liczniki każdego loadera: trafienia, chybienia, czas, wiersze ostatniego wyniku """
+    with _lock:
+        return {name: dict(entry) for name, entry in _loaders.items()}
+
+
+def statement_stats():
+    """ Liczniki każdego zapytania SQL (klucz: skrócony tekst) """
+    with _lock:
+        return {key: dict(entry) for key, entry in _statements.items()}
+
+
+def slow_queries():
+    """ Ostatnie zapytania wolniejsze niż SLOW_QUERY_MS lub zakończone błędem (pole "error"), od najnowszego """
+    with _lock:
+        return list(reversed(_slow))
+
+
+def reset():
+    """ Zeruje wszystkie liczniki """
+    with _lock:
+        _loaders.clear()
+        _statements.clear()
+        _slow.clear()
@@ -0,0 +1,93 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Liczby największych miast, dla których liczony jest udział w ofertach
+TOP_K = (1, 5, 10)
+# Udział największych miast (jako odsetek wszystkich miast) - np. 20% miast w zasadzie 80/20
+TOP_SHARES = (0.1, 0.2)
+
+# Krzywa Pareto/Lorenza: miasta od największej liczby ofert, skumulowane udziały i miary koncentracji
+ConcentrationCurve = namedtuple("ConcentrationCurve", ["counts", "cum_offers_pct", "cum_cities_pct", "frame",
+                                                       "gini", "hoover", "top_k", "top_shares"])
+
+
+def build_curve(counts):
+    """
+    Sortuje liczby ofert malejąco i w jednym przebiegu (jedna suma skumulowana) liczy krzywą
+    Pareto oraz współczynnik Giniego, indeks Hoovera i udział k największych miast.
+    """
+    counts = np.sort(np.asarray(counts, dtype=np.int64))[::-1]
+    n = len(counts)
+    total = int(counts.sum())
+    if n == 0 or total == 0:
+        empty = np.zeros(0)
+        return ConcentrationCurve(counts=counts, cum_offers_pct=empty, cum_cities_pct=empty,
+                                  frame=pd.DataFrame({"cum_miasta_pct": empty, "cum_oferty_pct": empty}),
+                                  gini=0.0, hoover=0.0, top_k={}, top_shares={})
+    cumsum = counts.cumsum()
+    cum_offers_pct = cumsum / total
+    # Ostatni punkt dokładnie 1.0 - próg 100% zawsze ma swoje miasto mimo błędów zaokrągleń
+    cum_offers_pct[-1] = 1.0
+    cum_cities_pct = np.arange(1, n + 1) / n
+    # Gini z tej samej sumy skumulowanej (miasta malejąco): 0 przy równym rozkładzie, (n - 1) / n przy jednym mieście
+    gini = float((2 * cumsum.sum() / total - (n + 1)) / n)
+    # Hoover: część ofert, którą trzeba by przenieść, żeby wszystkie miasta miały po równo
+    hoover = float(0.5 * np.abs(counts / total - 1 / n).sum())
+    top_k = {k: float(cum_offers_pct[min(k, n) - 1]) for k in TOP_K}
+    top_shares = {share: float(cum_offers_pct[max(int(np.ceil(share * n)), 1) - 1]) for share in TOP_SHARES}
+    frame = pd.DataFrame({"cum_miasta_pct": cum_cities_pct, "cum_oferty_pct": cum_offers_pct})
+    return ConcentrationCurve(counts=counts, cum_offers_pct=cum_offers_pct, cum_cities_pct=cum_cities_pct, frame=frame,
+                              gini=gini, hoover=hoover, top_k=top_k, top_shares=top_shares)
+
+
+def threshold(curve, offers_pct):
+    """
+    Pierwszy punkt krzywej, w którym największe miasta mają co najmniej `offers_pct` ofert
+    (wyszukiwanie binarne). Zwraca (udział miast, udział ofert, liczba miast).
+    """
+    index = min(int(np.searchsorted(curve.cum_offers_pct, offers_pct, side="left")), len(curve.counts) - 1)
+    return float(curve.cum_cities_pct[index]), float(curve.cum_offers_pct[index]), index + 1
+
+
+def build_curves(groups, counts):
+    """
+    Krzywe Pareto i miary koncentracji dla wielu grup (np. miesięcy) naraz - jedno sortowanie
+    (grupa, liczba ofert malejąco) i jedna suma skumulowana, bez pętli po grupach.
+    Zwraca (punkty krzywych z kolumną `grupa`, ramkę miar z wierszem na grupę).
+    """
+    groups = np.asarray(groups)
+    counts = np.asarray(counts, dtype=np.int64)
+    positive = counts > 0
+    groups, counts = groups[positive], counts[positive]
+    order = np.lexsort((-counts, groups))
+    groups, counts = groups[order], counts[order]
+    if len(counts) == 0:
+        columns = ["grupa", "miasta", "oferty", "gini", "hoover"] + [f"top_{k}" for k in TOP_K] + [f"top_{share * 100:.0f}pct" for share in TOP_SHARES]
+        return pd.DataFrame({"grupa": groups, "cum_miasta_pct": [], "cum_oferty_pct": []}), pd.DataFrame(columns=columns)
+
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    sizes = np.diff(np.r_[starts, len(counts)])
+    cumsum = counts.cumsum()
+    # Suma skumulowana w obrębie grupy: globalna minus suma wszystkich poprzednich grup
+    offsets = np.r_[0, cumsum[starts[1:] - 1]]
+    group_cumsum = cumsum - np.repeat(offsets, sizes)
+    totals = group_cumsum[starts + sizes - 1]
+    n = np.repeat(sizes, sizes)
+    total = np.repeat(totals, sizes)
+    rank = np.arange(len(counts)) - np.repeat(starts, sizes)
+
+    cum_offers_pct = group_cumsum / total
+    cum_offers_pct[starts + sizes - 1] = 1.0
+    cum_cities_pct = (rank + 1) / n
+    # Te same wzory co w build_curve, sumy w grupach przez np.add.reduceat
+    gini = (2 * np.add.reduceat(group_cumsum, starts) / totals - (sizes + 1)) / sizes
+    hoover = 0.5 * np.add.reduceat(np.abs(counts / total - 1 / n), starts)
+    measures = {"grupa": groups[starts], "miasta": sizes, "oferty": totals, "gini": gini, "hoover": hoover}
+    for k in TOP_K:
+        measures[f"top_{k}"] = cum_offers_pct[starts + np.minimum(k, sizes) - 1]
+    for share in TOP_SHARES:
+        measures[f"top_{share * 100:.0f}pct"] = cum_offers_pct[starts + np.maximum(np.ceil(share * sizes).astype(np.int64), 1) - 1]
+    points = pd.DataFrame({"grupa": groups, "cum_miasta_pct": cum_cities_pct, "cum_oferty_pct": cum_offers_pct})
+    return points, pd.DataFrame(measures)
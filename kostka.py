@@ -0,0 +1,72 @@
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Zagregowana kostka: osie to wymiary (kody kategorii), wartości to liczby ofert w int32
+Cube = namedtuple("Cube", ["dimensions", "categories", "counts", "memo", "lock"])
+
+MEMO_SIZE = 1024
+
+
+def build_cube(df, dimensions, measure="liczba_ofert"):
+    """ Buduje gęstą kostkę (int32) z ramki zagregowanej po podanych wymiarach """
+    codes = []
+    categories = {}
+    for dimension in dimensions:
+        dim_codes, dim_categories = pd.factorize(df[dimension], sort=True)
+        codes.append(dim_codes)
+        categories[dimension] = list(dim_categories)
+    counts = np.zeros([len(categories[dimension]) for dimension in dimensions], dtype=np.int32)
+    np.add.at(counts, tuple(codes), df[measure].to_numpy(dtype=np.int32))
+    return Cube(dimensions=tuple(dimensions), categories=categories, counts=counts, memo=OrderedDict(), lock=threading.Lock())
+
+
+def _masks(cube, filters):
+    masks = []
+    for dimension in cube.dimensions:
+        if dimension in filters:
+            masks.append(np.isin(np.array(cube.categories[dimension], dtype=object), list(filters[dimension])))
+        else:
+            masks.append(slice(None))
+    return masks
+
+
+def rollup(cube, filters, keep=()):
+    """ Sumuje kostkę po wymiarach spoza `keep`, uwzględniając filtry {wymiar: wartości} """
+    counts = cube.counts
+    for axis, mask in enumerate(_masks(cube, filters)):
+        if not isinstance(mask, slice):
+            counts = np.compress(mask, counts, axis=axis)
+    drop = tuple(axis for axis, dimension in enumerate(cube.dimensions) if dimension not in keep)
+    return counts.sum(axis=drop, dtype=np.int64)
+
+
+def top_n(cube, filters, dimension, n, breakdown=None):
+    """
+    Zwraca n największych kategorii wymiaru `dimension` dla danego zestawu filtrów
+    (oraz opcjonalnie ich rozbicie po wymiarze `breakdown`). Wyniki są zapamiętywane
+    dla każdej kombinacji filtrów, więc ponowne kliknięcie nie przelicza kostki.
+    """
+    key = (tuple(sorted((name, tuple(sorted(values))) for name, values in filters.items())), dimension, n, breakdown)
+    with cube.lock:
+        if key in cube.memo:
+            cube.memo.move_to_end(key)
+            return cube.memo[key]
+
+    keep = (dimension,) if breakdown is None else (dimension, breakdown)
+    selected = rollup(cube, filters, keep)
+    if breakdown is not None and cube.dimensions.index(breakdown) < cube.dimensions.index(dimension):
+        selected = selected.T  # wymiar główny zawsze na pierwszej osi
+    totals = selected if breakdown is None else selected.sum(axis=1)
+    order = np.argsort(-totals, kind="stable")[:n]
+    order = order[totals[order] > 0]
+    names = [cube.categories[dimension][i] for i in order]
+    result = (names, totals[order]) if breakdown is None else (names, totals[order], selected[order])
+
+    with cube.lock:
+        cube.memo[key] = result
+        if len(cube.memo) > MEMO_SIZE:
+            cube.memo.popitem(last=False)
+    return result
@@ -1,20 +1,122 @@
-from sqlalchemy import create_engine, text
-
 import streamlit as st
 import pandas as pd
 import altair as alt
 
-server = st.secrets["database"]["DB_SERVER"]
-database = st.secrets["database"]["DB_DATABASE"]
-username = st.secrets["database"]["DB_USERNAME"]
-password = st.secrets["database"]["DB_PASSWORD"]
-# Tworzenie łańcucha połączenia z bazą danych
-connection_string = f"mssql+pyodbc://{username}:{password}@{server}/{database}?driver=ODBC+Driver+17+for+SQL+Server&TrustServerCertificate=yes&charset=utf8"
-# Tworzenie silnika połączenia
-engine = create_engine(connection_string, use_setinputsizes=False) # https://github.com/sqlalchemy/sqlalchemy/issues/8681
- 
+from cache_zapytan import query_cache
+from profiler import step
+from przyrostowe import aggregate, load
+from schemat import compact
+from okna_czasowe import WINDOWS, build_cumulative, last_days, window_delta
+
+
+# Najdłuższe okno metryk (365 dni) razem z okresem porównawczym
+HISTORY_DAYS = 2 * 365
+LEVEL_ORDER = {"Junior": 0, "Mid": 1, "Senior": 2, "C-level": 3}
+DEFAULT_LEVELS = ["Junior", "Mid", "Senior"]
+
+
+# Dzienna liczba ofert w podziale na poziomy - tylko okno metryk (dni od :since), uzupełniana
+# przyrostowo o oferty dodane od ostatniego odczytu
+DAILY_COUNTS = aggregate("liczba_ofert.daily", '''
+    SELECT d.date_full, d.day_name, e.experience_level_name as experience_level, COUNT(j.job_offer_id) AS liczba_ofert
+    FROM Job_Offers as j JOIN Dates as d ON j.date_id=d.date_id JOIN Experience_Levels as e ON j.experience_level_id=e.experience_level_id
+    WHERE j.date_id >= :date_from AND j.date_id < :date_to AND d.date_full >= :since
+    GROUP BY d.date_full, d.day_name, e.experience_level_name
+''', keys=["date_full", "day_name", "experience_level"], summary=("Summary_Offers", '''
+    SELECT d.date_full, d.day_name, e.experience_level_name as experience_level, SUM(su.liczba_ofert) AS liczba_ofert
+    FROM Summary_Offers as su JOIN Dates as d ON su.date_id=d.date_id JOIN Experience_Levels as e ON su.experience_level_id=e.experience_level_id
+    WHERE su.date_id >= :date_from AND su.date_id < :date_to AND d.date_full >= :since
+    GROUP BY d.date_full, d.day_name, e.experience_level_name
+'''), since="date_full")
+
+# Liczba ofert w systemie dla każdego poziomu (cała historia, kilka wierszy)
+LEVEL_COUNTS = aggregate("liczba_ofert.levels", '''
+    SELECT e.experience_level_name as experience_level, COUNT(j.job_offer_id) AS liczba_ofert
+    FROM Job_Offers as j JOIN Experience_Levels as e ON j.experience_level_id=e.experience_level_id
+    WHERE j.date_id >= :date_from AND j.date_id < :date_to
+    GROUP BY e.experience_level_name
+''', keys=["experience_level"], summary=("Summary_Offers", '''
+    SELECT e.experience_level_name as experience_level, SUM(su.liczba_ofert) AS liczba_ofert
+    FROM Summary_Offers as su JOIN Experience_Levels as e ON su.experience_level_id=e.experience_level_id
+    WHERE su.date_id >= :date_from AND su.date_id < :date_to
+    GROUP BY e.experience_level_name
+'''))
+
+# Miesięczna liczba ofert w podziale na poziomy (cała historia zagregowana w SQL do miesięcy)
+MONTHLY_COUNTS = aggregate("liczba_ofert.monthly", '''
+    SELECT YEAR(d.date_full) AS year, MONTH(d.date_full) AS month, e.experience_level_name as experience_level, COUNT(j.job_offer_id) AS liczba_ofert
+    FROM Job_Offers as j JOIN Dates as d ON j.date_id=d.date_id JOIN Experience_Levels as e ON j.experience_level_id=e.experience_level_id
+    WHERE j.date_id >= :date_from AND j.date_id < :date_to
+    GROUP BY YEAR(d.date_full), MONTH(d.date_full), e.experience_level_name
+''', keys=["year", "month", "experience_level"], summary=("Summary_Offers", '''
+    SELECT YEAR(d.date_full) AS year, MONTH(d.date_full) AS month, e.experience_level_name as experience_level, SUM(su.liczba_ofert) AS liczba_ofert
+    FROM Summary_Offers as su JOIN Dates as d ON su.date_id=d.date_id JOIN Experience_Levels as e ON su.experience_level_id=e.experience_level_id
+    WHERE su.date_id >= :date_from AND su.date_id < :date_to
+    GROUP BY YEAR(d.date_full), MONTH(d.date_full), e.experience_level_name
+'''))
+
+
+@query_cache
+def get_counts(since):
+    """ Dzienna liczba ofert dla wszystkich poziomów od dnia `since` (okno metryk, a nie cała historia) """
+    df = load(DAILY_COUNTS, since)
+    df["date_full"] = pd.to_datetime(df["date_full"])
+    df["liczba_ofert"] = df["liczba_ofert"].astype("int64")
+    df = df.sort_values("date_full").reset_index(drop=True)
+    return compact(df, "liczba_ofert.get_counts")
+
+
+@query_cache(snapshot=True)
+def get_level_totals():
+    """ Liczba ofert w systemie dla każdego poziomu doświadczenia (kilka wierszy) """
+    df = load(LEVEL_COUNTS)
+    df["experience_level"] = df["experience_level"].astype(str)
+    df = df.sort_values(by="experience_level", key=lambda x: x.map(LEVEL_ORDER)).reset_index(drop=True)
+    return compact(df, "liczba_ofert.get_level_totals")
+
+
+@query_cache
+def get_daily(levels, start):
+    """ Dzienna liczba ofert dla wybranych poziomów od podanej daty """
+    df = get_counts(pd.Timestamp(start))
+    df = df[df["experience_level"].isin(list(levels))].reset_index(drop=True)
+    return compact(df, "liczba_ofert.get_daily")
+
+
+@query_cache
+def get_cumulative(levels, today):
+    """ Skumulowane dzienne sumy ofert dla wszystkich poziomów - liczone raz, potem każde okno to odczyt O(1) """
+    return build_cumulative(get_daily(levels, today - pd.Timedelta(days=HISTORY_DAYS - 1)), today)
+
+
+@query_cache(snapshot=True)
+def get_monthly_counts():
+    """ Miesięczna liczba ofert dla wszystkich poziomów (kilkaset wierszy) """
+    df = load(MONTHLY_COUNTS)
+    # 🔹 Kolumna "year_month" (np. "2023-01")
+    df["year_month"] = df["year"].astype(int).astype(str) + "-" + df["month"].astype(int).astype(str).str.zfill(2)
+    df = df[["year_month", "experience_level", "liczba_ofert"]].sort_values("year_month").reset_index(drop=True)
+    return compact(df, "liczba_ofert.get_monthly_counts")
+
+
+@query_cache
+def get_monthly(levels):
+    """ Miesięczna liczba ofert dla wybranych poziomów - wybór wierszy z agregatu miesięcznego """
+    df = get_monthly_counts()
+    df = df[df["experience_level"].isin(list(levels))].reset_index(drop=True)
+    return compact(df, "liczba_ofert.get_monthly")
+
+
+def warm_up():
+    """ Wypełnia cache dla domyślnego widoku strony (rozgrzewanie.py) """
+    levels = get_level_totals()["experience_level"].tolist()
+    get_cumulative(tuple(levels), pd.Timestamp.today().normalize())
+    for selected in (DEFAULT_LEVELS, levels):
+        get_monthly(tuple(sorted(selected)))
+
 
 def main():
+    step("style CSS", "serialize")
     # Custom CSS for styling
     st.markdown(
         """
@@ -161,26 +263,15 @@ def main():
         unsafe_allow_html=True
     )
 
-    @st.cache_data
-    def get_data():
-        with engine.connect() as connection:
-            df = pd.read_sql('''
-                SELECT d.date_full, d.day_name, d.month_name, e.experience_level_name as experience_level, COUNT(j.job_offer_id) AS liczba_ofert
-                FROM Job_Offers as j JOIN Dates as d ON j.date_id=d.date_id JOIN Experience_Levels as e ON j.experience_level_id=e.experience_level_id
-                GROUP BY d.date_full, d.day_name, d.month_name, e.experience_level_name
-                ORDER BY d.date_full ASC;
-            ''', connection)
-        df["date_full"] = pd.to_datetime(df["date_full"])
-        return df
-    
-    df = get_data()
+    step("filtry i metryki", "transform")
+    level_totals = get_level_totals()
 
     # Sidebar – wybór poziomu doświadczenia
     st.sidebar.title("Wybierz poziom doświadczenia")
-    job_levels_options = df["experience_level"].unique().tolist()
+    job_levels_options = level_totals["experience_level"].tolist()
 
     if "selected_levels" not in st.session_state:
-        st.session_state["selected_levels"] = ["Junior", "Mid", "Senior"]
+        st.session_state["selected_levels"] = DEFAULT_LEVELS
 
     selected_levels = []
     for level in job_levels_options:
@@ -188,25 +279,21 @@ def main():
             selected_levels.append(level)
 
     st.session_state["selected_levels"] = selected_levels
+    levels_key = tuple(sorted(selected_levels))
+
+    # Sidebar – okres pierwszej metryki
+    selected_window = st.sidebar.selectbox("Okres porównania", list(WINDOWS), index=0)
+
+    # Dynamiczne metryki - sumy skumulowane dla wszystkich poziomów, wybór poziomów to wybór kolumn
+    today = pd.Timestamp.today().normalize()
+    counts = get_cumulative(tuple(job_levels_options), today)
+    offers_last_week, offers_ll_week = window_delta(counts, selected_levels, selected_window, today)
+    offers_last_month, offers_ll_month = window_delta(counts, selected_levels, "Ostatnie 30 dni", today)
+    offers_last_year, offers_ll_year = window_delta(counts, selected_levels, "Ostatnie 365 dni", today)
+    total_offers = int(level_totals.loc[level_totals["experience_level"].isin(selected_levels), "liczba_ofert"].sum())
 
-    # Filtrowanie danych na podstawie wybranego poziomu doświadczenia
-    filtered_df = df[df["experience_level"].isin(st.session_state["selected_levels"])]
-
-    # Dynamiczne metryki
-    today = pd.Timestamp.today()
-    offers_last_week = filtered_df[filtered_df["date_full"] >= (today - pd.Timedelta(days=1)) - pd.Timedelta(days=6)]["liczba_ofert"].sum()
-    offers_ll_week = filtered_df[
-        (filtered_df["date_full"] <= (today - pd.Timedelta(days=1)) - pd.Timedelta(days=6)) &
-        (filtered_df["date_full"] >= (today - pd.Timedelta(days=1)) - pd.Timedelta(days=13))]["liczba_ofert"].sum()
-    offers_last_month = filtered_df[filtered_df["date_full"] >= (today - pd.Timedelta(days=1)) - pd.Timedelta(days=30)]["liczba_ofert"].sum()
-    offers_ll_month = filtered_df[
-        (filtered_df["date_full"] <= (today - pd.Timedelta(days=1)) - pd.Timedelta(days=30)) &
-        (filtered_df["date_full"] >= (today - pd.Timedelta(days=1)) - pd.Timedelta(days=60))]["liczba_ofert"].sum()
-    offers_last_year = filtered_df[filtered_df["date_full"] >= (today - pd.Timedelta(days=1)) - pd.Timedelta(days=365)]["liczba_ofert"].sum()
-    offers_ll_year = filtered_df[
-        (filtered_df["date_full"] <= (today - pd.Timedelta(days=1)) - pd.Timedelta(days=365)) &
-        (filtered_df["date_full"] >= (today - pd.Timedelta(days=1)) - pd.Timedelta(days=730))]["liczba_ofert"].sum()
-    total_offers = filtered_df["liczba_ofert"].sum()
+    # Ostatnie 30 dni dla wybranych poziomów (data x poziom)
+    month_data = last_days(counts, selected_levels, 30)
    
     st.title("Liczba ofert")
 
@@ -215,11 +302,8 @@ def main():
     st.header(f"Liczba ofert na przestrzeni ostatniego czasu")
   
 
-    last_7_days = today - pd.Timedelta(days=7)
-
-    week_data = filtered_df[filtered_df["date_full"] >= last_7_days]
-    week_data = week_data.groupby(["date_full", "day_name"])["liczba_ofert"].sum().reset_index()
-    week_data = week_data.sort_values("date_full")
+    step("wykres tygodniowy", "chart")
+    week_data = month_data.tail(7).sum(axis=1).rename("liczba_ofert").reset_index()
     
     ############################################
     # 🔹 Wykres słupkowy
@@ -251,12 +335,9 @@ def main():
     )
 
    
-    # Filtrowanie danych do ostatnich 30 dni
-    last_30_days = today - pd.Timedelta(days=30)
-    month_data = filtered_df[filtered_df["date_full"] >= last_30_days]
-
+    step("wykres miesięczny", "chart")
     # Grupowanie danych dla skumulowanego wykresu
-    stacked_data = month_data.groupby(["date_full", "experience_level"])["liczba_ofert"].sum().reset_index()
+    stacked_data = month_data.melt(ignore_index=False, var_name="experience_level", value_name="liczba_ofert").reset_index()
 
     # Warstwa podświetlenia weekendów
 
@@ -276,11 +357,9 @@ def main():
     )
 
 
-    experience_data = filtered_df.groupby("experience_level")["liczba_ofert"].sum().reset_index()
-    experience_data_nf = df.groupby("experience_level")["liczba_ofert"].sum().reset_index().sort_values(
-        by="experience_level", 
-        key=lambda x: x.map({"Junior": 0, "Mid": 1, "Senior": 2, "C-level": 3})
-    )
+    step("wykres kołowy", "chart")
+    experience_data = level_totals[level_totals["experience_level"].isin(selected_levels)]
+    experience_data_nf = level_totals
 
     # Podstawowy wykres kołowy
     base = alt.Chart(experience_data).encode(
@@ -305,11 +384,12 @@ def main():
         fontSize=20
     )
 
+    step("render metryk i wykresów", "serialize")
     col1, col2 = st.columns([0.35,0.65], gap="medium")
     with col1:
         col11, col12 = st.columns(2, gap="medium")
         with col11:
-            st.metric(f"### Liczba ofert z ostatniego tygodnia ({selected_experience_levels})", f"{offers_last_week:,}", f"{offers_last_week - offers_ll_week:,}", help='Różnica w porównaniu do poprzedniego tygodnia.')
+            st.metric(f"### Liczba ofert: {selected_window} ({selected_experience_levels})", f"{offers_last_week:,}", f"{offers_last_week - offers_ll_week:,}", help='Różnica w porównaniu do poprzedniego okresu tej samej długości. Dla tygodnia ISO i miesiąca kalendarzowego - do tej samej liczby początkowych dni poprzedniego tygodnia lub miesiąca.')
         with col12:
             st.altair_chart(weekly_chart, use_container_width=True)
     with col2:
@@ -325,14 +405,12 @@ def main():
     st.markdown("---")  # Dodaj linię oddzielającą
     st.header("Liczba ofert na przestrzeni lat")
     
-    # 🔹 Tworzenie kolumny "year_month" (np. "2023-01")
-    filtered_df = filtered_df.copy()  # Tworzy bezpieczną kopię, eliminując warning
-    filtered_df.loc[:, "year_month"] = filtered_df["date_full"].dt.to_period("M").astype(str)
-
-    # 🔹 Grupowanie danych miesięcznie zamiast rocznie
-    monthly_data = filtered_df.groupby(["year_month", "experience_level"])["liczba_ofert"].sum().reset_index()
+    step("dane miesięczne", "data")
+    # 🔹 Dane miesięczne zagregowane w SQL
+    monthly_data = get_monthly(levels_key)
 
 
+    step("wykres miesięcy", "chart")
     # 🔹 Tworzenie wykresu z ukrytą legendą
     base = alt.Chart(monthly_data).encode(
         alt.Color("experience_level:N", title="Poziom Doświadczenia")  # Dodanie tytułu legendy
@@ -356,6 +434,7 @@ def main():
     )
 
 
+    step("render wykresów rocznych", "serialize")
     col1, col2 = st.columns([0.65, 0.35], gap="medium")
     with col1:
         col11, col12 = st.columns([1,1], gap="medium")
@@ -1,22 +1,270 @@
 import streamlit as st
 import pandas as pd
-import geopandas as gpd
 import plotly.express as px
-import json
+import os
+import threading
 import numpy as np
 import webbrowser
-from sqlalchemy import create_engine
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
 from streamlit.components.v1 import html
 
-# 🔹 Połączenie z bazą danych
-server = st.secrets["database"]["DB_SERVER"]
-database = st.secrets["database"]["DB_DATABASE"]
-username = st.secrets["database"]["DB_USERNAME"]
-password = st.secrets["database"]["DB_PASSWORD"]
-connection_string = f"mssql+pyodbc://{username}:{password}@{server}/{database}?driver=ODBC+Driver+17+for+SQL+Server&TrustServerCertificate=yes&charset=utf8"
-engine = create_engine(connection_string, use_setinputsizes=False)
+from baza_danych import connect
+from cache_zapytan import query_cache
+from geometrie import load_geometry, tolerance_for_zoom
+from harmonogram import run_parallel
+from profiler import step
+from przyrostowe import aggregate, load
+from oferty_miast import PREFETCH_CITIES, ViewResult, get_city, offers_in_view, prefetch, resident
+from schemat import compact
+from ustawienia import get_setting
+
+GEOJSON_WOJ = "wojewodztwa/woj.json"
+GEOJSON_POW = "powiaty/pow.json"
+# Przybliżenie mapy dla poziomu agregacji - wyznacza dokładność (tolerancję) geometrii
+AGGREGATION_ZOOM = {"Województwa": 5, "Powiaty": 6}
+
+# Szczegółowa mapa miast
+CITIES_CSV = "cities/cities_z_koordynatami.csv"
+DEFAULT_CITY = "Warszawa"
+DEFAULT_ZOOM = 12
+SALARY_RANGE = (0, 100000)
+MAX_MAP_POINTS = get_setting("map", "MAX_POINTS", 2000)
+CLUSTER_CELL = 0.005  # bok komórki siatki klastrów w stopniach (~500 m)
+
+
+def format_values(val):
+    val1, val2 = val.split("_")  # Rozdzielamy wartości
+    val1 = str(val1) if int(val1) >= 10 else '0' + str(val1)
+    val2 = str(val2) if int(val2) >= 10 else '0' + str(val2)
+    return val1 + val2  # Łączymy obie wartości
+
+
+# Agregaty uzupełniane przyrostowo o oferty dodane od ostatniego odczytu (przyrostowe.py).
+# Warunek na date_id jest w ON, żeby obszary bez nowych ofert zostały z liczbą 0
+PROVINCE_COUNTS = aggregate("mapa_polski.provinces", '''
+    SELECT p.province_name, COUNT(j.job_offer_id) AS liczba_ofert
+    FROM Districts AS di JOIN Provinces AS p ON di.province_id = p.province_id
+    LEFT JOIN Cities AS c ON di.district_id = c.district_id
+    LEFT JOIN Job_Offers AS j ON c.city_id = j.city_id AND j.date_id >= :date_from AND j.date_id < :date_to
+    GROUP BY p.province_name
+''', keys=["province_name"], summary=("Summary_Cities", '''
+    SELECT p.province_name, COALESCE(SUM(su.liczba_ofert), 0) AS liczba_ofert
+    FROM Districts AS di JOIN Provinces AS p ON di.province_id = p.province_id
+    LEFT JOIN Cities AS c ON di.district_id = c.district_id
+    LEFT JOIN Summary_Cities AS su ON c.city_id = su.city_id AND su.date_id >= :date_from AND su.date_id < :date_to
+    GROUP BY p.province_name
+'''))
+
+DISTRICT_COUNTS = aggregate("mapa_polski.districts", '''
+    SELECT di.district_id_gus, COALESCE(COUNT(j.job_offer_id), 0) AS liczba_ofert
+    FROM Districts AS di JOIN Provinces AS p ON di.province_id = p.province_id
+    LEFT JOIN Cities AS c ON di.district_id = c.district_id
+    LEFT JOIN Job_Offers AS j ON c.city_id = j.city_id AND j.date_id >= :date_from AND j.date_id < :date_to
+    GROUP BY di.district_id_gus
+''', keys=["district_id_gus"], summary=("Summary_Cities", '''
+    SELECT di.district_id_gus, COALESCE(SUM(su.liczba_ofert), 0) AS liczba_ofert
+    FROM Districts AS di JOIN Provinces AS p ON di.province_id = p.province_id
+    LEFT JOIN Cities AS c ON di.district_id = c.district_id
+    LEFT JOIN Summary_Cities AS su ON c.city_id = su.city_id AND su.date_id >= :date_from AND su.date_id < :date_to
+    GROUP BY di.district_id_gus
+'''))
+
+CITY_COUNTS = aggregate("mapa_polski.cities", '''
+    SELECT c.city_id, c.city_name, COUNT(jo.job_offer_id) as liczba_ofert
+    FROM Job_Offers as jo JOIN Cities as c on jo.city_id=c.city_id
+    WHERE c.is_polish = 1 AND jo.date_id >= :date_from AND jo.date_id < :date_to
+    GROUP BY c.city_id, c.city_name
+''', keys=["city_id", "city_name"], summary=("Summary_Cities", '''
+    SELECT c.city_id, c.city_name, SUM(su.liczba_ofert) as liczba_ofert
+    FROM Summary_Cities as su JOIN Cities as c on su.city_id=c.city_id
+    WHERE c.is_polish = 1 AND su.date_id >= :date_from AND su.date_id < :date_to
+    GROUP BY c.city_id, c.city_name
+'''))
+
+
+@query_cache(snapshot=True)
+def get_data_woj():
+    """ Liczba ofert pracy w województwach """
+    return compact(load(PROVINCE_COUNTS), "mapa_polski.get_data_woj")
+
+
+@query_cache(snapshot=True)
+def get_data_pow():
+    """ Liczba ofert pracy w powiatach """
+    df = load(DISTRICT_COUNTS)
+    # Kod GUS w formacie pliku GeoJSON (np. "2_1" -> "0201") - liczony raz przy ładowaniu
+    df['formatted'] = df['district_id_gus'].apply(format_values)
+    return compact(df, "mapa_polski.get_data_pow")
+
+
+@query_cache(snapshot=True)
+def get_data_cities():
+    """ Liczba ofert pracy w polskich miastach """
+    return compact(load(CITY_COUNTS), "mapa_polski.get_data_cities")
+
+
+# Niezależne loadery strony - przy zimnym cache wykonywane równolegle (harmonogram.py)
+LOADERS = {"get_data_woj": get_data_woj, "get_data_pow": get_data_pow, "get_data_cities": get_data_cities}
+
+
+OFFERS_IN_VIEW_FROM = '''
+    FROM Job_Offers as jo JOIN Cities as c on jo.city_id=c.city_id
+    JOIN Dates as d on jo.date_id=d.date_id
+    JOIN Fields as f on jo.field_id=f.field_id
+    JOIN Job_Offers_Salaries as jos on jos.job_offer_id=jo.job_offer_id
+    JOIN Salaries as s on jos.salary_id=s.salary_id
+    JOIN Companies as co on jo.company_id=co.company_id
+    WHERE jo.city_id = :city_id
+        AND jo.latitude BETWEEN :lat_min AND :lat_max
+        AND jo.longitude BETWEEN :lon_min AND :lon_max
+        AND ((COALESCE(s.salary_from, 0) + COALESCE(s.salary_to, 0)) / 2) > 0
+        AND ((COALESCE(s.salary_from, 0) + COALESCE(s.salary_to, 0)) / 2) BETWEEN :salary_min AND :salary_max
+'''
+
+# Ograniczenie liczby wierszy po ORDER BY w dialekcie bazy (SQL Server w produkcji, SQLite w benchmarkach)
+ROW_LIMIT = {"mssql": "OFFSET 0 ROWS FETCH NEXT :limit ROWS ONLY"}
+DEFAULT_ROW_LIMIT = "LIMIT :limit"
+
+
+def view_bounds(latitude, longitude, zoom, width_px=800, height_px=600):
+    """ Przybliżony zasięg (lat_min, lat_max, lon_min, lon_max) widoku mapy o danym zoomie """
+    degrees_per_px = 360 / (256 * 2 ** zoom)
+    lon_span = width_px * degrees_per_px / 2
+    lat_span = height_px * degrees_per_px * np.cos(np.radians(latitude)) / 2
+    return (round(latitude - lat_span, 4), round(latitude + lat_span, 4),
+            round(longitude - lon_span, 4), round(longitude + lon_span, 4))
+
+
+@query_cache
+def get_offers_in_view(city_id, salary_range, bounds, limit=MAX_MAP_POINTS):
+    """
+    Oferty z miasta w zakresie wynagrodzeń i w granicach widoku mapy, dopóki miasta nie ma
+    w magazynie ofert (oferty_miast). Filtrowanie odbywa się w SQL (indeks na city_id, latitude, longitude - sql/indeksy_mapy.sql). Gdy ofert jest więcej
+    niż `limit`, zamiast punktów zwracane są klastry z siatki CLUSTER_CELL stopni oraz
+    `limit` najnowszych ofert do listy wyboru.
+    """
+    params = {
+        "city_id": int(city_id),
+        "salary_min": salary_range[0], "salary_max": salary_range[1],
+        "lat_min": bounds[0], "lat_max": bounds[1], "lon_min": bounds[2], "lon_max": bounds[3],
+        "cell": CLUSTER_CELL, "limit": int(limit),
+    }
+    with connect() as connection:
+        # Limit po stronie bazy; liczba wszystkich ofert w widoku z funkcji okna (liczona przed limitem)
+        row_limit = ROW_LIMIT.get(connection.dialect.name, DEFAULT_ROW_LIMIT)
+        points = pd.read_sql(text('''
+            SELECT jo.job_offer_id, jo.job_title, jo.job_offer_name, f.field_name, jo.latitude, jo.longitude, d.date_full, c.city_name, co.company_name,
+                    ((COALESCE(s.salary_from, 0) + COALESCE(s.salary_to, 0)) / 2) as salary, COUNT(*) OVER () AS total
+        ''' + OFFERS_IN_VIEW_FROM + " ORDER BY d.date_full DESC " + row_limit), connection, params=params)
+        total = int(points["total"].iloc[0]) if len(points) else 0
+        points = points.drop(columns="total")
+        clusters = None
+        if total > limit:
+            clusters = pd.read_sql(text('''
+                SELECT CAST(jo.latitude / :cell AS INT) AS cell_lat, CAST(jo.longitude / :cell AS INT) AS cell_lon,
+                        COUNT(*) AS liczba_ofert, AVG(jo.latitude) AS latitude, AVG(jo.longitude) AS longitude,
+                        AVG((COALESCE(s.salary_from, 0) + COALESCE(s.salary_to, 0)) / 2.0) AS salary
+            ''' + OFFERS_IN_VIEW_FROM + '''
+                GROUP BY CAST(jo.latitude / :cell AS INT), CAST(jo.longitude / :cell AS INT)
+            '''), connection, params=params)
+            clusters = compact(clusters, "mapa_polski.get_offers_in_view.clusters")
+    points["salary"] = pd.to_numeric(points["salary"], errors="coerce")
+    return ViewResult(points=compact(points, "mapa_polski.get_offers_in_view"), clusters=clusters, total=total)
+
+
+@query_cache
+def get_geo_woj(mtime, tolerance=None):
+    """ Województwa z liczbą ofert (klucz cache obejmuje mtime pliku i wersję hurtowni) """
+    return load_geometry(GEOJSON_WOJ, tolerance).merge(get_data_woj(), left_on="NAME_1", right_on="province_name").set_index("NAME_1")
+
+
+@query_cache
+def get_geo_pow(mtime, tolerance=None):
+    """ Powiaty z liczbą ofert (klucz cache obejmuje mtime pliku i wersję hurtowni) """
+    return load_geometry(GEOJSON_POW, tolerance).merge(get_data_pow(), left_on="CC_2", right_on="formatted").set_index("NAME_2")
+
+
+# Poziom agregacji -> (plik GeoJSON, funkcja zwracająca geometrię z liczbą ofert)
+CHOROPLETHS = {"Województwa": (GEOJSON_WOJ, get_geo_woj), "Powiaty": (GEOJSON_POW, get_geo_pow)}
+
+
+def build_choropleth(gdf, level):
+    # Tworzenie mapy choropleth
+    fig = px.choropleth(gdf,
+                        geojson=gdf.geometry,
+                        locations=gdf.index,
+                        color="liczba_ofert",
+                        projection="mercator")
+    fig.update_geos(fitbounds="locations", visible=False)
+    if level == "Województwa":
+        fig.update_layout(
+            coloraxis_colorbar=dict(
+                x=0.85,  # Przesuwa legendę bliżej mapy (zmniejszaj wartość, jeśli nadal za daleko)
+            )
+        )
+    fig.update_layout(
+        margin=dict(l=0, r=0, t=0, b=0),  # Usuwa wszystkie marginesy
+        paper_bgcolor='rgb(248, 249, 250)',  # Zmienia kolor całego tła
+        geo=dict(
+            bgcolor='rgb(248, 249, 250)'  # Zmienia kolor samego obszaru mapy
+        )
+    )
+    return fig
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def get_choropleth_template(level, mtime, tolerance):
+    """ Figura z geometrią budowana raz na proces - przy zmianie danych podmieniana jest tylko tablica z """
+    path, get_geo = CHOROPLETHS[level]
+    return {"figure": build_choropleth(get_geo(mtime, tolerance), level), "lock": threading.Lock()}
+
+
+def render_choropleth(level):
+    path, get_geo = CHOROPLETHS[level]
+    if not os.path.exists(path):
+        # Granice powiatów (powiaty/pow.json) nie są dołączone do repozytorium
+        st.info(f"Brak pliku {path} - mapa niedostępna.")
+        return
+    mtime = os.path.getmtime(path)
+    tolerance = tolerance_for_zoom(path, AGGREGATION_ZOOM[level])
+    counts = get_geo(mtime, tolerance)["liczba_ofert"].to_numpy()
+    template = get_choropleth_template(level, mtime, tolerance)
+    fig = template["figure"]
+    if len(fig.data[0].z) != len(counts):
+        # Zmienił się zestaw obszarów po złączeniu z danymi - jednorazowo pełna budowa
+        st.plotly_chart(build_choropleth(get_geo(mtime, tolerance), level), use_container_width=True)
+        return
+    # Figura jest współdzielona między sesjami - podmiana z i serializacja pod blokadą
+    with template["lock"]:
+        if not np.array_equal(fig.data[0].z, counts):
+            fig.data[0].z = counts
+        st.plotly_chart(fig, use_container_width=True)
+
+
+def city_table(df_cities):
+    """ Polskie miasta ze współrzędnymi (indeks: nazwa), od największej liczby ofert """
+    return df_cities.drop_duplicates("city_name").sort_values("liczba_ofert", ascending=False).set_index("city_name")
+
+
+def warm_up():
+    """ Wypełnia cache dla obu poziomów agregacji i domyślnego widoku szczegółowej mapy (rozgrzewanie.py) """
+    run_parallel("Mapa Polski", LOADERS)
+    for level, (path, get_geo) in CHOROPLETHS.items():
+        if os.path.exists(path):
+            mtime = os.path.getmtime(path)
+            tolerance = tolerance_for_zoom(path, AGGREGATION_ZOOM[level])
+            get_choropleth_template(level, mtime, tolerance)
+            get_geo(mtime, tolerance)
+    cities = city_table(get_data_cities().merge(pd.read_csv(CITIES_CSV), on="city_name"))
+    if DEFAULT_CITY in cities.index:
+        city = cities.loc[DEFAULT_CITY]
+        get_offers_in_view(int(city["city_id"]), SALARY_RANGE, view_bounds(city["latitude"], city["longitude"], DEFAULT_ZOOM))
+    prefetch([int(city_id) for city_id in cities["city_id"].head(PREFETCH_CITIES)])
+
 
 def main():
+    step("style CSS", "serialize")
     # Custom CSS for styling
     st.markdown(
         """
@@ -112,130 +360,12 @@ def main():
         unsafe_allow_html=True
     )
 
-    @st.cache_data
-    def get_data_woj():
-        """ Pobiera dane o liczbie ofert pracy z SQL """
-        with engine.connect() as connection:
-            df = pd.read_sql('''
-                SELECT p.province_name, COUNT(j.job_offer_id) AS liczba_ofert
-                FROM Districts AS di JOIN Provinces AS p ON di.province_id = p.province_id
-				LEFT JOIN Cities AS c ON di.district_id = c.district_id
-				LEFT JOIN Job_Offers AS j ON c.city_id = j.city_id
-				LEFT JOIN Experience_Levels AS e ON j.experience_level_id = e.experience_level_id
-				LEFT JOIN Dates AS d ON j.date_id = d.date_id
-                GROUP BY p.province_name
-            ''', connection)
-        return df
-    
-    @st.cache_data
-    def get_data_pow():
-        """ Pobiera dane o liczbie ofert pracy z SQL """
-        with engine.connect() as connection:
-            df = pd.read_sql('''
-                SELECT di.district_id_gus, COALESCE(COUNT(j.job_offer_id), 0) AS liczba_ofert
-                FROM Districts AS di JOIN Provinces AS p ON di.province_id = p.province_id
-				LEFT JOIN Cities AS c ON di.district_id = c.district_id
-				LEFT JOIN Job_Offers AS j ON c.city_id = j.city_id
-				LEFT JOIN Experience_Levels AS e ON j.experience_level_id = e.experience_level_id
-				LEFT JOIN Dates AS d ON j.date_id = d.date_id
-                GROUP BY di.district_id_gus;
-            ''', connection)
-        return df
-
-    @st.cache_data
-    def get_data_cities():
-        """ Pobiera dane o liczbie ofert pracy z SQL """
-        with engine.connect() as connection:
-            df = pd.read_sql('''
-                SELECT c.city_name, COUNT(jo.job_offer_id) as liczba_ofert
-                FROM Job_Offers as jo JOIN Cities as c on jo.city_id=c.city_id
-                WHERE c.is_polish = 1
-                GROUP BY c.city_name
-            ''', connection)
-        return df
-
-    @st.cache_data
-    def get_data_top5():
-        with engine.connect() as connection:
-            df = pd.read_sql('''
-                SELECT jo.job_offer_id, jo.job_title, jo.job_offer_name, f.field_name, jo.latitude, jo.longitude, d.date_full, c.city_name, co.company_name,
-                        ((COALESCE(s.salary_from, 0) + COALESCE(s.salary_to, 0)) / 2) as salary
-                FROM Job_Offers as jo JOIN Cities as c on jo.city_id=c.city_id
-                JOIN Dates as d on jo.date_id=d.date_id
-                JOIN Fields as f on jo.field_id=f.field_id
-                JOIN Job_Offers_Salaries as jos on jos.job_offer_id=jo.job_offer_id
-                JOIN Salaries as s on jos.salary_id=s.salary_id
-                JOIN Companies as co on jo.company_id=co.company_id
-                WHERE (city_name = 'Warszawa' OR city_name = 'Wrocław' OR city_name = 'Kraków' OR city_name = 'Gdańsk' OR city_name = 'Poznań') 
-                        AND (jo.latitude is not NULL) AND (jo.latitude is not NULL)
-            ''', connection)
-        return df
-    
-
-    df_woj = get_data_woj()
-
-    df_pow = get_data_pow()
-    def format_values(val):
-        val1, val2 = val.split("_")  # Rozdzielamy wartości
-        val1 = str(val1) if int(val1) >= 10 else '0' + str(val1)
-        val2 = str(val2) if int(val2) >= 10 else '0' + str(val2)
-        return val1 + val2  # Łączymy obie wartości
-    df_pow['formatted'] = df_pow['district_id_gus'].apply(format_values)
-
-    # Odczytanie pliku JSON
-    geojson_path_woj = "wojewodztwa/woj.json"
-    with open(geojson_path_woj, "r", encoding="utf-8") as f:
-        geojson_data_woj = json.load(f)
-    geo_df_woj = gpd.GeoDataFrame.from_features(geojson_data_woj["features"])
-    gdf_woj = geo_df_woj.merge(df_woj, left_on="NAME_1", right_on="province_name").set_index("NAME_1")
-
-    # Tworzenie mapy choropleth
-    fig_woj = px.choropleth(gdf_woj,
-                        geojson=gdf_woj.geometry,
-                        locations=gdf_woj.index,
-                        color="liczba_ofert",
-                        projection="mercator")
-    fig_woj.update_geos(fitbounds="locations", visible=False)
-    fig_woj.update_layout(
-        coloraxis_colorbar=dict(
-            x=0.85,  # Przesuwa legendę bliżej mapy (zmniejszaj wartość, jeśli nadal za daleko)
-        )
-    )
-    fig_woj.update_layout(
-        margin=dict(l=0, r=0, t=0, b=0),  # Usuwa wszystkie marginesy
-        paper_bgcolor='rgb(248, 249, 250)',  # Zmienia kolor całego tła
-        geo=dict(
-            bgcolor='rgb(248, 249, 250)'  # Zmienia kolor samego obszaru mapy
-        )
-    )
-
-
-
-    # Odczytanie pliku JSON
-    geojson_path_pow = "powiaty/pow.json"
-    with open(geojson_path_pow, "r", encoding="utf-8") as f:
-        geojson_data_pow = json.load(f)
-    geo_df_pow = gpd.GeoDataFrame.from_features(geojson_data_pow["features"])
-    gdf_pow = geo_df_pow.merge(df_pow, left_on="CC_2", right_on="formatted").set_index("NAME_2")
-
-    # Tworzenie mapy choropleth
-    fig_pow = px.choropleth(gdf_pow,
-                        geojson=gdf_pow.geometry,
-                        locations=gdf_pow.index,
-                        color="liczba_ofert",
-                        projection="mercator")
-    fig_pow.update_geos(fitbounds="locations", visible=False)
-    fig_pow.update_layout(
-        margin=dict(l=0, r=0, t=0, b=0),  # Usuwa wszystkie marginesy
-        paper_bgcolor='rgb(248, 249, 250)',  # Zmienia kolor całego tła
-        geo=dict(
-            bgcolor='rgb(248, 249, 250)'  # Zmienia kolor samego obszaru mapy
-        )
-    )
-
+    step("dane (równolegle)", "data")
+    run_parallel("Mapa Polski", LOADERS)
     df_cities = get_data_cities()
-    cities_cords = pd.read_csv("cities/cities_z_koordynatami.csv")
+    cities_cords = pd.read_csv(CITIES_CSV)
     df_cities = df_cities.merge(cities_cords, left_on="city_name", right_on='city_name')
+    step("mapa miast", "chart")
     fig_cities = px.scatter_map(df_cities, lat='latitude', lon='longitude', zoom=4, size='liczba_ofert',
                         color_continuous_scale=px.colors.cyclical.IceFire, size_max=40,
                         title="Rozmieszczenie liczby ofert w miastach",
@@ -246,6 +376,7 @@ def main():
         plot_bgcolor="rgba(0,0,0,0)",  # Usuwa tło samej mapy
     )
 
+    step("mapy przeglądowe", "chart")
     st.title("Dane na mapie")
 
     st.header(f"Rozmieszczenie ofert w Polsce")
@@ -256,27 +387,27 @@ def main():
         with col12:
             selected_chart = st.radio("Wybierz poziom agregacji:", ["Województwa", "Powiaty"], horizontal=True)
         with col22:
-            if selected_chart == "Województwa":
-                st.plotly_chart(fig_woj, use_container_width=True)
-            else:
-                st.plotly_chart(fig_pow, use_container_width=True)
+            # Budowana jest tylko wybrana mapa
+            render_choropleth(selected_chart)
     with col2:
         st.plotly_chart(fig_cities, use_container_width=True)
     
     
-    st.header(f"Szczegółowa mapa ofert w najpopularniejszych miastach")
+    st.header(f"Szczegółowa mapa ofert w miastach")
 
-    top5_df = get_data_top5()
+    step("wybór miasta", "transform")
+    # Wszystkie polskie miasta ze współrzędnymi, od największej liczby ofert
+    cities = city_table(df_cities)
 
     # Wyświetlenie wykresu
     col1, col2 = st.columns(2)
     with col1:
         # Wybór miasta
-        cities_options = top5_df["city_name"].unique().tolist()
+        cities_options = [str(city) for city in cities.index]
 
         # Inicjalizacja session state dla miasta, jeśli nie istnieje
-        if "selected_city" not in st.session_state:
-            st.session_state["selected_city"] = "Warszawa"
+        if st.session_state.get("selected_city") not in cities_options:
+            st.session_state["selected_city"] = DEFAULT_CITY if DEFAULT_CITY in cities_options else cities_options[0]
 
         # Widget selectbox z kluczem do automatycznej aktualizacji session_state
         st.selectbox(
@@ -290,42 +421,75 @@ def main():
         col21, col22, col23 = st.columns(3)
 
         with col21:
-            # Zamiana wartości 0 na NaN
-            top5_df.loc[top5_df["salary"] == 0, "salary"] = np.nan
-
-            # Konwersja wynagrodzenia na liczbę (dla filtrów)
-            top5_df["salary_numeric"] = pd.to_numeric(top5_df["salary"], errors='coerce')
-
             # Suwak z **stałym zakresem** od 0 do 100 000 PLN
             salary_range = st.slider(
                 "Zakres wynagrodzenia (PLN)", 
-                0, 100000, (0, 100000)
+                *SALARY_RANGE, SALARY_RANGE
             )
-
-            # Filtrowanie po wybranym mieście i zakresie wynagrodzenia
-            filtered_top5_df = top5_df[
-                (top5_df["city_name"] == st.session_state["selected_city"]) & 
-                (top5_df["salary_numeric"].between(salary_range[0], salary_range[1], inclusive="both"))
-            ]
-
+            zoom = st.select_slider("Przybliżenie mapy", options=list(range(10, 16)), value=DEFAULT_ZOOM)
+
+            step("oferty w widoku", "data")
+            city_coords = cities.loc[st.session_state["selected_city"]]
+            city_id = int(city_coords["city_id"])
+            bounds = view_bounds(city_coords["latitude"], city_coords["longitude"], zoom)
+            if resident(city_id):
+                # Miasto w magazynie ofert - filtrowanie w pamięci, bez zapytania
+                view = offers_in_view(get_city(city_id), tuple(salary_range), bounds, MAX_MAP_POINTS, CLUSTER_CELL)
+            else:
+                # Pierwsze wejście - widok z SQL, a oferty miasta ładują się w tle
+                try:
+                    view = get_offers_in_view(city_id, tuple(salary_range), bounds)
+                except SQLAlchemyError:
+                    # Reszta strony działa z migawek - bez bazy nie ma tylko ofert w widoku
+                    st.warning("Baza danych jest niedostępna - oferty na szczegółowej mapie nie zostały wczytane.")
+                    view = ViewResult(points=pd.DataFrame(columns=["job_offer_id", "job_title", "job_offer_name", "field_name", "latitude", "longitude",
+                                                                   "date_full", "city_name", "company_name", "salary"]),
+                                      clusters=None, total=0)
+            # Wybrane miasto i kolejne najpopularniejsze pobierane z wyprzedzeniem
+            popular = [int(other) for other in cities["city_id"].head(PREFETCH_CITIES)]
+            prefetch([city_id] + [other for other in popular if other != city_id])
+            filtered_top5_df = view.points.copy()
+
+            step("lista ofert", "transform")
             # Ponowne formatowanie wynagrodzenia
-            filtered_top5_df["salary"] = filtered_top5_df["salary_numeric"].apply(
+            filtered_top5_df["salary"] = filtered_top5_df["salary"].apply(
                 lambda x: f"{x:.2f} PLN" if not pd.isna(x) else "Brak danych"
             )
+            if view.clusters is not None:
+                st.caption(f"{view.total:,} ofert w widoku - pokazano skupiska, lista zawiera {len(filtered_top5_df):,} najnowszych.")
         with col22:
             selected_offer = st.selectbox("Wybierz ofertę za pomocą ID: ", filtered_top5_df["job_offer_name"].tolist())
             offer_url = f"https://justjoin.it/job-offer/{selected_offer}"
             st.page_link(offer_url, label="Przejdź do oferty pracy")
             
         
+        step("mapa szczegółowa", "chart")
         with col23:
-            if not filtered_top5_df.empty:
+            if view.clusters is not None:
+                # Za dużo punktów - skupiska z siatki
+                fig_cities = px.scatter_mapbox(
+                    view.clusters,
+                    lat='latitude',
+                    lon='longitude',
+                    zoom=zoom,
+                    size='liczba_ofert',
+                    size_max=30,
+                    center={"lat": city_coords["latitude"], "lon": city_coords["longitude"]},
+                    custom_data=['liczba_ofert', 'salary']
+                )
+
+                fig_cities.update_traces(
+                    hovertemplate="<b>Liczba ofert:</b> %{customdata[0]}<br>" +
+                                "<b>Średnie wynagrodzenie:</b> %{customdata[1]:.2f} PLN"
+                )
+            elif not filtered_top5_df.empty:
                 # Tworzenie wykresu, jeśli istnieją oferty
                 fig_cities = px.scatter_mapbox(
                     filtered_top5_df,
                     lat='latitude',
                     lon='longitude',
-                    zoom=12,
+                    zoom=zoom,
+                    center={"lat": city_coords["latitude"], "lon": city_coords["longitude"]},
                     color='field_name',
                     color_continuous_scale=px.colors.cyclical.IceFire,
                     labels={'field_name': 'Dziedzina:'},
@@ -339,14 +503,12 @@ def main():
                                 "<b>ID:</b> %{customdata[4]}"
                 )
             else:
-                # Jeśli brak ofert, pobierz współrzędne miasta i nie dodawaj punktów
-                city_coords = top5_df[top5_df["city_name"] == st.session_state["selected_city"]][["latitude", "longitude"]].mean()
-
+                # Jeśli brak ofert, ustaw widok na współrzędne miasta i nie dodawaj punktów
                 fig_cities = px.scatter_mapbox(
                     pd.DataFrame(columns=['latitude', 'longitude']),  # Pusty DataFrame
                     lat='latitude',
                     lon='longitude',
-                    zoom=12
+                    zoom=zoom
                 )
 
                 # Ustawienie widoku na miasto
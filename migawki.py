@@ -0,0 +1,83 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import pyarrow as pa
+import pyarrow.ipc
+
+from ustawienia import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Lokalne migawki ramek z hurtowni w formacie Arrow IPC (bez kompresji - można je mapować w pamięć)
+ENABLED = get_setting("snapshot", "ENABLED", True)
+SNAPSHOT_DIR = get_setting("snapshot", "DIR", "migawki")
+
+_lock = threading.Lock()
+_stats = {"reads": 0, "writes": 0, "read_ms": 0.0, "write_ms": 0.0, "errors": 0}
+
+
+def snapshot_path(name, *parts):
+    """ Ścieżka pliku migawki; `parts` (np. argumenty loadera) są skracane do hasha """
+    digest = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:12] if parts else "0"
+    return os.path.join(SNAPSHOT_DIR, f"{name}-{digest}.arrow")
+
+
+def write(path, df, **meta):
+    """ Zapisuje ramkę i metadane (np. wersję hurtowni) atomowo - przez plik tymczasowy """
+    if not ENABLED:
+        return
+    started = time.perf_counter()
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[b"migawka"] = json.dumps({**meta, "written": time.time()}, default=str).encode("utf-8")
+        table = table.replace_schema_metadata(metadata)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with pa.OSFile(temporary, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(temporary, path)
+    except Exception:
+        # Migawka jest tylko przyspieszeniem - błąd zapisu nie może zatrzymać strony
+        logger.warning("Nie udało się zapisać migawki %s", path, exc_info=True)
+        with _lock:
+            _stats["errors"] += 1
+        return
+    with _lock:
+        _stats["writes"] += 1
+        _stats["write_ms"] += (time.perf_counter() - started) * 1000
+
+
+def read(path):
+    """
+    Wczytuje migawkę przez mapowanie pliku w pamięć. Zwraca (ramka, metadane)
+    albo (None, None), gdy migawki nie ma lub nie da się jej odczytać.
+    """
+    if not ENABLED or not os.path.exists(path):
+        return None, None
+    started = time.perf_counter()
+    try:
+        with pa.memory_map(path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+            meta = json.loads((table.schema.metadata or {}).get(b"migawka", b"{}"))
+            # Konwersja kopiuje dane, więc plik można zamknąć (i później podmienić) od razu
+            df = table.to_pandas()
+    except Exception:
+        logger.warning("Nie udało się odczytać migawki %s", path, exc_info=True)
+        with _lock:
+            _stats["errors"] += 1
+        return None, None
+    with _lock:
+        _stats["reads"] += 1
+        _stats["read_ms"] += (time.perf_counter() - started) * 1000
+    return df, meta
+
+
+def snapshot_stats():
+    """ Liczba i łączny czas odczytów/zapisów migawek """
+    with _lock:
+        return dict(_stats)
@@ -0,0 +1,219 @@
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from baza_danych import connect
+from cache_zapytan import warehouse_version
+from pobieranie import fetch_frame
+from schemat import compact
+from ustawienia import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Limit pamięci magazynu ofert miast i liczba popularnych miast ładowanych w tle
+MAX_BYTES = get_setting("city_store", "MAX_MB", 256) * 1024 * 1024
+PREFETCH_CITIES = get_setting("city_store", "PREFETCH", 5)
+# Miasto wyrzucone z magazynu nie jest ponownie pobierane z wyprzedzeniem przez tyle sekund -
+# gdy limit nie mieści wszystkich PREFETCH miast, wyrzucanie i ponowne pobieranie nie zapętla się
+EVICTED_COOLDOWN = get_setting("city_store", "EVICTED_COOLDOWN", 600)
+
+# Oferty w widoku mapy: punkty, a gdy jest ich więcej niż limit - klastry z siatki
+ViewResult = namedtuple("ViewResult", ["points", "clusters", "total"])
+
+# Oferty jednego miasta posortowane po szerokości geograficznej (wyszukiwanie binarne zakresu widoku)
+CityOffers = namedtuple("CityOffers", ["city_id", "frame", "latitude", "size"])
+
+CITY_OFFERS_QUERY = text('''
+    SELECT jo.job_offer_id, jo.job_title, jo.job_offer_name, f.field_name, jo.latitude, jo.longitude, d.date_full, c.city_name, co.company_name,
+            ((COALESCE(s.salary_from, 0) + COALESCE(s.salary_to, 0)) / 2) as salary
+    FROM Job_Offers as jo JOIN Cities as c on jo.city_id=c.city_id
+    JOIN Dates as d on jo.date_id=d.date_id
+    JOIN Fields as f on jo.field_id=f.field_id
+    JOIN Job_Offers_Salaries as jos on jos.job_offer_id=jo.job_offer_id
+    JOIN Salaries as s on jos.salary_id=s.salary_id
+    JOIN Companies as co on jo.company_id=co.company_id
+    WHERE jo.city_id = :city_id AND jo.latitude IS NOT NULL AND jo.longitude IS NOT NULL
+''')
+
+_lock = threading.Lock()
+_cities = OrderedDict()  # city_id -> CityOffers, od najdawniej oglądanego
+_inflight = {}  # city_id -> blokada ładowania
+_evicted = {}  # city_id -> czas wyrzucenia z magazynu
+_queued = set()  # miasta czekające w kolejce pobierania z wyprzedzeniem
+# Jeden wątek w tle pobiera miasta z ograniczonej kolejki (zamiast nowego wątku przy każdym przebiegu)
+_prefetch_queue = queue.Queue(maxsize=max(PREFETCH_CITIES, 1) * 2)
+_prefetch_thread = None
+_total_bytes = 0
+_version = None
+_stats = {"hits": 0, "loads": 0, "evictions": 0, "prefetched": 0}
+
+
+def load_city(city_id):
+    """ Pobiera z hurtowni wszystkie oferty miasta z wynagrodzeniem > 0 """
+    with connect() as connection:
+        df = fetch_frame(connection, CITY_OFFERS_QUERY, {"city_id": int(city_id)})
+    df["salary"] = pd.to_numeric(df["salary"], errors="coerce")
+    df = df[df["salary"] > 0]
+    df = df.sort_values(["latitude", "date_full"], ascending=[True, False], ignore_index=True)
+    df = compact(df, "oferty_miast.load_city")
+    return CityOffers(city_id=city_id, frame=df, latitude=df["latitude"].to_numpy(dtype=np.float64),
+                      size=int(df.memory_usage(deep=True).sum()))
+
+
+def _check_version_locked(version):
+    global _version, _total_bytes
+    if version != _version:
+        if _version is not None:
+            logger.info("Zmiana wersji hurtowni - czyszczenie magazynu ofert miast")
+        _cities.clear()
+        _evicted.clear()
+        _total_bytes = 0
+        _version = version
+
+
+def _store_locked(offers, cold=False):
+    global _total_bytes
+    if offers.city_id in _cities:
+        _total_bytes -= _cities.pop(offers.city_id).size
+    _cities[offers.city_id] = offers
+    _total_bytes += offers.size
+    if cold:
+        # Miasto pobrane z wyprzedzeniem trafia na zimny koniec przed wypieraniem - gdy się
+        # nie mieści, wypierane jest samo, a nie oglądane przed chwilą miasta
+        _cities.move_to_end(offers.city_id, last=False)
+    # Zostawiamy co najmniej bieżące miasto, nawet jeśli samo przekracza limit
+    while len(_cities) > 1 and _total_bytes > MAX_BYTES:
+        city_id, evicted = _cities.popitem(last=False)
+        _total_bytes -= evicted.size
+        _evicted[city_id] = time.monotonic()
+        _stats["evictions"] += 1
+
+
+def get_city(city_id, touch=True):
+    """
+    Zwraca oferty miasta z magazynu, ładując je przy pierwszym użyciu.
+    Miasta są trzymane w LRU ograniczonym do MAX_BYTES i czyszczone po zmianie wersji hurtowni.
+    """
+    version = warehouse_version()
+    with _lock:
+        _check_version_locked(version)
+        offers = _cities.get(city_id)
+        if offers is not None:
+            if touch:
+                _cities.move_to_end(city_id)
+            _stats["hits"] += 1
+            return offers
+        key_lock = _inflight.get(city_id)
+        # Tylko wywołanie, które utworzyło blokadę, usuwa ją z _inflight
+        creator = key_lock is None
+        if creator:
+            key_lock = _inflight[city_id] = threading.Lock()
+    try:
+        with key_lock:
+            with _lock:
+                offers = _cities.get(city_id)
+            if offers is None:
+                offers = load_city(city_id)
+                with _lock:
+                    _check_version_locked(version)
+                    _store_locked(offers, cold=not touch)
+                    _stats["loads"] += 1
+    finally:
+        # Także po błędzie ładowania - kolejna próba nie trafi na martwy wpis
+        if creator:
+            with _lock:
+                if _inflight.get(city_id) is key_lock:
+                    del _inflight[city_id]
+    return offers
+
+
+def resident(city_id):
+    """ Czy oferty miasta są już w pamięci (bez ładowania) """
+    # Wersja (może wymagać sondy w bazie) sprawdzana przed blokadą magazynu
+    version = warehouse_version()
+    with _lock:
+        return city_id in _cities and _version == version
+
+
+def _skip_prefetch_locked(city_id, now):
+    """ Miasto w pamięci, w trakcie ładowania, w kolejce albo niedawno wyrzucone """
+    evicted = _evicted.get(city_id)
+    return (city_id in _cities or city_id in _inflight or city_id in _queued
+            or (evicted is not None and now - evicted < EVICTED_COOLDOWN))
+
+
+def _prefetch_worker():
+    while True:
+        city_id = _prefetch_queue.get()
+        try:
+            version = warehouse_version()
+            with _lock:
+                _check_version_locked(version)
+                loaded = city_id in _cities or city_id in _inflight
+            if not loaded:
+                get_city(city_id, touch=False)
+                with _lock:
+                    _stats["prefetched"] += 1
+        except Exception:
+            logger.warning("Nie udało się pobrać z wyprzedzeniem ofert miasta %s", city_id, exc_info=True)
+        finally:
+            with _lock:
+                _queued.discard(city_id)
+
+
+def prefetch(city_ids):
+    """
+    Kolejkuje pobranie w tle ofert podanych miast (np. najpopularniejszych). Pomija miasta już
+    w pamięci, ładowane, czekające w kolejce i niedawno wyrzucone; przy pełnej kolejce - resztę.
+    """
+    global _prefetch_thread
+    version = warehouse_version()
+    now = time.monotonic()
+    with _lock:
+        _check_version_locked(version)
+        for city_id in city_ids:
+            if _skip_prefetch_locked(city_id, now):
+                continue
+            try:
+                _prefetch_queue.put_nowait(city_id)
+            except queue.Full:
+                break
+            _queued.add(city_id)
+        if _queued and _prefetch_thread is None:
+            _prefetch_thread = threading.Thread(target=_prefetch_worker, name="prefetch-miast", daemon=True)
+            _prefetch_thread.start()
+
+
+def offers_in_view(offers, salary_range, bounds, limit, cell):
+    """
+    Filtruje oferty miasta po zakresie wynagrodzeń i granicach widoku (lat_min, lat_max, lon_min, lon_max).
+    Zakres szerokości jest wyznaczany wyszukiwaniem binarnym; powyżej `limit` ofert zwraca też
+    klastry z siatki `cell` stopni oraz `limit` najnowszych ofert.
+    """
+    first = np.searchsorted(offers.latitude, bounds[0], side="left")
+    last = np.searchsorted(offers.latitude, bounds[1], side="right")
+    frame = offers.frame.iloc[first:last]
+    mask = (frame["longitude"].between(bounds[2], bounds[3])
+            & frame["salary"].between(salary_range[0], salary_range[1])).to_numpy()
+    frame = frame[mask]
+    total = len(frame)
+    clusters = None
+    if total > limit:
+        grid = frame.assign(cell_lat=(frame["latitude"] / cell).astype(int), cell_lon=(frame["longitude"] / cell).astype(int))
+        clusters = grid.groupby(["cell_lat", "cell_lon"], as_index=False).agg(
+            liczba_ofert=("job_offer_id", "size"), latitude=("latitude", "mean"),
+            longitude=("longitude", "mean"), salary=("salary", "mean"))
+    points = frame.sort_values("date_full", ascending=False).head(limit).reset_index(drop=True)
+    return ViewResult(points=points, clusters=clusters, total=total)
+
+
+def store_stats():
+    """ Miasta w pamięci, zajęta pamięć i liczniki trafień/ładowań """
+    with _lock:
+        return {**_stats, "cities": list(_cities), "queued": len(_queued), "bytes": _total_bytes, "max_bytes": MAX_BYTES}
@@ -0,0 +1,78 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Dostępne okna metryk: etykieta -> (rodzaj, liczba dni)
+WINDOWS = {
+    "Ostatnie 7 dni": ("days", 7),
+    "Tydzień ISO": ("iso_week", None),
+    "Ostatnie 30 dni": ("days", 30),
+    "Miesiąc kalendarzowy": ("month", None),
+    "Ostatnie 90 dni": ("days", 90),
+    "Ostatnie 365 dni": ("days", 365),
+}
+
+# Dzienne sumy skumulowane dla każdego poziomu; cumsum[i] = suma dni [start, start + i)
+CumulativeCounts = namedtuple("CumulativeCounts", ["start", "dates", "levels", "daily", "cumsum"])
+
+
+def build_cumulative(df, end, date_column="date_full", level_column="experience_level", value_column="liczba_ofert"):
+    """ Buduje dzienny indeks (bez luk) i skumulowane sumy ofert dla każdego poziomu """
+    daily = df.pivot_table(index=date_column, columns=level_column, values=value_column, aggfunc="sum", fill_value=0, observed=True)
+    start = daily.index.min() if len(daily) else pd.Timestamp(end)
+    dates = pd.date_range(start, pd.Timestamp(end), freq="D")
+    daily = daily.reindex(dates, fill_value=0)
+    values = daily.to_numpy(dtype=np.int64)
+    cumsum = np.vstack([np.zeros((1, values.shape[1]), dtype=np.int64), values.cumsum(axis=0)])
+    return CumulativeCounts(start=dates[0], dates=dates, levels=list(daily.columns), daily=values, cumsum=cumsum)
+
+
+def _level_mask(counts, levels):
+    return np.isin(np.array(counts.levels, dtype=object), list(levels))
+
+
+def window_total(counts, levels, start, end):
+    """ Suma ofert wybranych poziomów w dniach [start, end] - dwa odczyty z sum skumulowanych """
+    first = min(max((pd.Timestamp(start) - counts.start).days, 0), len(counts.dates))
+    last = min(max((pd.Timestamp(end) - counts.start).days + 1, 0), len(counts.dates))
+    if last <= first:
+        return 0
+    return int((counts.cumsum[last] - counts.cumsum[first])[_level_mask(counts, levels)].sum())
+
+
+def window_bounds(window, today):
+    """
+    Zwraca (start, koniec) bieżącego okna i (start, koniec) okresu poprzedniego. Dla tygodnia
+    i miesiąca kalendarzowego bieżące okno jest niepełne, więc okres poprzedni obejmuje tyle
+    samo początkowych dni poprzedniego tygodnia/miesiąca (miesiąc - najwyżej do jego końca).
+    """
+    kind, days = WINDOWS[window]
+    today = pd.Timestamp(today).normalize()
+    if kind == "iso_week":
+        start = today - pd.Timedelta(days=today.weekday())
+        previous = (start - pd.Timedelta(days=7), today - pd.Timedelta(days=7))
+    elif kind == "month":
+        start = today.replace(day=1)
+        previous_end = start - pd.Timedelta(days=1)
+        previous_start = previous_end.replace(day=1)
+        previous = (previous_start, min(previous_start + (today - start), previous_end))
+    else:
+        start = today - pd.Timedelta(days=days - 1)
+        previous = (start - pd.Timedelta(days=days), start - pd.Timedelta(days=1))
+    return (start, today), previous
+
+
+def window_delta(counts, levels, window, today):
+    """ Liczba ofert w oknie i w poprzednim okresie tej samej długości (window_bounds) """
+    current, previous = window_bounds(window, today)
+    return window_total(counts, levels, *current), window_total(counts, levels, *previous)
+
+
+def last_days(counts, levels, days):
+    """ Ostatnie `days` dni jako ramka (data x poziom) dla wybranych poziomów """
+    mask = _level_mask(counts, levels)
+    frame = pd.DataFrame(counts.daily[-days:, mask], index=counts.dates[-days:],
+                         columns=[level for level, keep in zip(counts.levels, mask) if keep])
+    frame.index.name = "date_full"
+    return frame
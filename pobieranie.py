@@ -0,0 +1,172 @@
+import datetime
+import decimal
+import time
+
+import numpy as np
+import pandas as pd
+
+import instrumentacja
+from schemat import DIMENSIONS
+from ustawienia import get_setting
+
+# Liczba wierszy pobieranych z kursora na raz
+BATCH_SIZE = get_setting("fetch", "BATCH_SIZE", 50_000)
+
+_NUMPY_DTYPES = {"null": object, "int": np.int64, "float": np.float64, "datetime": "datetime64[ns]", "object": object}
+# Typ pola przy rozkładaniu partii na kolumny (np.fromiter z typem strukturalnym). Kolumny całkowite
+# są czytane jako obiekty - np.fromiter po cichu obcina do int64 wartości niecałkowite (2.5 -> 2)
+_FIELD_DTYPES = {"float": np.float64}
+_INTEGER_TYPES = (int, np.integer)
+_NUMBER_TYPES = (int, float, decimal.Decimal, np.integer, np.floating)
+_DATE_TYPES = (datetime.date, datetime.datetime, pd.Timestamp)
+
+
+def _kind(name, values):
+    """
+    Rodzaj kolumny na podstawie typów wszystkich wartości w partii (jak pd.read_sql:
+    liczby całkowite z NULL albo z ułamkami to float). Partia samych NULL to "null".
+    """
+    types = set(map(type, values))
+    has_null = type(None) in types
+    types.discard(type(None))
+    if not types:
+        return "null"
+    if bool in types or np.bool_ in types:
+        return "object"
+    if all(issubclass(kind, _INTEGER_TYPES) for kind in types):
+        return "float" if has_null else "int"
+    if all(issubclass(kind, _NUMBER_TYPES) for kind in types):
+        return "float"
+    if all(issubclass(kind, _DATE_TYPES) for kind in types):
+        return "datetime"
+    if types == {str} and name in DIMENSIONS:
+        return "category"
+    return "object"
+
+
+def _merge_kind(current, new):
+    """ Rodzaj kolumny po dołączeniu partii rodzaju `new` do kolumny rodzaju `current` """
+    if new == "null" or new == current:
+        # NULL w kolumnie całkowitej - jak w pandas, kolumna przechodzi na float z NaN
+        return "float" if new == "null" and current == "int" else current
+    if current == "null":
+        return "float" if new == "int" else new
+    if {current, new} == {"int", "float"}:
+        return "float"
+    return "object"
+
+
+class _Column:
+    """ Bufor jednej kolumny z prealokowaną tablicą typowaną, powiększaną dwukrotnie przy braku miejsca """
+
+    def __init__(self, name, capacity):
+        self.name = name
+        # Rodzaj ustalany z pierwszej partii i poszerzany przez kolejne (null -> int -> float -> object)
+        self.kind = "null"
+        self.categories = {}  # wartość -> kod (kolumny kategorii)
+        self.buffer = np.full(capacity, None, dtype=object)
+
+    def _reserve(self, size):
+        if size > len(self.buffer):
+            grown = np.empty(max(size, 2 * len(self.buffer)), dtype=self.buffer.dtype)
+            grown[:len(self.buffer)] = self.buffer
+            self.buffer = grown
+
+    def _promote(self, kind, rows):
+        """ Zmienia rodzaj kolumny, przepisując `rows` wczytanych już wierszy """
+        filled = self.finish(rows) if self.kind != "null" else None
+        if kind == "category":
+            self.buffer = np.full(len(self.buffer), -1, dtype=np.int32)
+        else:
+            self.buffer = np.empty(len(self.buffer), dtype=_NUMPY_DTYPES[kind])
+            if filled is None:
+                # Dotychczas same NULL
+                if rows:
+                    self.buffer[:rows] = {"float": np.nan, "datetime": np.datetime64("NaT")}.get(kind)
+            elif kind == "object":
+                # Wcześniejsze wiersze jako obiekty Pythona, brakujące wartości jako None
+                self.buffer[:rows] = pd.Series(filled).astype(object).where(pd.notna(filled), None).to_numpy()
+            else:
+                self.buffer[:rows] = filled
+        self.kind = kind
+        self.categories = {} if kind == "category" else self.categories
+
+    def _convert(self, values):
+        if self.kind == "category":
+            # Kodowanie słownikowe partii, potem przemapowanie na kody całej kolumny
+            codes, uniques = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=True)
+            lookup = np.array([self.categories.setdefault(value, len(self.categories)) for value in uniques] + [-1], dtype=np.int32)
+            return lookup[codes]
+        if self.kind == "int":
+            return values.astype(np.int64)
+        if self.kind == "float":
+            return np.array([np.nan if value is None else value for value in values], dtype=np.float64) if values.dtype == object else values
+        if self.kind == "datetime":
+            return pd.to_datetime(values).to_numpy(dtype="datetime64[ns]")
+        return values
+
+    def append(self, start, values):
+        batch_kind = "float" if values.dtype == np.float64 else _kind(self.name, values)
+        # Pierwsza partia ustala rodzaj wprost, kolejne mogą go tylko poszerzyć
+        kind = batch_kind if start == 0 else _merge_kind(self.kind, batch_kind)
+        if kind != self.kind:
+            self._promote(kind, start)
+        try:
+            converted = self._convert(values)
+        except OverflowError:
+            # Liczba całkowita poza zakresem int64 - kolumna obiektów, jak w pandas
+            self._promote("object", start)
+            converted = values
+        self._reserve(start + len(converted))
+        self.buffer[start:start + len(converted)] = converted
+
+    def finish(self, rows):
+        data = self.buffer[:rows]
+        if self.kind == "category":
+            return pd.Categorical.from_codes(data, categories=pd.Index(list(self.categories), dtype=object))
+        return data
+
+
+def _split(batch, columns):
+    """ Rozkłada partię krotek na kolumny jednym przebiegiem w C (np.fromiter z typem strukturalnym) """
+    dtype = [(f"f{index}", _FIELD_DTYPES.get(column.kind, object)) for index, column in enumerate(columns)]
+    try:
+        array = np.fromiter(batch, dtype=dtype, count=len(batch))
+    except (TypeError, ValueError):
+        # NULL lub inny typ w kolumnie liczbowej - ta partia w całości jako obiekty
+        array = np.fromiter(batch, dtype=[(name, object) for name, _ in dtype], count=len(batch))
+    return [array[name] for name, _ in dtype]
+
+
+def fetch_frame(connection, query, params=None, batch_size=None):
+    """
+    Wykonuje zapytanie i składa wynik kolumnami, partiami po `batch_size` wierszy, bezpośrednio
+    w typowanych tablicach NumPy - bez listy krotek całego wyniku, którą buduje pd.read_sql.
+    Kolumny wymiarów (schemat.DIMENSIONS) od razu są kodowane jako kategorie.
+    """
+    batch_size = batch_size or BATCH_SIZE
+    result = connection.execute(query, params or {})
+    names = list(result.keys())
+    # Partie czytane wprost z kursora DBAPI - bez opakowywania każdego wiersza w Row
+    cursor = result.cursor
+    columns = None
+    rows = 0
+    started = time.perf_counter()
+    try:
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            if columns is None:
+                columns = [_Column(name, batch_size) for name in names]
+            values = _split(batch, columns)
+            for column, column_values in zip(columns, values):
+                column.append(rows, column_values)
+            rows += len(batch)
+    finally:
+        result.close()
+    # Tekst zapytania w postaci wysłanej do bazy - ten sam klucz, co w instrumentacja.register
+    instrumentacja.record_fetch(result.context.statement, rows, time.perf_counter() - started)
+    if columns is None:
+        return pd.DataFrame(columns=names)
+    return pd.DataFrame({column.name: column.finish(rows) for column in columns})
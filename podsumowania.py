@@ -0,0 +1,146 @@
+"""
+Tabele podsumowań (zmaterializowane agregaty) dla zapytań stron.
+
+Liczby ofert są zagregowane do ziarna dnia (date_id) i identyfikatorów wymiarów, więc strony
+łączą je już tylko z małymi tabelami wymiarów. Agregaty przyrostowe (przyrostowe.py) czytają
+z tabeli podsumowania, jeśli istnieje w hurtowni i jest odświeżona do ostatniego dnia w Job_Offers,
+a w przeciwnym razie - z Job_Offers.
+
+Uruchomienie (np. w zadaniu ładowania hurtowni, zaraz po wczytaniu nowych ofert):
+    python podsumowania.py create     - tworzy brakujące tabele
+    python podsumowania.py refresh    - przelicza od ostatniego dnia w tabelach (przyrostowo)
+    python podsumowania.py rebuild    - przelicza całość
+"""
+import argparse
+import logging
+import time
+
+from sqlalchemy import inspect, text
+
+from baza_danych import connect, get_engine
+from cache_zapytan import query_cache
+
+logger = logging.getLogger(__name__)
+
+MIN_DATE_ID = -2 ** 31
+# Klucz wymiaru zapisywany zamiast NULL (klucze są w PRIMARY KEY). Nie łączy się z żadnym wierszem
+# wymiaru, więc złączenia stron odrzucają te oferty tak samo jak NULL w Job_Offers
+MISSING_KEY = -1
+
+# Tabela -> (DDL, zapytanie wypełniające dla ofert z date_id >= :date_from)
+SUMMARIES = {
+    "Summary_Offers": ('''
+        CREATE TABLE Summary_Offers (
+            date_id INT NOT NULL,
+            field_id INT NOT NULL,
+            experience_level_id INT NOT NULL,
+            liczba_ofert INT NOT NULL,
+            PRIMARY KEY (date_id, field_id, experience_level_id)
+        )
+    ''', '''
+        INSERT INTO Summary_Offers (date_id, field_id, experience_level_id, liczba_ofert)
+        SELECT jo.date_id, COALESCE(jo.field_id, :missing), COALESCE(jo.experience_level_id, :missing), COUNT(jo.job_offer_id)
+        FROM Job_Offers as jo
+        WHERE jo.date_id >= :date_from
+        GROUP BY jo.date_id, jo.field_id, jo.experience_level_id
+    '''),
+    "Summary_Skills": ('''
+        CREATE TABLE Summary_Skills (
+            date_id INT NOT NULL,
+            field_id INT NOT NULL,
+            experience_level_id INT NOT NULL,
+            level_id INT NOT NULL,
+            skill_id INT NOT NULL,
+            liczba_ofert INT NOT NULL,
+            PRIMARY KEY (date_id, field_id, experience_level_id, level_id, skill_id)
+        )
+    ''', '''
+        INSERT INTO Summary_Skills (date_id, field_id, experience_level_id, level_id, skill_id, liczba_ofert)
+        SELECT jo.date_id, COALESCE(jo.field_id, :missing), COALESCE(jo.experience_level_id, :missing),
+            COALESCE(jos.level_id, :missing), COALESCE(jos.skill_id, :missing), COUNT(jo.job_offer_id)
+        FROM Job_Offers as jo JOIN Job_Offers_Skills as jos on jos.job_offer_id=jo.job_offer_id
+        WHERE jo.date_id >= :date_from
+        GROUP BY jo.date_id, jo.field_id, jo.experience_level_id, jos.level_id, jos.skill_id
+    '''),
+    "Summary_Cities": ('''
+        CREATE TABLE Summary_Cities (
+            date_id INT NOT NULL,
+            city_id INT NOT NULL,
+            liczba_ofert INT NOT NULL,
+            PRIMARY KEY (date_id, city_id)
+        )
+    ''', '''
+        INSERT INTO Summary_Cities (date_id, city_id, liczba_ofert)
+        SELECT jo.date_id, COALESCE(jo.city_id, :missing), COUNT(jo.job_offer_id)
+        FROM Job_Offers as jo
+        WHERE jo.date_id >= :date_from
+        GROUP BY jo.date_id, jo.city_id
+    '''),
+}
+
+
+@query_cache(ttl=600)
+def existing_summaries():
+    """
+    Tabele podsumowań obecne w hurtowni i aktualne - z ostatnim dniem (MAX(date_id)) takim jak
+    w Job_Offers. Nieodświeżona tabela jest pomijana, dopóki refresh jej nie dogoni.
+    Sprawdzane ponownie po zmianie wersji hurtowni lub po 10 min.
+    """
+    inspector = inspect(get_engine())
+    present = [table for table in SUMMARIES if inspector.has_table(table)]
+    if not present:
+        return frozenset()
+    with connect() as connection:
+        latest = connection.execute(text("SELECT MAX(date_id) FROM Job_Offers")).scalar()
+        current = set()
+        for table in present:
+            last = connection.execute(text(f"SELECT MAX(date_id) FROM {table}")).scalar()
+            if last == latest:
+                current.add(table)
+            else:
+                logger.warning("%s nieaktualna (ostatni date_id %s, w Job_Offers %s) - zapytania czytają z Job_Offers", table, last, latest)
+    return frozenset(current)
+
+
+def available(table):
+    """ Czy tabela podsumowania istnieje i jest aktualna - wtedy loadery czytają z niej zamiast z Job_Offers """
+    return table in existing_summaries()
+
+
+def create_tables():
+    """ Tworzy brakujące tabele podsumowań (bez wypełniania) """
+    inspector = inspect(get_engine())
+    with connect() as connection:
+        for table, (ddl, _) in SUMMARIES.items():
+            if not inspector.has_table(table):
+                connection.execute(text(ddl))
+                logger.info("Utworzono tabelę %s", table)
+        connection.commit()
+
+
+def refresh(full=False):
+    """
+    Przelicza tabele podsumowań. Domyślnie od ostatniego dnia obecnego w tabeli (ten dzień
+    mógł być niepełny), z `full=True` - od zera. Każda tabela w osobnej transakcji:
+    usunięcie dni >= date_from i wstawienie ich na nowo z Job_Offers.
+    """
+    for table, (_, insert) in SUMMARIES.items():
+        started = time.perf_counter()
+        with connect() as connection:
+            date_from = None if full else connection.execute(text(f"SELECT MAX(date_id) FROM {table}")).scalar()
+            date_from = MIN_DATE_ID if date_from is None else date_from
+            connection.execute(text(f"DELETE FROM {table} WHERE date_id >= :date_from"), {"date_from": date_from})
+            rows = connection.execute(text(insert), {"date_from": date_from, "missing": MISSING_KEY}).rowcount
+            connection.commit()
+        logger.info("%s: przeliczono od date_id %s, %d wierszy w %.2f s", table, date_from, rows, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Tabele podsumowań dla dashboardu")
+    parser.add_argument("command", choices=["create", "refresh", "rebuild"])
+    args = parser.parse_args()
+    if args.command == "create":
+        create_tables()
+    else:
+        refresh(full=args.command == "rebuild")
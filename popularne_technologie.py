@@ -1,20 +1,95 @@
-from sqlalchemy import create_engine, text
 import streamlit as st
 import pandas as pd
 import altair as alt
 
-server = st.secrets["database"]["DB_SERVER"]
-database = st.secrets["database"]["DB_DATABASE"]
-username = st.secrets["database"]["DB_USERNAME"]
-password = st.secrets["database"]["DB_PASSWORD"]
-# Tworzenie łańcucha połączenia z bazą danych
-connection_string = f"mssql+pyodbc://{username}:{password}@{server}/{database}?driver=ODBC+Driver+17+for+SQL+Server&TrustServerCertificate=yes&charset=utf8"
-# Tworzenie silnika połączenia
-engine = create_engine(connection_string, use_setinputsizes=False) # https://github.com/sqlalchemy/sqlalchemy/issues/8681
- 
+from cache_zapytan import query_cache
+from schemat import compact
+from harmonogram import run_parallel
+from kostka import build_cube, rollup, top_n
+from profiler import step
+from przyrostowe import aggregate, load
+
+
+# Wymiary, po których strona filtruje - data nie jest używana, więc nie trafia do agregatu
+SKILL_DIMENSIONS = ["field_name", "experience_level_name", "level_name", "skill_name"]
+OFFER_DIMENSIONS = ["field_name", "experience_level_name"]
+DEFAULT_LEVELS = ['Junior', 'Mid', 'Senior']
+SKILL_LEVELS = ['Nice To Have', 'Junior', 'Regular', 'Advanced', 'Master']
+
+
+# Agregaty uzupełniane przyrostowo o oferty dodane od ostatniego odczytu (przyrostowe.py)
+SKILL_COUNTS = aggregate("popularne_technologie.skills", '''
+    SELECT f.field_name, s.skill_name, l.level_name, el.experience_level_name, COUNT(jo.job_offer_id) as 'liczba_ofert'
+    FROM Fields as f JOIN Job_Offers as jo on f.field_id=jo.field_id
+        JOIN Job_Offers_Skills as jos on jos.job_offer_id=jo.job_offer_id
+        JOIN Skills as s on s.skill_id=jos.skill_id
+        JOIN Levels as l on l.level_id=jos.level_id
+        JOIN Experience_Levels as el on el.experience_level_id=jo.experience_level_id
+    WHERE jo.date_id >= :date_from AND jo.date_id < :date_to
+    GROUP BY f.field_name, s.skill_name, l.level_name, el.experience_level_name
+''', keys=SKILL_DIMENSIONS, summary=("Summary_Skills", '''
+    SELECT f.field_name, s.skill_name, l.level_name, el.experience_level_name, SUM(su.liczba_ofert) as 'liczba_ofert'
+    FROM Summary_Skills as su JOIN Fields as f on f.field_id=su.field_id
+        JOIN Skills as s on s.skill_id=su.skill_id
+        JOIN Levels as l on l.level_id=su.level_id
+        JOIN Experience_Levels as el on el.experience_level_id=su.experience_level_id
+    WHERE su.date_id >= :date_from AND su.date_id < :date_to
+    GROUP BY f.field_name, s.skill_name, l.level_name, el.experience_level_name
+'''))
+
+OFFER_COUNTS = aggregate("popularne_technologie.offers", '''
+    SELECT f.field_name, el.experience_level_name, COUNT(jo.job_offer_id) as 'liczba_ofert'
+    FROM Fields as f JOIN Job_Offers as jo on f.field_id=jo.field_id
+        JOIN Experience_Levels as el on el.experience_level_id=jo.experience_level_id
+    WHERE jo.date_id >= :date_from AND jo.date_id < :date_to
+    GROUP BY f.field_name, el.experience_level_name
+''', keys=OFFER_DIMENSIONS, summary=("Summary_Offers", '''
+    SELECT f.field_name, el.experience_level_name, SUM(su.liczba_ofert) as 'liczba_ofert'
+    FROM Summary_Offers as su JOIN Fields as f on f.field_id=su.field_id
+        JOIN Experience_Levels as el on el.experience_level_id=su.experience_level_id
+    WHERE su.date_id >= :date_from AND su.date_id < :date_to
+    GROUP BY f.field_name, el.experience_level_name
+'''))
+
+
+@query_cache(snapshot=True)
+def get_data():
+    return compact(load(SKILL_COUNTS), "popularne_technologie.get_data")
+
+
+@query_cache(snapshot=True)
+def get_data2():
+    return compact(load(OFFER_COUNTS), "popularne_technologie.get_data2")
+
+
+@query_cache
+def get_skill_cube():
+    """ Kostka dziedzina x doświadczenie x poziom umiejętności x technologia """
+    return build_cube(get_data(), SKILL_DIMENSIONS)
+
+
+@query_cache
+def get_offer_cube():
+    """ Kostka dziedzina x doświadczenie (liczba ofert spełniających kryteria) """
+    return build_cube(get_data2(), OFFER_DIMENSIONS)
+
+
+# Niezależne loadery strony - przy zimnym cache wykonywane równolegle (harmonogram.py)
+LOADERS = {"get_skill_cube": get_skill_cube, "get_offer_cube": get_offer_cube}
+
+
+def warm_up():
+    """ Wypełnia cache i pamięć top 20 dla domyślnych filtrów: wszystkie dziedziny i każda z osobna """
+    run_parallel("Technologie", LOADERS)
+    skill_cube = get_skill_cube()
+    fields_options = skill_cube.categories["field_name"]
+    for fields in [fields_options] + [[field] for field in fields_options]:
+        top_n(skill_cube, {"field_name": fields, "experience_level_name": DEFAULT_LEVELS, "level_name": SKILL_LEVELS},
+              "skill_name", 20, breakdown="level_name")
 
 
 def main():
+    step("style CSS", "serialize")
     # Custom CSS for styling
     st.markdown(
         """
@@ -61,56 +136,18 @@ def main():
         unsafe_allow_html=True
     )
 
-    @st.cache_data
-    def get_data():
-        with engine.connect() as connection:
-             df = pd.read_sql('''
-                SELECT d.date_full, f.field_name, s.skill_name, l.level_name, el.experience_level_name, COUNT(jo.job_offer_id) as 'liczba_ofert'
-                FROM Fields as f JOIN Job_Offers as jo on f.field_id=jo.field_id
-                    JOIN Job_Offers_Skills as jos on jos.job_offer_id=jo.job_offer_id
-                    JOIN Skills as s on s.skill_id=jos.skill_id
-                    JOIN Levels as l on l.level_id=jos.level_id
-                    JOIN Experience_Levels as el on el.experience_level_id=jo.experience_level_id
-                    JOIN Dates as d on d.date_id = jo.date_id
-                GROUP BY d.date_full, f.field_name, s.skill_name, l.level_name, el.experience_level_name
-            ''', connection)
-        df["date_full"] = pd.to_datetime(df["date_full"])
-        return df
-    @st.cache_data
-    def get_data2():
-        with engine.connect() as connection:
-             df = pd.read_sql('''
-                SELECT d.date_full, f.field_name, el.experience_level_name, COUNT(jo.job_offer_id) as 'liczba_ofert'
-                FROM Fields as f JOIN Job_Offers as jo on f.field_id=jo.field_id
-                    JOIN Experience_Levels as el on el.experience_level_id=jo.experience_level_id
-                    JOIN Dates as d on d.date_id = jo.date_id
-                GROUP BY d.date_full, f.field_name, el.experience_level_name
-            ''', connection)
-        df["date_full"] = pd.to_datetime(df["date_full"])
-        return df
-    @st.cache_data
-    def get_data3():
-        with engine.connect() as connection:
-             df = pd.read_sql('''
-                SELECT f.field_name, s.skill_name, COUNT(jo.job_offer_id) as 'liczba_ofert'
-                FROM Fields as f JOIN Job_Offers as jo on f.field_id=jo.field_id
-                    JOIN Job_Offers_Skills as jos on jos.job_offer_id=jo.job_offer_id
-                    JOIN Skills as s on s.skill_id=jos.skill_id
-                GROUP BY f.field_name, s.skill_name
-            ''', connection)
-        return df
-    
-    
-    df = get_data()
-    df2 = get_data2()
-    df3 = get_data3()
+    step("dane (równolegle)", "data")
+    run_parallel("Technologie", LOADERS)
+    skill_cube = get_skill_cube()
+    offer_cube = get_offer_cube()
 
+    step("filtry", "transform")
     # Sidebar – wybór poziomu doświadczenia
     st.sidebar.title("Wybierz poziom doświadczenia")
     job_levels_options = ['Junior','Mid','Senior','C-level']
 
     if "selected_levels" not in st.session_state:
-        st.session_state["selected_levels"] = ['Junior', 'Mid', 'Senior']
+        st.session_state["selected_levels"] = DEFAULT_LEVELS
 
     selected_levels = []
     for level in job_levels_options:
@@ -121,10 +158,10 @@ def main():
 
     # Sidebar - wybór poziomu umiejętności
     st.sidebar.title("Wybierz poziom umiejętności")
-    skill_levels_options = ['Nice To Have','Junior','Regular','Advanced','Master']
+    skill_levels_options = SKILL_LEVELS
 
     if "selected_skill_levels" not in st.session_state:
-        st.session_state["selected_skill_levels"] = ['Nice To Have', 'Junior', 'Regular', 'Advanced', 'Master']
+        st.session_state["selected_skill_levels"] = SKILL_LEVELS
 
     selected_skill_levels = []
     for level in skill_levels_options:
@@ -141,7 +178,7 @@ def main():
     st.header("Top 20 technologii w wybranych dziedzinach z podziałem na poziomy zaawansowania")
 
 
-    fields_options = df["field_name"].unique().tolist()
+    fields_options = skill_cube.categories["field_name"]
     selected_fields = []
 
     with st.container():
@@ -149,39 +186,27 @@ def main():
         if not selected_fields:  # If nothing is selected, use all fields
             selected_fields = fields_options
 
-    # Filtrowanie danych
-    filtered_df = df[(df["experience_level_name"].isin(st.session_state["selected_levels"])) &
-                     (df["level_name"].isin(st.session_state["selected_skill_levels"])) &
-                     (df["field_name"].isin(selected_fields))]
-    
-    filtered_df2 = df2[(df2["experience_level_name"].isin(st.session_state["selected_levels"])) &
-                     (df2["field_name"].isin(selected_fields))]
-    
-    offers = filtered_df2["liczba_ofert"].sum()
-
-    # Grupowanie danych i wybór top 20 technologii ogólnie
-    top_20_skills = (filtered_df.groupby("skill_name")
-                     .agg({"liczba_ofert": "sum"})
-                     .reset_index()
-                     .sort_values("liczba_ofert", ascending=False)
-                     .head(20)["skill_name"].tolist())
+    step("agregacja kostki", "transform")
+    # Filtry jako wybór indeksów na osiach kostki
+    filters = {
+        "field_name": selected_fields,
+        "experience_level_name": st.session_state["selected_levels"],
+        "level_name": st.session_state["selected_skill_levels"],
+    }
 
-    # Filtrowanie danych dla top 20 technologii z podziałem na poziomy zaawansowania
-    top_20_technologies = filtered_df[filtered_df["skill_name"].isin(top_20_skills)]
+    offers = int(rollup(offer_cube, {name: filters[name] for name in OFFER_DIMENSIONS}).sum())
 
-    df_skill_order = top_20_technologies.groupby(['skill_name']).agg(
-        total_offers=('liczba_ofert', 'sum')
-    ).reset_index().sort_values('total_offers', ascending=False)
+    # Top 20 technologii z rozbiciem na poziomy zaawansowania (zapamiętane dla każdej kombinacji filtrów)
+    skill_order, skill_totals, level_counts = top_n(skill_cube, filters, "skill_name", 20, breakdown="level_name")
 
-    max_offers = int(df_skill_order['total_offers'].max())
+    max_offers = int(skill_totals.max()) if len(skill_totals) else 0
 
-    skill_order = df_skill_order['skill_name'].tolist()
     level_order= ['Nice To Have', 'Junior', 'Regular', 'Advanced', 'Master']
 
-    # Grupowanie i sortowanie
-    df_skill_order = top_20_technologies.groupby(['skill_name', 'level_name']).agg(
-        total_offers=('liczba_ofert', 'sum')
-    ).reset_index()
+    # Ramka (technologia, poziom, liczba ofert) tylko dla niezerowych kombinacji
+    df_skill_order = pd.DataFrame(level_counts, index=skill_order, columns=skill_cube.categories["level_name"])
+    df_skill_order = df_skill_order.rename_axis(index="skill_name", columns="level_name").stack().rename("total_offers").reset_index()
+    df_skill_order = df_skill_order[df_skill_order["total_offers"] > 0]
 
     
     # Create a categorical type for skill_name and level_name with the desired order
@@ -191,8 +216,9 @@ def main():
     # Sort by both columns
     df_skill_order = df_skill_order.sort_values(['skill_name', 'level_name'])
     # Calculate cumulative positions for text labels
-    df_skill_order['text_position'] = df_skill_order.groupby('skill_name')['total_offers'].cumsum() - (df_skill_order['total_offers'] / 2)
+    df_skill_order['text_position'] = df_skill_order.groupby('skill_name', observed=True)['total_offers'].cumsum() - (df_skill_order['total_offers'] / 2)
 
+    step("wykres technologii", "chart")
     # Tworzenie wykresu z podziałem na poziomy zaawansowania
     bars = alt.Chart(df_skill_order, height=800).mark_bar(cornerRadiusEnd=5).encode(
         x=alt.X('sum(total_offers):Q', title='Liczba ofert').stack('zero'),
@@ -220,6 +246,7 @@ def main():
     ).configure(
         background='rgb(248, 249, 250)' 
     )
+    step("render wykresu", "serialize")
     with st.container(key='plot'):
         st.metric(f"Liczba ofert odpowiadających kryteriom:", f"{offers}")
         st.altair_chart(chart, use_container_width=True)
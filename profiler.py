@@ -0,0 +1,210 @@
+"""
+Profiler przebiegu (rerun) strony: czas każdej nazwanej sekcji main() z podziałem na
+pobieranie danych (data), przekształcenia pandas (transform), budowę specyfikacji wykresów
+(chart) i serializację elementów Streamlit (serialize).
+
+Sekcje danych (loadery cache_zapytan.query_cache) i serializacji (st.altair_chart,
+st.markdown, ...) są mierzone automatycznie; strony dzielą main() na kroki wywołaniem
+step("nazwa", "rodzaj"). Profilowanie włącza tylko [profiler] ENABLED w secrets (opakowanie
+elementów Streamlit dotyczy całego procesu) - po każdym przebiegu do logu trafia podsumowanie
+w formie wykresu płomieniowego.
+"""
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from ustawienia import get_setting
+
+logger = logging.getLogger(__name__)
+
+ENABLED = get_setting("profiler", "ENABLED", False)
+HISTORY = get_setting("profiler", "HISTORY", 20)
+BAR_WIDTH = 30
+
+KINDS = ("data", "transform", "chart", "serialize")
+
+# Metody elementów Streamlit, których czas to budowa i serializacja komunikatu dla przeglądarki
+SERIALIZED_ELEMENTS = ("altair_chart", "vega_lite_chart", "plotly_chart", "pydeck_chart", "map",
+                       "dataframe", "table", "markdown", "metric", "json")
+
+_current = threading.local()  # przebieg profilowany w bieżącym wątku (sesji)
+_runs = deque(maxlen=HISTORY)
+_lock = threading.Lock()
+_patched = False
+
+
+def _node(name, kind):
+    return {"name": name, "kind": kind, "seconds": 0.0, "children": []}
+
+
+def active():
+    """ Czy w bieżącym wątku trwa profilowany przebieg """
+    return getattr(_current, "stack", None) is not None
+
+
+@contextmanager
+def section(name, kind):
+    """ Mierzy zagnieżdżoną sekcję przebiegu; poza profilowanym przebiegiem nic nie robi """
+    stack = getattr(_current, "stack", None)
+    if stack is None:
+        yield
+        return
+    node = _node(name, kind)
+    stack[-1]["children"].append(node)
+    stack.append(node)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        node["seconds"] = time.perf_counter() - started
+        stack.pop()
+
+
+def profiled(name, kind):
+    """ Dekorator: każde wywołanie funkcji w profilowanym przebiegu jest sekcją `name` """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not active():
+                return func(*args, **kwargs)
+            with section(name, kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _close_step():
+    step_node = getattr(_current, "step", None)
+    if step_node is not None:
+        step_node["seconds"] = time.perf_counter() - _current.step_started
+        _current.stack.pop()
+        _current.step = None
+
+
+def step(name, kind="transform"):
+    """
+    Zamyka poprzedni krok strony i otwiera nowy (do końca main() albo do następnego kroku).
+    Poza profilowanym przebiegiem nic nie robi.
+    """
+    if not active():
+        return
+    _close_step()
+    node = _node(name, kind)
+    _current.stack[0]["children"].append(node)
+    _current.stack.append(node)
+    _current.step = node
+    _current.step_started = time.perf_counter()
+
+
+def _wrap_element(method, name):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if not active():
+            return method(*args, **kwargs)
+        with section(f"st.{name}", "serialize"):
+            return method(*args, **kwargs)
+    wrapper.__profiled__ = True
+    return wrapper
+
+
+def _patch_streamlit():
+    """ Opakowuje elementy Streamlit (metody DeltaGenerator i funkcje modułu st) pomiarem czasu """
+    global _patched
+    with _lock:
+        if _patched:
+            return
+        import streamlit as st
+        from streamlit.delta_generator import DeltaGenerator
+        for name in SERIALIZED_ELEMENTS:
+            method = getattr(DeltaGenerator, name, None)
+            if method is not None and not getattr(method, "__profiled__", False):
+                setattr(DeltaGenerator, name, _wrap_element(method, name))
+            function = getattr(st, name, None)
+            if function is not None and not getattr(function, "__profiled__", False):
+                setattr(st, name, _wrap_element(function, name))
+        _patched = True
+
+
+@contextmanager
+def run(page):
+    """
+    Profiluje jeden przebieg strony. Po zakończeniu loguje podsumowanie i zapisuje je
+    w historii (last_runs); wynik (drzewo sekcji) jest dostępny jako słownik `profile`.
+    """
+    _patch_streamlit()
+    root = _node(page, "page")
+    _current.stack = [root]
+    _current.step = None
+    profile = {"page": page, "time": time.time(), "root": root, "summary": None}
+    started = time.perf_counter()
+    try:
+        yield profile
+    finally:
+        _close_step()
+        root["seconds"] = time.perf_counter() - started
+        _current.stack = None
+        profile["kinds"] = kind_totals(root)
+        profile["summary"] = flame_summary(root)
+        with _lock:
+            _runs.append(profile)
+        logger.info("Profil przebiegu strony '%s':\n%s", page, profile["summary"])
+
+
+def _self_seconds(node):
+    return max(node["seconds"] - sum(child["seconds"] for child in node["children"]), 0.0)
+
+
+def kind_totals(root):
+    """ Czas własny (bez podsekcji) zsumowany według rodzaju sekcji; reszta przebiegu jako "other" """
+    totals = dict.fromkeys(KINDS + ("other",), 0.0)
+
+    def visit(node):
+        totals[node["kind"] if node["kind"] in KINDS else "other"] += _self_seconds(node)
+        for child in node["children"]:
+            visit(child)
+
+    visit(root)
+    return totals
+
+
+def _merged(children):
+    # Powtarzające się sekcje o tej samej nazwie i rodzaju (np. kolejne st.metric) łączymy w jeden wiersz
+    merged = {}
+    for child in children:
+        key = (child["name"], child["kind"])
+        if key not in merged:
+            merged[key] = {**child, "children": list(child["children"]), "calls": 1}
+        else:
+            merged[key]["seconds"] += child["seconds"]
+            merged[key]["children"].extend(child["children"])
+            merged[key]["calls"] += 1
+    return list(merged.values())
+
+
+def flame_summary(root):
+    """ Tekstowy wykres płomieniowy: wcięcie = zagnieżdżenie, pasek = udział w czasie przebiegu """
+    total = root["seconds"] or 1e-9
+    lines = []
+
+    def visit(node, depth):
+        share = node["seconds"] / total
+        bar = "█" * max(int(round(share * BAR_WIDTH)), 1 if node["seconds"] else 0)
+        calls = f" x{node['calls']}" if node.get("calls", 1) > 1 else ""
+        lines.append(f"{'  ' * depth}{bar:<{BAR_WIDTH}} {share:6.1%} {node['seconds'] * 1000:9.1f} ms  "
+                     f"{node['name']} [{node['kind']}]{calls}")
+        for child in sorted(_merged(node["children"]), key=lambda child: child["seconds"], reverse=True):
+            visit(child, depth + 1)
+
+    visit(root, 0)
+    kinds = kind_totals(root)
+    lines.append("razem: " + ", ".join(f"{kind} {seconds * 1000:.1f} ms" for kind, seconds in kinds.items()))
+    return "\n".join(lines)
+
+
+def last_runs():
+    """ Ostatnie profilowane przebiegi, od najnowszego """
+    with _lock:
+        return list(reversed(_runs))
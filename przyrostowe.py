@@ -0,0 +1,166 @@
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+import pandas as pd
+from sqlalchemy import text
+
+import migawki
+from baza_danych import connect
+from pobieranie import fetch_frame
+from podsumowania import available
+from ustawienia import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Tryb przyrostowy: po zmianie wersji hurtowni pobierane są tylko oferty o date_id >= znacznika
+ENABLED = get_setting("incremental", "ENABLED", True)
+# Co ile godzin agregaty są mimo wszystko przeliczane od zera (korekty starszych ofert)
+FULL_REFRESH_HOURS = get_setting("incremental", "FULL_REFRESH_HOURS", 24 * 7)
+SOURCE_TABLE = "Job_Offers"
+MIN_DATE_ID = -2 ** 31
+MAX_DATE_ID = 2 ** 31 - 1
+HISTORY_START = "1900-01-01"
+
+# Agregat zliczeń po kluczach; zapytanie ogranicza oferty do j.date_id w [:date_from, :date_to).
+# `summary` to opcjonalnie (tabela podsumowania, zapytanie o te same kolumny z tej tabeli),
+# `since` - opcjonalnie kolumna klucza z datą, gdy agregat obejmuje tylko okno od :since
+Aggregate = namedtuple("Aggregate", ["name", "query", "keys", "measure", "summary", "since", "state", "lock"])
+
+_registry = {}
+
+
+def aggregate(name, query, keys, measure="liczba_ofert", summary=None, since=None):
+    """
+    Rejestruje agregat przyrostowy. Zapytanie musi filtrować oferty warunkiem
+    `date_id >= :date_from AND date_id < :date_to` (przy LEFT JOIN - w klauzuli ON,
+    żeby nie gubić wierszy z zerową liczbą ofert). Gdy podana tabela podsumowania
+    (podsumowania.py) istnieje, agregat jest czytany z niej. Z `since` (kolumna klucza
+    z datą) zapytanie filtruje też dni warunkiem `>= :since`, a load(agg, since) obcina
+    część zamkniętą do tego okna.
+    """
+    if summary is not None:
+        summary = (summary[0], text(summary[1]))
+    result = Aggregate(name=name, query=text(query), keys=list(keys), measure=measure, summary=summary,
+                       since=since, state={}, lock=threading.Lock())
+    _registry[name] = result
+    return result
+
+
+def _source(agg):
+    # Tabela podsumowania, jeśli istnieje i jest aktualna (podsumowania.available); nieodświeżona
+    # jest pomijana na rzecz Job_Offers. Zmiana źródła wymusza pełne przeliczenie agregatu
+    if agg.summary is not None and available(agg.summary[0]):
+        return agg.summary
+    return SOURCE_TABLE, agg.query
+
+
+def _fetch(connection, query, date_from, date_to, params=None):
+    return fetch_frame(connection, query, {"date_from": int(date_from), "date_to": int(date_to), **(params or {})})
+
+
+def _snapshot_path(agg):
+    return migawki.snapshot_path(f"przyrostowe.{agg.name}")
+
+
+def _restore(agg):
+    # Część zamknięta z migawki - po restarcie odświeżenie jest nadal przyrostowe
+    closed, meta = migawki.read(_snapshot_path(agg))
+    if closed is not None and meta.get("watermark") is not None:
+        since = meta.get("since")
+        agg.state.update(closed=closed, watermark=meta["watermark"], loaded=meta["loaded"], source=meta.get("source"),
+                         since=None if since is None else pd.Timestamp(since))
+
+
+def _trim(agg, frame, since):
+    # Dni sprzed początku okna wypadają z części zamkniętej
+    if since is None or frame is None or not len(frame):
+        return frame
+    return frame[pd.to_datetime(frame[agg.since]) >= since].reset_index(drop=True)
+
+
+def _merge(agg, *frames):
+    frames = [frame for frame in frames if frame is not None and len(frame)]
+    if not frames:
+        return pd.DataFrame(columns=agg.keys + [agg.measure])
+    if len(frames) == 1:
+        return frames[0]
+    # Liczniki są addytywne - scalenie to suma po kluczach
+    merged = pd.concat(frames, ignore_index=True)
+    return merged.groupby(agg.keys, as_index=False, sort=False, dropna=False, observed=True)[agg.measure].sum()
+
+
+def load(agg, since=None):
+    """
+    Zwraca aktualną ramkę agregatu. Oferty sprzed znacznika (ostatni znany MAX(date_id)) są
+    trzymane lokalnie jako część zamknięta; przy odświeżeniu do niej dosumowywane są tylko
+    oferty z przedziału [znacznik, nowy MAX), a ostatni dzień (jeszcze niepełny) jest
+    pobierany ponownie. Przy wyłączonym trybie przyrostowym, cofnięciu się znacznika,
+    poszerzeniu okna `since` lub po FULL_REFRESH_HOURS agregat jest liczony od zera.
+    """
+    if agg.since is None:
+        since = None
+    else:
+        # Bez podanego początku okna - cała historia
+        since = pd.Timestamp(since if since is not None else HISTORY_START).normalize()
+    params = None if since is None else {"since": since.date()}
+    with agg.lock:
+        state = agg.state
+        if not state and ENABLED:
+            _restore(agg)
+        table, query = _source(agg)
+        with connect() as connection:
+            watermark = connection.execute(text(f"SELECT MAX(date_id) FROM {table}")).scalar()
+            boundary = MAX_DATE_ID if watermark is None else watermark
+            previous = state.get("watermark")
+            # Okno sięgające wcześniej niż zapamiętane - brakujących dni nie ma w części zamkniętej
+            widened = since is not None and state.get("since") is not None and since < state["since"]
+            full = (not ENABLED or previous is None or watermark is None or watermark < previous or widened
+                    or state.get("source") != table or time.time() - state["loaded"] > FULL_REFRESH_HOURS * 3600)
+            started = time.perf_counter()
+            if full:
+                closed = _fetch(connection, query, MIN_DATE_ID, boundary, params)
+                fetched = len(closed)
+                state["loaded"] = time.time()
+            else:
+                closed = _trim(agg, state["closed"], since)
+                fetched = 0
+                if watermark > previous:
+                    delta = _fetch(connection, query, previous, watermark, params)
+                    fetched = len(delta)
+                    closed = _merge(agg, closed, delta)
+            tail = _fetch(connection, query, boundary, MAX_DATE_ID, params) if watermark is not None else None
+        if ENABLED and watermark is not None and (full or watermark != previous):
+            migawki.write(_snapshot_path(agg), closed, watermark=watermark, loaded=state["loaded"], source=table,
+                          since=None if since is None else since.isoformat())
+        state["closed"] = closed
+        state["watermark"] = watermark
+        state["source"] = table
+        if since is not None:
+            state["since"] = since
+        state["result"] = _merge(agg, closed, tail)
+        logger.info("%s (%s): %s, znacznik date_id %s -> %s, pobrano %d wierszy w %.2f s",
+                    agg.name, table, "pełne przeliczenie" if full else "przyrost", previous, watermark,
+                    fetched + (0 if tail is None else len(tail)), time.perf_counter() - started)
+        return state["result"].copy()
+
+
+def reset(name=None):
+    """ Usuwa stan lokalny agregatów (wszystkich lub jednego) - następne wczytanie liczy je od zera """
+    for agg in ([_registry[name]] if name is not None else list(_registry.values())):
+        with agg.lock:
+            agg.state.clear()
+            if os.path.exists(_snapshot_path(agg)):
+                os.remove(_snapshot_path(agg))
+
+
+def watermarks():
+    """ Bieżący znacznik date_id i liczba wierszy każdego agregatu """
+    report = {}
+    for name, agg in _registry.items():
+        with agg.lock:
+            result = agg.state.get("result")
+            report[name] = {"watermark": agg.state.get("watermark"), "rows": 0 if result is None else len(result)}
+    return report
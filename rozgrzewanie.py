@@ -0,0 +1,81 @@
+"""
+Rozgrzewanie cache: wykonuje loadery wszystkich stron (funkcje warm_up w modułach stron)
+dla domyślnych filtrów, żeby pierwszy użytkownik po restarcie lub nowym ładowaniu danych
+nie trafiał na zimne zapytania.
+
+W aplikacji wątek startuje raz na proces (app.py) i powtarza rozgrzewanie po zmianie
+wersji hurtowni oraz co [warmup] INTERVAL sekund - tylko dla stron już zaimportowanych
+w tym procesie, żeby nie ładować z góry ciężkich zależności stron (geopandas, scipy, plotly).
+Samodzielne uruchomienie (python rozgrzewanie.py, np. z harmonogramu zadań po ładowaniu
+hurtowni) rozgrzewa wszystkie strony i odświeża migawki na dysku, z których startują procesy aplikacji.
+"""
+import logging
+import threading
+import time
+
+from cache_zapytan import VERSION_PROBE_INTERVAL, warehouse_version
+from strony import PAGES, load_page, loaded_pages
+from ustawienia import get_setting
+
+logger = logging.getLogger(__name__)
+
+ENABLED = get_setting("warmup", "ENABLED", True)
+WARM_INTERVAL = get_setting("warmup", "INTERVAL", 6 * 3600)
+
+_report = {}  # strona -> czas i wynik ostatniego rozgrzania
+_lock = threading.Lock()
+_started = False
+
+
+def warm(pages=None):
+    """ Rozgrzewa podane (domyślnie wszystkie) strony po kolei; błąd jednej strony nie przerywa pozostałych """
+    started = time.perf_counter()
+    for name in PAGES if pages is None else pages:
+        page_started = time.perf_counter()
+        try:
+            module = load_page(name)
+            if not hasattr(module, "warm_up"):
+                continue
+            module.warm_up()
+            error = None
+        except Exception as exc:
+            logger.warning("Rozgrzewanie strony '%s' nie powiodło się", name, exc_info=True)
+            error = repr(exc)
+        with _lock:
+            _report[name] = {"seconds": time.perf_counter() - page_started, "finished": time.time(), "error": error}
+    logger.info("Rozgrzewanie cache zakończone w %.2f s", time.perf_counter() - started)
+
+
+def _loop():
+    last_version = None
+    last_warm = None
+    while True:
+        version = warehouse_version()
+        pages = loaded_pages()
+        # Nowo zaimportowana strona rozgrzewa się sama przy pierwszym przebiegu - tu tylko odświeżenie
+        if pages and (last_warm is None or version != last_version or time.monotonic() - last_warm >= WARM_INTERVAL):
+            warm(pages)
+            last_version = version
+            last_warm = time.monotonic()
+        time.sleep(VERSION_PROBE_INTERVAL)
+
+
+def start():
+    """ Uruchamia wątek rozgrzewania (raz na proces) - odświeża odwiedzone strony po każdym ładowaniu danych """
+    global _started
+    with _lock:
+        if _started or not ENABLED:
+            return
+        _started = True
+    threading.Thread(target=_loop, name="rozgrzewanie-cache", daemon=True).start()
+
+
+def warm_report():
+    """ Czas i ewentualny błąd ostatniego rozgrzania każdej strony """
+    with _lock:
+        return {name: dict(entry) for name, entry in _report.items()}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    warm()
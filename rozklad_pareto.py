@@ -1,4 +1,3 @@
-from sqlalchemy import create_engine, text
 import streamlit as st
 import pandas as pd
 import altair as alt
@@ -6,15 +5,117 @@ import numpy as np
 from scipy.stats import pareto, skew, kurtosis
 import streamlit.components.v1 as components
 
-# Połączenie z bazą danych
-server = st.secrets["database"]["DB_SERVER"]
-database = st.secrets["database"]["DB_DATABASE"]
-username = st.secrets["database"]["DB_USERNAME"]
-password = st.secrets["database"]["DB_PASSWORD"]
-connection_string = f"mssql+pyodbc://{username}:{password}@{server}/{database}?driver=ODBC+Driver+17+for+SQL+Server&TrustServerCertificate=yes&charset=utf8"
-engine = create_engine(connection_string, use_setinputsizes=False)
+from cache_zapytan import query_cache
+from dopasowanie import fit, fit_groups
+from koncentracja import build_curve, build_curves, threshold
+from przyrostowe import aggregate, load
+from profiler import step
+from schemat import compact
+
+
+# Liczba ofert w miastach, uzupełniana przyrostowo o oferty dodane od ostatniego odczytu
+CITY_COUNTS = aggregate("rozklad_pareto.cities", '''
+    SELECT c.city_id, c.city_name, COUNT(j.job_offer_id) as liczba_ofert
+    FROM Job_Offers as j 
+    JOIN Cities as c ON j.city_id = c.city_id
+    WHERE c.is_polish = 1 AND j.date_id >= :date_from AND j.date_id < :date_to
+    GROUP BY c.city_id, c.city_name
+''', keys=["city_id", "city_name"], summary=("Summary_Cities", '''
+    SELECT c.city_id, c.city_name, SUM(su.liczba_ofert) as liczba_ofert
+    FROM Summary_Cities as su
+    JOIN Cities as c ON su.city_id = c.city_id
+    WHERE c.is_polish = 1 AND su.date_id >= :date_from AND su.date_id < :date_to
+    GROUP BY c.city_id, c.city_name
+'''))
+
+
+# Miesięczna liczba ofert w miastach - źródło analizy miesięcznej, też przyrostowe
+MONTHLY_CITY_COUNTS = aggregate("rozklad_pareto.monthly_cities", '''
+    SELECT YEAR(d.date_full) AS year, MONTH(d.date_full) AS month, c.city_id, c.city_name, COUNT(j.job_offer_id) as liczba_ofert
+    FROM Job_Offers as j
+    JOIN Cities as c ON j.city_id = c.city_id
+    JOIN Dates as d ON j.date_id = d.date_id
+    WHERE c.is_polish = 1 AND j.date_id >= :date_from AND j.date_id < :date_to
+    GROUP BY YEAR(d.date_full), MONTH(d.date_full), c.city_id, c.city_name
+''', keys=["year", "month", "city_id", "city_name"], summary=("Summary_Cities", '''
+    SELECT YEAR(d.date_full) AS year, MONTH(d.date_full) AS month, c.city_id, c.city_name, SUM(su.liczba_ofert) as liczba_ofert
+    FROM Summary_Cities as su
+    JOIN Cities as c ON su.city_id = c.city_id
+    JOIN Dates as d ON su.date_id = d.date_id
+    WHERE c.is_polish = 1 AND su.date_id >= :date_from AND su.date_id < :date_to
+    GROUP BY YEAR(d.date_full), MONTH(d.date_full), c.city_id, c.city_name
+'''))
+
+# Miasta, których udział w ofertach jest pokazywany w analizie miesięcznej
+MONTHLY_TOP_CITIES = 5
+
+
+@query_cache(snapshot=True)
+def get_data():
+    return compact(load(CITY_COUNTS), "rozklad_pareto.get_data")
+
+
+@query_cache(snapshot=True)
+def get_monthly_data():
+    """ Liczba ofert w miastach w każdym miesiącu (miesiąc x miasto) """
+    df = load(MONTHLY_CITY_COUNTS)
+    # Pierwszy dzień miesiąca z kolumn year/month zgrupowanych w SQL
+    month = pd.to_datetime(pd.DataFrame({"year": df["year"], "month": df["month"], "day": 1}))
+    df = df[["city_id", "city_name", "liczba_ofert"]].assign(month=month)[["month", "city_id", "city_name", "liczba_ofert"]]
+    df = df[df["liczba_ofert"] > 0].sort_values(["month", "city_id"]).reset_index(drop=True)
+    return compact(df, "rozklad_pareto.get_monthly_data")
+
+
+@query_cache
+def get_monthly_concentration():
+    """
+    Krzywe Pareto, miary koncentracji i dopasowane alfa dla wszystkich miesięcy naraz
+    (build_curves / fit_groups - jedno sortowanie zamiast pętli po miesiącach).
+    Zwraca (miary z wierszem na miesiąc, punkty krzywych, udziały największych miast).
+    """
+    df = get_monthly_data()
+    months = df["month"].to_numpy()
+    counts = df["liczba_ofert"].to_numpy()
+    points, measures = build_curves(months, counts)
+    fits = fit_groups(months, counts).drop(columns="n")
+    measures = measures.merge(fits, on="grupa", how="left").rename(columns={"grupa": "month"})
+    measures["miesiac"] = measures["month"].dt.strftime("%Y-%m")
+    # Etykiety miesięcy dla punktów krzywych z gotowych etykiet miar (kategorie - bez formatowania dat przy każdym przebiegu)
+    points = points.rename(columns={"grupa": "month"}).merge(measures[["month", "miesiac"]], on="month")
+    points["miesiac"] = points["miesiac"].astype("category")
+
+    # Udział w ofertach miesiąca dla miast z największą liczbą ofert w całej historii
+    top = df.groupby("city_name", observed=True)["liczba_ofert"].sum().nlargest(MONTHLY_TOP_CITIES).index
+    shares = df[df["city_name"].isin(top)].merge(measures[["month", "oferty"]], on="month")
+    shares = shares.assign(udzial=shares["liczba_ofert"] / shares["oferty"])[["month", "city_name", "udzial"]]
+    shares["city_name"] = shares["city_name"].astype(str)
+    return measures, points, shares.reset_index(drop=True)
+
+
+@query_cache
+def get_curve():
+    """ Krzywa Pareto i miary koncentracji - liczone raz na wersję danych, a nie przy każdym ruchu suwaka """
+    df = get_data()
+    return build_curve(df.loc[df["liczba_ofert"] > 0, "liczba_ofert"].to_numpy())
+
+
+@query_cache
+def get_fit():
+    """ Dopasowanie rozkładu Pareto (MLE + KS) z przedziałami ufności - raz na wersję danych """
+    df = get_data()
+    return fit(df.loc[df["liczba_ofert"] > 0, "liczba_ofert"].to_numpy())
+
+
+def warm_up():
+    """ Wypełnia cache danych strony (rozgrzewanie.py) """
+    get_data()
+    get_curve()
+    get_fit()
+    get_monthly_concentration()
+
 
 def main():
+    step("style CSS", "serialize")
     st.markdown(
         """
         <style>
@@ -98,19 +199,7 @@ def main():
         unsafe_allow_html=True
     )
 
-    @st.cache_data
-    def get_data():
-        query = '''
-            SELECT c.city_id, c.city_name, COUNT(j.job_offer_id) as liczba_ofert
-            FROM Job_Offers as j 
-            JOIN Cities as c ON j.city_id = c.city_id
-            WHERE c.is_polish = 1
-            GROUP BY c.city_id, c.city_name
-        '''
-        with engine.connect() as connection:
-            df = pd.read_sql(query, connection)
-        return df
-    
+    step("dane", "data")
     df = get_data()
     df = df[df['liczba_ofert'] > 0]
     
@@ -141,22 +230,22 @@ def main():
                 """)
 
         with col12:
-            df_sorted = df.sort_values(by='liczba_ofert', ascending=False)
-            df_sorted['cum_oferty'] = df_sorted['liczba_ofert'].cumsum()
-            df_sorted['cum_oferty_pct'] = df_sorted['cum_oferty'] / df_sorted['liczba_ofert'].sum()
-            df_sorted['cum_miasta_pct'] = (np.arange(len(df_sorted)) + 1) / len(df_sorted)
+            step("krzywa Pareto", "transform")
+            curve = get_curve()
 
             threshold_pct = st.slider("Wybierz procent ofert pracy", min_value=0.4, max_value=1.0, value=0.8, step=0.01)
 
         with col13:  
-            pareto_threshold = df_sorted[df_sorted['cum_oferty_pct'] >= threshold_pct].iloc[0]
-            st.markdown(f"<h5>Interpretacja: Około {pareto_threshold['cum_miasta_pct'] * 100:.2f}%  miast ({int(pareto_threshold['cum_miasta_pct'] * len(df))}) generuje {threshold_pct * 100:.0f}% wszystkich ofert pracy.</h5>", unsafe_allow_html=True)
+            # Wyszukiwanie binarne na gotowej krzywej - bez sortowania i skanowania miast przy każdym ruchu suwaka
+            cities_pct, offers_pct, cities_count = threshold(curve, threshold_pct)
+            st.markdown(f"<h5>Interpretacja: Około {cities_pct * 100:.2f}%  miast ({cities_count}) generuje {threshold_pct * 100:.0f}% wszystkich ofert pracy.</h5>", unsafe_allow_html=True)
 
         with col14:
-            pareto_chart = alt.Chart(df_sorted).mark_line(color='#0096c7', point=True).encode(
+            step("wykres Pareto", "chart")
+            pareto_chart = alt.Chart(curve.frame).mark_line(color='#0096c7', point=True).encode(
                 x=alt.X('cum_miasta_pct:Q', title='Procent miast (od największej liczby ofert)'),
                 y=alt.Y('cum_oferty_pct:Q', title='Skumulowany procent ofert pracy')
-            ) + alt.Chart(pd.DataFrame({'x': [pareto_threshold['cum_miasta_pct']], 'y': [pareto_threshold['cum_oferty_pct']]})).mark_point(color='red', size=100).encode(
+            ) + alt.Chart(pd.DataFrame({'x': [cities_pct], 'y': [offers_pct]})).mark_point(color='red', size=100).encode(
                 x='x:Q', y='y:Q'
             ).properties(
                 title="Wykres Pareto (dynamiczny próg + model 80/20)"
@@ -180,11 +269,13 @@ def main():
             st.altair_chart(pareto_chart + pareto_line)
             
         
+    step("top 10 miast", "transform")
     # Grupowanie danych
-    city_counts = df.groupby("city_name")["liczba_ofert"].sum().reset_index()
+    city_counts = df.groupby("city_name", observed=True)["liczba_ofert"].sum().reset_index()
     # Wybór top 10 miast pod względem liczby ofert
     top_10_cities = city_counts.nlargest(10, "liczba_ofert")
 
+    step("wykresy top 10", "chart")
     # Tworzenie wykresu słupkowego
     chart_top10 = alt.Chart(top_10_cities).mark_bar(color='#0096c7').encode(
         x=alt.X('city_name:N', title='Miasto', sort='-y', axis=alt.Axis(labelAngle=0)),  # Sortowanie według liczby ofert
@@ -228,6 +319,7 @@ def main():
     )
 
 
+    step("render wykresów top 10", "serialize")
     # Wyświetlenie wykresu
     with col2:
         col21, col22 = st.columns(2)
@@ -236,6 +328,7 @@ def main():
         with col22:
             st.altair_chart(chart, use_container_width=True)
        
+    step("metryki rozkładu", "transform")
     # Obliczenie dodatkowych metryk
     mean = np.mean(df['liczba_ofert'])
     variance = np.var(df['liczba_ofert'])
@@ -256,6 +349,17 @@ def main():
         st.metric(label="Kurtoza", value=f"{kurt:.2f}", 
             help='Miara "szczytowatości" rozkładu liczby ofert pracy. Wartość wyższa od 3 sugeruje, że rozkład ma więcej wartości ekstremalnych (grubymi ogonami). Wartość mniejsza od 3 oznacza, że rozkład jest bardziej płaski.')
 
+        # Miary koncentracji policzone razem z krzywą Pareto (koncentracja.py)
+        st.metric(label="Współczynnik Giniego", value=f"{curve.gini:.3f}",
+            help='Nierówność rozkładu ofert między miastami: 0 - każde miasto ma tyle samo ofert, blisko 1 - prawie wszystkie oferty są w jednym mieście.')
+
+        st.metric(label="Indeks Hoovera", value=f"{curve.hoover:.3f}",
+            help='Jaką część wszystkich ofert trzeba by przenieść między miastami, żeby w każdym było ich tyle samo.')
+
+        st.metric(label="Udział największych miast", value=f"{curve.top_k[10] * 100:.1f}%",
+            help=f"Odsetek ofert w 10 miastach z największą liczbą ofert (1 miasto: {curve.top_k[1] * 100:.1f}%, 5 miast: {curve.top_k[5] * 100:.1f}%, "
+                 f"20% miast: {curve.top_shares[0.2] * 100:.1f}%).")
+
 
     with col2:    
         col21, col22, col23, col24 = st.columns(4)
@@ -289,11 +393,23 @@ def main():
                 """)
 
 
+        # Suwaki startują od najlepszego dopasowania (MLE) zamiast od zgadywanych wartości
+        step("dopasowanie Pareto", "data")
+        pareto_fit = get_fit()
+        xm_max = int(df['liczba_ofert'].max())
+        xm_start = min(max(int(pareto_fit.xm), 1), xm_max) if np.isfinite(pareto_fit.xm) else int(df['liczba_ofert'].min())
+        alpha_start = float(min(max(round(pareto_fit.alpha, 1), 0.1), 3.0)) if np.isfinite(pareto_fit.alpha) else 0.7
         with col22:
-            xm = st.slider("Wartość minimalna (x\u2098)", min_value=1, max_value=int(df['liczba_ofert'].max()), value=int(df['liczba_ofert'].min()))       
+            xm = st.slider("Wartość minimalna (x\u2098)", min_value=1, max_value=xm_max, value=xm_start,
+                           help=f"Najlepsze dopasowanie: x\u2098 = {pareto_fit.xm:.0f} (95% CI {pareto_fit.xm_ci[0]:.0f}–{pareto_fit.xm_ci[1]:.0f}), "
+                                f"ogon: {pareto_fit.tail} z {pareto_fit.n} miast.")
         with col23:
-            alpha = st.slider("Parametr kształtu (α)", min_value=0.1, max_value=3.0, value=0.7, step=0.1)
+            alpha = st.slider("Parametr kształtu (α)", min_value=0.1, max_value=3.0, value=alpha_start, step=0.1,
+                              help=f"Estymator największej wiarygodności (Hilla): α = {pareto_fit.alpha:.2f} (95% CI {pareto_fit.alpha_ci[0]:.2f}–{pareto_fit.alpha_ci[1]:.2f}).")
+            st.caption(f"Dopasowanie MLE: α = {pareto_fit.alpha:.2f} (95% CI {pareto_fit.alpha_ci[0]:.2f}–{pareto_fit.alpha_ci[1]:.2f}), "
+                       f"x\u2098 = {pareto_fit.xm:.0f}, odległość KS = {pareto_fit.ks:.3f}")
         with col24:
+            step("wykres Q-Q", "chart")
             # Wykres Q-Q (log-log)
             emp_quantiles = np.sort(df['liczba_ofert'])
             theo_quantiles = pareto.ppf(np.linspace(0.01, 0.99, len(emp_quantiles)), alpha, loc=0, scale=xm)
@@ -316,4 +432,75 @@ def main():
             st.altair_chart(qq_chart.properties(width=700, height=400))
 
     
-    
\ No newline at end of file
+    
+
+    st.header("Koncentracja ofert w czasie")
+    if not st.toggle("Analiza miesięczna", help="Krzywa Pareto, miary koncentracji i dopasowany parametr α osobno dla każdego miesiąca."):
+        return
+
+    step("analiza miesięczna", "data")
+    # Wszystkie miesiące liczone razem i trzymane w cache - przełączenie trybu nie przelicza danych
+    measures, points, shares = get_monthly_concentration()
+    if measures.empty:
+        st.info("Brak danych miesięcznych.")
+        return
+
+    step("wykresy miesięczne", "chart")
+    labels = {"gini": "Współczynnik Giniego", "hoover": "Indeks Hoovera", "top_10": "Udział 10 największych miast",
+              "top_20pct": "Udział 20% największych miast"}
+    indices = measures.melt(id_vars="month", value_vars=list(labels), var_name="miara", value_name="wartosc")
+    indices["miara"] = indices["miara"].map(labels)
+    indices_chart = alt.Chart(indices).mark_line(point=True).encode(
+        x=alt.X('month:T', title='Miesiąc', axis=alt.Axis(format='%Y-%m', labelAngle=-45)),
+        y=alt.Y('wartosc:Q', title='Wartość', scale=alt.Scale(domain=[0, 1])),
+        color=alt.Color('miara:N', title='Miara'),
+        tooltip=[alt.Tooltip('month:T', title='Miesiąc', format='%Y-%m'), alt.Tooltip('miara:N', title='Miara'),
+                 alt.Tooltip('wartosc:Q', title='Wartość', format='.3f')]
+    ).properties(
+        height=400,
+        title="Miary koncentracji w kolejnych miesiącach"
+    )
+
+    alpha_chart = alt.Chart(measures).mark_line(color='#0096c7', point=True).encode(
+        x=alt.X('month:T', title='Miesiąc', axis=alt.Axis(format='%Y-%m', labelAngle=-45)),
+        y=alt.Y('alpha:Q', title='Parametr kształtu (α)'),
+        tooltip=[alt.Tooltip('month:T', title='Miesiąc', format='%Y-%m'), alt.Tooltip('alpha:Q', title='α', format='.2f'),
+                 alt.Tooltip('xm:Q', title='xₘ'), alt.Tooltip('ks:Q', title='Odległość KS', format='.3f'),
+                 alt.Tooltip('tail:Q', title='Miasta w ogonie'), alt.Tooltip('miasta:Q', title='Miasta')]
+    ).properties(
+        height=400,
+        title="Dopasowany parametr α w kolejnych miesiącach"
+    )
+
+    shares_chart = alt.Chart(shares).mark_line(point=True).encode(
+        x=alt.X('month:T', title='Miesiąc', axis=alt.Axis(format='%Y-%m', labelAngle=-45)),
+        y=alt.Y('udzial:Q', title='Udział w ofertach miesiąca', axis=alt.Axis(format='%')),
+        color=alt.Color('city_name:N', title='Miasto'),
+        tooltip=[alt.Tooltip('month:T', title='Miesiąc', format='%Y-%m'), alt.Tooltip('city_name:N', title='Miasto'),
+                 alt.Tooltip('udzial:Q', title='Udział', format='.1%')]
+    ).properties(
+        height=400,
+        title=f"Udział {MONTHLY_TOP_CITIES} największych miast w ofertach"
+    )
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.altair_chart(indices_chart.configure(background='rgb(248, 249, 250)').configure_title(fontSize=20))
+        st.altair_chart(shares_chart.configure(background='rgb(248, 249, 250)').configure_title(fontSize=20))
+    with col2:
+        st.altair_chart(alpha_chart.configure(background='rgb(248, 249, 250)').configure_title(fontSize=20))
+
+        # Krzywe Pareto wybranych miesięcy - punkty wszystkich miesięcy są już policzone
+        month_labels = measures["miesiac"].tolist()
+        selected_months = st.multiselect("Krzywe Pareto dla miesięcy", month_labels,
+                                         default=sorted({month_labels[0], month_labels[-1]}))
+        curves = points.loc[points["miesiac"].isin(selected_months), ["cum_miasta_pct", "cum_oferty_pct", "miesiac"]]
+        curves_chart = alt.Chart(curves).mark_line().encode(
+            x=alt.X('cum_miasta_pct:Q', title='Procent miast (od największej liczby ofert)'),
+            y=alt.Y('cum_oferty_pct:Q', title='Skumulowany procent ofert pracy'),
+            color=alt.Color('miesiac:N', title='Miesiąc')
+        ).properties(
+            height=400,
+            title="Krzywe Pareto w wybranych miesiącach"
+        )
+        st.altair_chart(curves_chart.configure(background='rgb(248, 249, 250)').configure_title(fontSize=20))
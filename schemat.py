@@ -0,0 +1,46 @@
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Kolumny wymiarów (mało unikalnych wartości, dużo powtórzeń) - przechowywane jako kategorie
+DIMENSIONS = {
+    "field_name", "skill_name", "level_name", "experience_level_name", "experience_level",
+    "day_name", "month_name", "city_name", "province_name", "district_id_gus", "formatted",
+    "company_name", "year_month",
+}
+# Liczniki są zwężane najwyżej do int32 (jak w kostka.py) - int8/int16 przepełniają się po cichu
+# w dalszej arytmetyce na kolumnach (np. int16: 30000 + 30000 = -5536)
+_COUNT_DTYPE = np.int32
+_COUNT_RANGE = np.iinfo(_COUNT_DTYPE)
+
+# Zużycie pamięci przed i po konwersji dla każdego loadera
+_report = {}
+_lock = threading.Lock()
+
+
+def compact(df, name):
+    """ Zamienia kolumny wymiarów na kategorie, a liczniki int64 mieszczące się w zakresie na int32 """
+    before = int(df.memory_usage(deep=True).sum())
+    for column in df.columns:
+        series = df[column]
+        if column in DIMENSIONS and (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+            df[column] = series.astype("category")
+        elif pd.api.types.is_integer_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            if series.dtype.itemsize > _COUNT_RANGE.bits // 8 and (
+                    series.empty or (series.min() >= _COUNT_RANGE.min and series.max() <= _COUNT_RANGE.max)):
+                df[column] = series.astype("Int32" if pd.api.types.is_extension_array_dtype(series) else _COUNT_DTYPE)
+    after = int(df.memory_usage(deep=True).sum())
+    with _lock:
+        _report[name] = {"rows": len(df), "bytes_before": before, "bytes_after": after}
+    logger.info("%s: %d wierszy, pamięć %.1f kB -> %.1f kB", name, len(df), before / 1024, after / 1024)
+    return df
+
+
+def memory_report():
+    """ Zwraca raport pamięci ramek (przed/po konwersji typów) dla każdego loadera """
+    with _lock:
+        return {name: dict(entry) for name, entry in _report.items()}
@@ -0,0 +1,17 @@
+-- Indeksy pod zapytania szczegółowej mapy miast (mapa_polski.get_offers_in_view).
+-- Filtr: miasto + prostokąt widoku (latitude/longitude) + zakres wynagrodzeń.
+
+-- Pokrywający indeks przestrzenny "dla ubogich": city_id, a w nim zakres szerokości i długości
+CREATE NONCLUSTERED INDEX IX_Job_Offers_city_lat_lon
+    ON Job_Offers (city_id, latitude, longitude)
+    INCLUDE (job_offer_id, date_id, field_id, company_id, job_title, job_offer_name)
+    WHERE latitude IS NOT NULL AND longitude IS NOT NULL;
+
+-- Wynagrodzenie oferty (połączenie Job_Offers_Salaries -> Salaries)
+CREATE NONCLUSTERED INDEX IX_Job_Offers_Salaries_offer
+    ON Job_Offers_Salaries (job_offer_id)
+    INCLUDE (salary_id);
+
+CREATE NONCLUSTERED INDEX IX_Cities_city_name
+    ON Cities (city_name)
+    INCLUDE (city_id);
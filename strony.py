@@ -0,0 +1,59 @@
+import importlib
+import logging
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Rejestr stron: nazwa w menu -> moduł ładowany dopiero przy pierwszym wyborze
+PAGES = {
+    "Liczba Ofert": "liczba_ofert",
+    "Zarobki": "zarobki",
+    "Technologie": "popularne_technologie",
+    "Mapa Polski": "mapa_polski",
+    "Rozkład Pareto": "rozklad_pareto",
+}
+
+# Strony poza domyślnym menu (app.py pokazuje je tylko po włączeniu w ustawieniach)
+HIDDEN_PAGES = {
+    "Diagnostyka": "diagnostyka",
+}
+
+# Koszt importu każdej strony (wspólny dla całego procesu)
+_import_report = {}
+_lock = threading.Lock()
+
+
+def load_page(name):
+    """ Importuje moduł strony (wraz z jego ciężkimi zależnościami) przy pierwszym użyciu """
+    module_name = PAGES[name] if name in PAGES else HIDDEN_PAGES[name]
+    # Moduł w sys.modules może być jeszcze w trakcie importu w innym wątku (rozgrzewanie.py)
+    if name in _import_report:
+        return sys.modules[module_name]
+    with _lock:
+        modules_before = len(sys.modules)
+        start = time.perf_counter()
+        module = importlib.import_module(module_name)
+        elapsed = time.perf_counter() - start
+        if name not in _import_report:
+            _import_report[name] = {
+                "module": module_name,
+                "seconds": elapsed,
+                "new_modules": len(sys.modules) - modules_before,
+            }
+            logger.info("Strona '%s' (%s) zaimportowana w %.3f s, nowe moduły: %d",
+                        name, module_name, elapsed, len(sys.modules) - modules_before)
+    return module
+
+
+def loaded_pages():
+    """ Strony (z PAGES), których moduły zostały już zaimportowane w tym procesie """
+    with _lock:
+        return [name for name in PAGES if name in _import_report]
+
+
+def import_report():
+    """ Zwraca raport kosztu importu załadowanych dotąd stron """
+    with _lock:
+        return {name: dict(entry) for name, entry in _import_report.items()}
@@ -0,0 +1,46 @@
+"""
+Przygotowanie uproszczonych geometrii dla map choropleth (krok offline).
+
+Dla każdego pliku źródłowego zapisuje obok niego warianty <nazwa>_<tolerancja>.json:
+geometria uproszczona z zachowaniem wspólnych granic (simplify_coverage), współrzędne
+skwantowane do geometrie.COORD_DECIMALS miejsc po przecinku, tylko potrzebne atrybuty.
+Pliki, których nie ma w katalogu (np. granice powiatów powiaty/pow.json, niedołączone
+do repozytorium), są pomijane - ich uproszczenie wymaga dostarczenia oryginalnego pliku.
+
+Uruchomienie: python uproszczenie_geometrii.py
+"""
+import json
+import os
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from geometrie import SIMPLIFIED_LEVELS, simplified_path, simplify
+
+
+def write_geojson(gdf, path):
+    features = json.loads(gdf.to_json(drop_id=True))
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(features, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def main():
+    for path, (properties, tolerances) in SIMPLIFIED_LEVELS.items():
+        if not os.path.exists(path):
+            print(f"Pominięto {path} - brak pliku")
+            continue
+        gdf = gpd.read_file(path)[properties + ["geometry"]]
+        source_size = os.path.getsize(path)
+        source_points = int(np.sum(shapely.get_num_coordinates(gdf.geometry.values)))
+        for tolerance in tolerances:
+            output = simplified_path(path, tolerance)
+            result = simplify(gdf, tolerance)
+            write_geojson(result, output)
+            points = int(np.sum(shapely.get_num_coordinates(result.geometry.values)))
+            print(f"{output}: {os.path.getsize(output) / 1024:.0f} kB "
+                  f"({source_size / os.path.getsize(output):.1f}x mniej), punkty {source_points} -> {points}")
+
+
+if __name__ == "__main__":
+    main()
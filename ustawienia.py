@@ -0,0 +1,21 @@
+import os
+
+import streamlit as st
+
+
+def get_setting(section, key, default=None):
+    """ Zwraca ustawienie z sekcji st.secrets lub zmiennej środowiskowej DASHBOARD_<SEKCJA>_<KLUCZ> """
+    env_name = f"DASHBOARD_{section}_{key}".upper()
+    if env_name in os.environ:
+        value = os.environ[env_name]
+        # Zmienne środowiskowe są tekstem - rzutujemy na typ wartości domyślnej
+        if isinstance(default, bool):
+            return value.lower() in ("1", "true", "tak", "yes")
+        if isinstance(default, (int, float)):
+            return type(default)(value)
+        return value
+    try:
+        return st.secrets[section].get(key, default)
+    except (KeyError, FileNotFoundError):
+        # Brak pliku secrets.toml lub brak sekcji - używamy wartości domyślnej
+        return default
@@ -1,12 +1,12 @@
-from sqlalchemy import create_engine, text
-from dotenv import load_dotenv
-
 import streamlit as st
 import pandas as pd
 import altair as alt
 
+from profiler import step
+
 def main():
     
+    step("style CSS", "serialize")
     # Dodaj niestandardowy CSS dla zwiększenia szerokości kontenera
     st.markdown(
         """
@@ -79,6 +79,7 @@ def main():
 
     st.header(f"Zarobki w podziale na dziedziny")
 
+    step("dane i filtry", "transform")
     # Poprawione dane
     data = {
         'Dziedzina': ['Python']*3 + ['Java']*3 + ['Analytics']*3 + ['Games']*3,
@@ -110,6 +111,7 @@ def main():
     columns = st.columns(num_columns)  # Tworzymy kolumny
 
 
+    step("wykresy dziedzin", "chart")
     # Tworzenie wykresów dla każdej dziedziny
     for i, field in enumerate(selected_fields):
         # Filtruj dane dla konkretnej dziedziny
@@ -159,6 +161,7 @@ def main():
 
 
 
+    step("wykres średnich zarobków", "chart")
     # Dodaj nowy wykres pod wszystkimi istniejącymi
     st.markdown("---")  # Dodaj linię oddzielającą
 